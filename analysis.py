@@ -0,0 +1,145 @@
+import asyncio
+import logging
+import math
+import re
+import time
+
+log = logging.getLogger(__name__)
+
+# Konfigurasi default pipeline analisis map-reduce
+# gemini-2.0-flash menerima ~1 juta token input, jadi karya ilmiah biasa cukup satu
+# request; map-reduce hanya untuk dokumen yang sangat panjang.
+ANALYSIS_SINGLE_CALL_TOKENS = 200000 # Dokumen sampai batas ini dikirim utuh dalam satu request
+ANALYSIS_CHUNK_TOKENS = 100000       # Ukuran minimum tiap bagian pada tahap map
+ANALYSIS_MAX_CHUNKS = 4              # Bagian diperbesar agar jumlahnya tidak melebihi batas ini
+ANALYSIS_RPM_SHARE = 1 / 3           # Bagian kuota request/menit Gemini yang boleh dipakai satu analisis
+ANALYSIS_MAP_CONCURRENCY = 4         # Request ringkasan bagian yang berjalan bersamaan
+ANALYSIS_COUNT_MARGIN = 0.3          # Token dihitung pasti (count_tokens) jika perkiraan dalam ±30% batas satu request
+CHARS_PER_TOKEN = 4                  # Dipakai untuk perkiraan lokal jika jumlah token tidak dihitung
+
+MAP_PROMPT = """Berikut adalah bagian {index} dari {total} sebuah karya ilmiah{title}.
+Buat ringkasan padat dari bagian ini saja, mencakup:
+- Pokok bahasan dan tujuan yang disebutkan
+- Metodologi, data, atau analisis yang dijelaskan
+- Temuan, hasil, dan kesimpulan penting
+Jangan menambahkan informasi yang tidak ada di teks.
+
+Teks bagian {index}:
+{chunk}"""
+
+REDUCE_INTRO = "Dokumen terlalu panjang untuk dikirim utuh. Berikut ringkasan tiap bagian dokumen secara berurutan:"
+
+
+# Jumlah bagian maksimum agar satu analisis (map + reduce) tidak memakai lebih dari
+# ANALYSIS_RPM_SHARE kuota request per menit; minimal 2 bagian
+def max_chunks_for_rpm(requests_per_minute, share=ANALYSIS_RPM_SHARE, max_chunks=ANALYSIS_MAX_CHUNKS):
+    return max(2, min(max_chunks, int(requests_per_minute * share) - 1))
+
+
+# Perkiraan kasar jumlah token (sekitar 4 karakter per token)
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+# Pecah teks menjadi bagian-bagian dengan anggaran token yang kira-kira sama.
+# Pemotongan diutamakan di batas halaman, lalu paragraf, lalu baris.
+def chunk_text(text, max_tokens, chars_per_token=CHARS_PER_TOKEN):
+    max_chars = int(max_tokens * chars_per_token)
+    if len(text) <= max_chars:
+        return [text]
+
+    pieces = re.split(r"(?=\n--- Halaman \d+)", text)
+    units = []
+    for piece in pieces:
+        if len(piece) <= max_chars:
+            units.append(piece)
+            continue
+        # Halaman yang terlalu panjang dipecah per paragraf/baris
+        for paragraph in re.split(r"(?<=\n)(?=\n)", piece):
+            while len(paragraph) > max_chars:
+                cut = paragraph.rfind("\n", 0, max_chars)
+                if cut <= 0:
+                    cut = max_chars
+                units.append(paragraph[:cut])
+                paragraph = paragraph[cut:]
+            units.append(paragraph)
+
+    chunks = []
+    current = []
+    current_len = 0
+    for unit in units:
+        if current and current_len + len(unit) > max_chars:
+            chunks.append("".join(current))
+            current = []
+            current_len = 0
+        current.append(unit)
+        current_len += len(unit)
+    if current:
+        chunks.append("".join(current))
+    return [chunk for chunk in chunks if chunk.strip()]
+
+
+# Analisis dokumen dengan pola map-reduce.
+# Dokumen pendek dikirim dalam satu request seperti biasa. Dokumen panjang dipecah,
+# setiap bagian diringkas secara paralel (dibatasi semaphore), lalu ringkasan
+# digabung dan dianalisis dengan prompt utama sehingga format keluaran tetap sama.
+# query_fn(prompt) adalah coroutine yang mengembalikan teks respons; is_error(respons)
+# menandai respons gagal. final_query_fn (opsional) dipakai untuk request terakhir,
+# mis. versi streaming. Karena setiap prompt bagian deterministik, ringkasan
+# bagian ikut ter-cache oleh cache respons Gemini.
+# count_tokens(teks) (opsional) adalah coroutine yang mengembalikan jumlah token
+# sebenarnya (atau None); dipanggil hanya jika perkiraan lokal dekat batas satu
+# request, dan rasio karakter per token hasilnya dipakai untuk ukuran potongan.
+async def map_reduce_analysis(prompt, document_text, query_fn, is_error, title=None,
+                              final_query_fn=None, count_tokens=None,
+                              single_call_tokens=ANALYSIS_SINGLE_CALL_TOKENS,
+                              chunk_tokens=ANALYSIS_CHUNK_TOKENS, max_chunks=ANALYSIS_MAX_CHUNKS,
+                              map_concurrency=ANALYSIS_MAP_CONCURRENCY, count_margin=ANALYSIS_COUNT_MARGIN):
+    final_query_fn = final_query_fn or query_fn
+    total_tokens = estimate_tokens(document_text)
+    chars_per_token = CHARS_PER_TOKEN
+    if count_tokens is not None and abs(total_tokens - single_call_tokens) <= single_call_tokens * count_margin:
+        counted = await count_tokens(document_text)
+        if counted:
+            log.info(f"Counted {counted} tokens (estimated {total_tokens})")
+            total_tokens = counted
+            chars_per_token = len(document_text) / counted
+    if total_tokens <= single_call_tokens:
+        return await final_query_fn(f"{prompt}\n\nIsi Dokumen PDF:\n{document_text}")
+
+    chunk_tokens = max(chunk_tokens, math.ceil(total_tokens / max_chunks))
+    chunks = chunk_text(document_text, chunk_tokens, chars_per_token)
+    while len(chunks) > max_chunks:
+        # Pemotongan di batas halaman bisa menghasilkan satu-dua bagian lebih; perbesar bagiannya
+        chunk_tokens = math.ceil(chunk_tokens * len(chunks) / max_chunks)
+        chunks = chunk_text(document_text, chunk_tokens, chars_per_token)
+    log.info(f"Map-reduce analysis: ~{total_tokens} tokens in {len(chunks)} chunks")
+
+    semaphore = asyncio.Semaphore(map_concurrency)
+    title_part = f" berjudul \"{title}\"" if title else ""
+    started = time.monotonic()
+
+    async def summarize(index, chunk):
+        map_prompt = MAP_PROMPT.format(index=index + 1, total=len(chunks), title=title_part, chunk=chunk)
+        async with semaphore:
+            return await query_fn(map_prompt)
+
+    summaries = await asyncio.gather(*[summarize(i, chunk) for i, chunk in enumerate(chunks)])
+    log.info(f"Map stage finished in {time.monotonic() - started:.2f}s")
+
+    parts = []
+    first_error = None
+    for index, summary in enumerate(summaries):
+        if is_error(summary):
+            first_error = first_error or summary
+            log.error(f"Chunk {index + 1}/{len(chunks)} summary failed: {summary}")
+            continue
+        parts.append(f"### Bagian {index + 1}\n{summary.strip()}")
+
+    if not parts:
+        return first_error
+
+    reduce_prompt = f"{prompt}\n\n{REDUCE_INTRO}\n\n" + "\n\n".join(parts)
+    if len(parts) < len(chunks):
+        reduce_prompt += f"\n\n(Catatan: {len(chunks) - len(parts)} dari {len(chunks)} bagian gagal diringkas.)"
+    return await final_query_fn(reduce_prompt)
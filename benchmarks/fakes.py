@@ -0,0 +1,215 @@
+# Pengganti lokal untuk layanan eksternal bot, dipakai oleh benchmark:
+# server repository (/api/search, /api/detail, /pdf), server Gemini
+# (generateContent, streamGenerateContent dan countTokens) dengan latensi dan 429 yang bisa
+# diatur, client WhatsApp palsu, dan pembuat PDF sintetis.
+import asyncio
+import json
+import random
+import time
+from types import SimpleNamespace
+
+from aiohttp import web
+from neonize.events import MessageEv
+
+LOREM = (
+    "penelitian ini membahas pengaruh metode pembelajaran terhadap hasil belajar siswa "
+    "dengan pendekatan kuantitatif dan analisis regresi pada data survei sekolah menengah"
+)
+
+
+# Buat PDF sederhana (font Helvetica, satu aliran teks per halaman)
+def make_pdf(pages):
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>"]
+    kids = " ".join(f"{3 + 2 * i} 0 R" for i in range(len(pages)))
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {len(pages)} >>".encode())
+    font_id = 3 + 2 * len(pages)
+    for i, text in enumerate(pages):
+        lines = " ".join(f"({line}) '" for line in text.split("\n"))
+        stream = f"BT /F1 10 Tf 40 800 Td 12 TL {lines} ET"
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Contents {4 + 2 * i} 0 R "
+            f"/Resources << /Font << /F1 {font_id} 0 R >> >> >>".encode()
+        )
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream".encode())
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    out = b"%PDF-1.4\n"
+    offsets = []
+    for i, obj in enumerate(objects):
+        offsets.append(len(out))
+        out += f"{i + 1} 0 obj\n".encode() + obj + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += b"".join(f"{offset:010d} 00000 n \n".encode() for offset in offsets)
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return out
+
+
+# PDF sintetis dengan jumlah halaman tertentu, kira-kira 3000 karakter per halaman
+def make_paper_pdf(doc_id, pages, lines_per_page=40):
+    texts = []
+    for page in range(pages):
+        lines = [f"Dokumen {doc_id} halaman {page + 1}"]
+        lines += [f"{line + 1}. {LOREM}" for line in range(lines_per_page)]
+        texts.append("\n".join(lines))
+    return make_pdf(texts)
+
+
+def make_message(text, chat_user="628123456789", quoted_document=None):
+    message = MessageEv()
+    message.Info.MessageSource.Chat.User = chat_user
+    message.Info.MessageSource.Chat.Server = "s.whatsapp.net"
+    if quoted_document:
+        message.Message.extendedTextMessage.text = text
+        quoted = message.Message.extendedTextMessage.contextInfo.quotedMessage
+        quoted.documentMessage.fileName = quoted_document
+        quoted.documentMessage.mimetype = "application/pdf"
+    else:
+        message.Message.conversation = text
+    return message
+
+
+# Client WhatsApp palsu: mencatat semua pesan keluar (termasuk hasil edit) beserta waktunya
+class FakeClient:
+    def __init__(self, documents=None, send_latency=0.0):
+        self.documents = documents or {}
+        self.send_latency = send_latency
+        self.sent = []
+        self.edited = 0
+        self.uuid = b"6280000000000"
+
+    async def send_message(self, to, message):
+        if self.send_latency:
+            await asyncio.sleep(self.send_latency)
+        self.sent.append((str(to), message, time.monotonic()))
+        return SimpleNamespace(ID=f"FAKE{len(self.sent)}")
+
+    async def reply_message(self, message, quoted):
+        return await self.send_message(quoted.Info.MessageSource.Chat, message)
+
+    async def edit_message(self, chat, message_id, new_message):
+        self.edited += 1
+        return await self.send_message(chat, new_message.conversation)
+
+    async def download_any(self, message, path=None):
+        return self.documents.get(message.documentMessage.fileName)
+
+
+# Server lokal yang meniru API repository dan API Gemini
+class FakeServices:
+    def __init__(self, documents=20, pages=(5, 20, 80), gemini_latency=0.5,
+                 gemini_429_rate=0.0, stream_sections=5, seed=1):
+        self.random = random.Random(seed)
+        self.gemini_latency = gemini_latency
+        self.gemini_429_rate = gemini_429_rate
+        self.stream_sections = stream_sections
+        self.pdfs = {
+            doc_id: make_paper_pdf(doc_id, pages[doc_id % len(pages)]) for doc_id in range(documents)
+        }
+        self.requests = {"search": 0, "detail": 0, "pdf": 0, "gemini": 0, "gemini_429": 0, "count_tokens": 0}
+        self.base_url = None
+        self._runner = None
+
+    def _document(self, doc_id):
+        return {
+            "title": f"Karya Ilmiah Sintetis {doc_id}",
+            "authors": [f"Penulis {doc_id}", "Penulis Kedua"],
+            "year": str(2000 + doc_id % 25),
+            "url": f"{self.base_url}/repo/{doc_id}/",
+            "download_links": [f"{self.base_url}/pdf/{doc_id}.pdf"],
+        }
+
+    async def search(self, request):
+        self.requests["search"] += 1
+        await asyncio.sleep(0.02)
+        keyword = request.query.get("q", "")
+        start = sum(map(ord, keyword)) % len(self.pdfs)
+        data = [self._document((start + i) % len(self.pdfs)) for i in range(5)]
+        return web.json_response({"status": "success", "count": len(data), "total": len(self.pdfs), "data": data})
+
+    async def detail(self, request):
+        self.requests["detail"] += 1
+        await asyncio.sleep(0.02)
+        doc_id = int(request.query.get("url", "").rstrip("/").split("/")[-1])
+        document = self._document(doc_id)
+        return web.json_response({"status": "success", "data": {
+            "title": document["title"],
+            "abstract": f"Abstrak sintetis dokumen {doc_id}. {LOREM}",
+            "metadata": {"Penulis": "; ".join(document["authors"]), "Tahun Terbit": document["year"]},
+            "download_links": document["download_links"],
+        }})
+
+    async def pdf(self, request):
+        self.requests["pdf"] += 1
+        doc_id = int(request.match_info["doc_id"])
+        return web.Response(body=self.pdfs[doc_id], content_type="application/pdf")
+
+    def _analysis_sections(self, prompt):
+        digest = len(prompt)
+        return [
+            f"{i + 1}. **Poin {i + 1}**\n{LOREM} (panjang prompt {digest} karakter).\n\n"
+            for i in range(self.stream_sections)
+        ]
+
+    async def _gemini_gate(self, request):
+        self.requests["gemini"] += 1
+        payload = await request.json()
+        prompt = payload["contents"][0]["parts"][0]["text"]
+        if self.gemini_429_rate and self.random.random() < self.gemini_429_rate:
+            self.requests["gemini_429"] += 1
+            body = {"error": {"code": 429, "status": "RESOURCE_EXHAUSTED", "details": [
+                {"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": "1s"},
+            ]}}
+            return prompt, web.json_response(body, status=429)
+        return prompt, None
+
+    async def generate(self, request):
+        prompt, error = await self._gemini_gate(request)
+        if error is not None:
+            return error
+        await asyncio.sleep(self.gemini_latency)
+        text = "".join(self._analysis_sections(prompt))
+        return web.json_response({"candidates": [{"content": {"parts": [{"text": text}]}}]})
+
+    async def stream(self, request):
+        prompt, error = await self._gemini_gate(request)
+        if error is not None:
+            return error
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        sections = self._analysis_sections(prompt)
+        for section in sections:
+            await asyncio.sleep(self.gemini_latency / len(sections))
+            event = {"candidates": [{"content": {"parts": [{"text": section}]}}]}
+            await response.write(f"data: {json.dumps(event)}\r\n\r\n".encode())
+        await response.write_eof()
+        return response
+
+    # Jumlah token ditiru dengan ~3,5 karakter per token
+    async def count_tokens(self, request):
+        self.requests["count_tokens"] += 1
+        payload = await request.json()
+        text = payload["contents"][0]["parts"][0]["text"]
+        await asyncio.sleep(0.02)
+        return web.json_response({"totalTokens": int(len(text) / 3.5) + 1})
+
+    async def start(self, host="127.0.0.1", port=0):
+        app = web.Application()
+        app.router.add_get("/api/search", self.search)
+        app.router.add_get("/api/detail", self.detail)
+        app.router.add_get("/pdf/{doc_id}.pdf", self.pdf)
+        app.router.add_post("/gemini/generateContent", self.generate)
+        app.router.add_post("/gemini/streamGenerateContent", self.stream)
+        app.router.add_post("/gemini/countTokens", self.count_tokens)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        self.base_url = f"http://{host}:{port}"
+        return self.base_url
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
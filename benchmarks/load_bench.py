@@ -0,0 +1,241 @@
+# Benchmark beban offline: memutar ulang skenario pesan melalui handle_message
+# dengan repository, Gemini, dan WhatsApp palsu (lihat fakes.py), lalu melaporkan
+# throughput, latensi command p50/p95/p99, dan puncak RSS.
+# Menjalankan: python benchmarks/load_bench.py --chats 20 --chatter 500
+# Bot dijalankan di direktori sementara sehingga cache dan database asli tidak tersentuh.
+import argparse
+import asyncio
+import logging
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fakes import FakeClient, FakeServices, make_message
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q * len(ordered))) - 1))
+    return ordered[index]
+
+
+# RSS proses bot ditambah proses anak (worker ekstraksi PDF), dibaca dari /proc
+def current_rss():
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    pids = [os.getpid()]
+    try:
+        for tid in os.listdir("/proc/self/task"):
+            with open(f"/proc/self/task/{tid}/children") as f:
+                pids.extend(int(pid) for pid in f.read().split())
+    except OSError:
+        pass
+    total = 0
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/statm") as f:
+                total += int(f.read().split()[1]) * page_size
+        except (OSError, IndexError, ValueError):
+            continue
+    return total
+
+
+# Skenario per chat: cari, lihat detail, analisis hasil pencarian, lalu analisis
+# dokumen yang direply. Urutan di dalam satu chat berjalan bergantian seperti
+# pengguna sungguhan; semua chat berjalan bersamaan.
+def build_trace(chats, documents, seed):
+    rng = random.Random(seed)
+    trace = []
+    for chat in range(chats):
+        user = f"62800000{chat:04d}"
+        index = rng.randint(1, 5)
+        steps = [
+            f"paper search topik {rng.randint(1, 10)}",
+            f"paper detail {index}",
+            f"paper analyze {index}",
+            "ping",
+        ]
+        if rng.random() < 0.5:
+            steps.append(("paper analyze", f"doc-{rng.randrange(documents)}.pdf"))
+        trace.append((user, steps))
+    return trace
+
+
+class LoadBenchmark:
+    def __init__(self, bot, services, client, think_time):
+        self.bot = bot
+        self.services = services
+        self.client = client
+        self.think_time = think_time
+        self.latencies = {}
+        self.messages = 0
+
+    async def send(self, user, step):
+        if isinstance(step, tuple):
+            text, document = step
+            message = make_message(text, user, quoted_document=document)
+        else:
+            text = step
+            message = make_message(text, user)
+        command = " ".join(text.split()[:2]) if text.startswith("paper") else text
+        started = time.perf_counter()
+        await self.bot.handle_message(self.client, message)
+        self.latencies.setdefault(command, []).append(time.perf_counter() - started)
+        self.messages += 1
+
+    async def run_chat(self, user, steps):
+        for step in steps:
+            await self.send(user, step)
+            if self.think_time:
+                await asyncio.sleep(self.think_time)
+
+    # Satu chat menganalisis beberapa paper sekaligus ("paper analyze 1-N"), lalu
+    # setiap paper dianalisis ulang sendiri-sendiri sebagai pembanding.
+    # Mengembalikan (waktu batch, [waktu setiap paper sendiri]); jika paper dalam
+    # batch diproses bersamaan, waktu batch mendekati paper terlama, bukan jumlahnya.
+    async def run_batch(self, user, count):
+        await self.send(user, "paper search topik batch")
+        started = time.perf_counter()
+        await self.send(user, f"paper analyze 1-{count}")
+        wall = time.perf_counter() - started
+        durations = []
+        for number in range(1, count + 1):
+            started = time.perf_counter()
+            await self.send(user, f"paper reanalyze {number}")
+            durations.append(time.perf_counter() - started)
+        return wall, durations
+
+    # Obrolan grup biasa (bukan command) yang masuk terus selama benchmark
+    async def run_chatter(self, count, interval):
+        for i in range(count):
+            message = make_message(f"pesan obrolan nomor {i} di grup, bukan perintah bot", "120363000000")
+            started = time.perf_counter()
+            await self.bot.handle_message(self.client, message)
+            self.latencies.setdefault("(bukan command)", []).append(time.perf_counter() - started)
+            self.messages += 1
+            await asyncio.sleep(interval)
+
+
+async def sample_rss(peak, stop):
+    while not stop.is_set():
+        peak[0] = max(peak[0], current_rss())
+        try:
+            await asyncio.wait_for(stop.wait(), 0.05)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def run(args):
+    services = FakeServices(
+        documents=args.documents,
+        pages=tuple(int(p) for p in args.pages.split(",")),
+        gemini_latency=args.gemini_latency,
+        gemini_429_rate=args.gemini_429_rate,
+    )
+    base_url = await services.start()
+
+    import main as bot
+    from ratelimit import RateLimiter
+    bot.setup()
+    bot.client_factory = bot.create_client_factory()
+    for name in ("neonize", "neonize.utils.log", "http_client", "pdf_extract", "cache", "metrics", "scratch", "ratelimit", "outbox"):
+        logging.getLogger(name).setLevel(logging.WARNING)
+    bot.log.setLevel(logging.WARNING)
+    logging.getLogger().setLevel(logging.WARNING)
+
+    bot.REPOSITORY_API_BASE_URL = f"{base_url}/api"
+    bot.GEMINI_CONTENT_URL = f"{base_url}/gemini/generateContent?key=benchmark"
+    bot.GEMINI_STREAM_URL = f"{base_url}/gemini/streamGenerateContent?alt=sse&key=benchmark"
+    bot.GEMINI_COUNT_URL = f"{base_url}/gemini/countTokens?key=benchmark"
+    bot.GEMINI_STREAMING = not args.no_stream
+    if args.gemini_rpm:
+        bot.gemini_limiter = RateLimiter(args.gemini_rpm, bot.GEMINI_TOKENS_PER_MINUTE)
+
+    documents = {f"doc-{doc_id}.pdf": pdf for doc_id, pdf in services.pdfs.items()}
+    client = FakeClient(documents, send_latency=args.send_latency)
+    benchmark = LoadBenchmark(bot, services, client, args.think_time)
+    trace = build_trace(args.chats, args.documents, args.seed)
+
+    bot.http_client.start()
+    peak = [current_rss()]
+    stop = asyncio.Event()
+    sampler = asyncio.create_task(sample_rss(peak, stop))
+    started = time.perf_counter()
+    batch = None
+    try:
+        if args.batch:
+            batch = await benchmark.run_batch("628999999999", min(args.batch, bot.BATCH_MAX_ITEMS))
+        await asyncio.gather(
+            benchmark.run_chatter(args.chatter, args.chatter_interval),
+            *[benchmark.run_chat(user, steps) for user, steps in trace],
+        )
+        # Handler tidak menunggu pengiriman; tunggu sampai semua pesan keluar terkirim
+        await bot.outbox.flush()
+    finally:
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await sampler
+        bot.pdf_extractor.shutdown()
+        await bot.http_client.close()
+        await services.stop()
+
+    print(f"\nDurasi: {elapsed:.2f}s, {benchmark.messages} pesan masuk, "
+          f"{len(client.sent)} pesan keluar ({client.edited} edit status)")
+    print(f"Throughput: {benchmark.messages / elapsed:.1f} pesan/detik")
+    print(f"\n{'command':<20} {'n':>5} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}")
+    for command, values in sorted(benchmark.latencies.items()):
+        print(
+            f"{command:<20} {len(values):>5} {percentile(values, 0.5):>8.3f}s {percentile(values, 0.95):>8.3f}s "
+            f"{percentile(values, 0.99):>8.3f}s {max(values):>8.3f}s"
+        )
+    if batch is not None:
+        wall, durations = batch
+        print(f"\nBatch {len(durations)} paper: {wall:.2f}s; dianalisis sendiri-sendiri: "
+              f"terlama {max(durations):.2f}s, jumlah {sum(durations):.2f}s")
+        # Batch yang bersamaan hanya lebih lama dari paper terlama sebesar request perbandingan
+        verdict = "bersamaan" if wall <= max(durations) * 1.3 else "SEBAGIAN BERURUTAN"
+        print(f"  Paper dalam batch diproses {verdict} (batch/terlama = {wall / max(durations):.2f}x, "
+              f"termasuk satu request analisis perbandingan)")
+    print(f"\nPuncak RSS bot + worker: {peak[0] / (1024 * 1024):.1f} MB")
+    print(f"Puncak RSS proses bot (ru_maxrss): {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MB")
+    print(f"Request ke layanan palsu: {services.requests}")
+    print("\nRingkasan metrik tahap:")
+    for line in bot.metrics.summary():
+        print(f"  {line}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark beban offline untuk bot repository")
+    parser.add_argument("--chats", type=int, default=20, help="Jumlah chat yang menjalankan skenario")
+    parser.add_argument("--documents", type=int, default=20, help="Jumlah dokumen di repository palsu")
+    parser.add_argument("--pages", default="5,20,80", help="Variasi jumlah halaman PDF sintetis")
+    parser.add_argument("--chatter", type=int, default=500, help="Jumlah pesan obrolan non-command")
+    parser.add_argument("--chatter-interval", type=float, default=0.005)
+    parser.add_argument("--think-time", type=float, default=0.1, help="Jeda antar pesan dalam satu chat")
+    parser.add_argument("--gemini-latency", type=float, default=0.5)
+    parser.add_argument("--gemini-429-rate", type=float, default=0.0, help="Peluang Gemini palsu membalas 429")
+    parser.add_argument("--gemini-rpm", type=int, default=0,
+                        help="Batas request/menit rate limiter Gemini (0 = pakai konfigurasi main.py)")
+    parser.add_argument("--send-latency", type=float, default=0.0, help="Latensi send_message palsu")
+    parser.add_argument("--no-stream", action="store_true", help="Pakai generateContent biasa")
+    parser.add_argument("--batch", type=int, default=0,
+                        help="Jalankan dulu satu 'paper analyze 1-N' dan bandingkan waktunya dengan tiap paper")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bot-bench-")
+    os.chdir(workdir)
+    print(f"Direktori kerja: {workdir}")
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
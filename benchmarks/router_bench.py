@@ -0,0 +1,124 @@
+# Micro-benchmark overhead per pesan pada router command.
+# Menjalankan: python benchmarks/router_bench.py [jumlah_iterasi]
+# Membandingkan router berbasis tabel dengan rantai if/elif lama (tanpa logging)
+# untuk pesan biasa, pesan panjang, reply, dan command.
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from neonize.events import MessageEv
+from thundra_io.types import MediaMessageType
+from thundra_io.utils import get_message_type
+
+from router import CommandRouter
+
+COMMANDS = ["paper search", "paper detail", "paper analyze", "paper reanalyze", "paper url", "paper download"]
+
+
+def make_message(text, quoted_document=False, extended=False):
+    message = MessageEv()
+    message.Info.MessageSource.Chat.User = "628123456789"
+    message.Info.MessageSource.Chat.Server = "s.whatsapp.net"
+    if quoted_document or extended:
+        message.Message.extendedTextMessage.text = text
+        if quoted_document:
+            quoted = message.Message.extendedTextMessage.contextInfo.quotedMessage
+            quoted.documentMessage.fileName = "paper.pdf"
+    else:
+        message.Message.conversation = text
+    return message
+
+
+# Salinan kerja per pesan pada handle_message versi lama, tanpa mengirim apa pun
+def legacy_route(message):
+    if hasattr(message.Message, 'conversation') and message.Message.conversation:
+        text = message.Message.conversation
+    elif hasattr(message.Message, 'extendedTextMessage') and message.Message.extendedTextMessage.text:
+        text = message.Message.extendedTextMessage.text
+    else:
+        text = ""
+    if text.lower().startswith("paper reanalyze"):
+        text = "paper analyze" + text[len("paper reanalyze"):]
+
+    quoted_type = None
+    if (hasattr(message.Message, 'extendedTextMessage') and
+            hasattr(message.Message.extendedTextMessage, 'contextInfo') and
+            hasattr(message.Message.extendedTextMessage.contextInfo, 'quotedMessage')):
+        quoted_message = message.Message.extendedTextMessage.contextInfo.quotedMessage
+        try:
+            msg_type = get_message_type(quoted_message)
+            if isinstance(msg_type, MediaMessageType):
+                quoted_type = msg_type.__class__.__name__.lower()
+        except Exception:
+            pass
+        if not quoted_type and hasattr(quoted_message, 'videoMessage'):
+            quoted_type = "video"
+
+    if text.lower() == "ping":
+        return "ping"
+    for command in COMMANDS:
+        if text.lower().startswith(command + " "):
+            return command
+    if text.lower() == "help":
+        return "help"
+    return None
+
+
+def build_router():
+    router = CommandRouter()
+
+    async def handler(ctx):
+        pass
+
+    async def quoted_handler(ctx):
+        ctx.quoted
+
+    router.add("ping", handler)
+    router.add("help", handler)
+    for command in COMMANDS:
+        router.add(command, handler, args=True)
+    router.add("paper analyze", quoted_handler)
+    return router
+
+
+def bench(label, fn, messages, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        for message in messages:
+            fn(message)
+    elapsed = time.perf_counter() - started
+    per_message = elapsed / (iterations * len(messages)) * 1e9
+    print(f"{label:<40} {per_message:>10.0f} ns/pesan")
+    return per_message
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    router = build_router()
+
+    # Router dijalankan sinkron lewat coroutine.send agar overhead event loop tidak ikut terukur
+    def route(message):
+        coro = router.dispatch(None, message)
+        try:
+            coro.send(None)
+        except StopIteration:
+            pass
+
+    cases = {
+        "pesan biasa": [make_message("halo semua, nanti rapat jam 3 ya")],
+        "pesan panjang (4000 karakter)": [make_message("lorem ipsum " * 333)],
+        "reply ke dokumen (bukan command)": [make_message("ini filenya", quoted_document=True)],
+        "command paper search": [make_message("paper search pendidikan islam")],
+        "reply ke dokumen: paper analyze": [make_message("paper analyze", quoted_document=True)],
+    }
+    for name, messages in cases.items():
+        print(f"\n{name}")
+        legacy = bench("  if/elif lama", legacy_route, messages, iterations)
+        current = bench("  router", route, messages, iterations)
+        print(f"  {'percepatan':<38} {legacy / current:>10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
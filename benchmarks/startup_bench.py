@@ -0,0 +1,96 @@
+# Benchmark startup: mengukur waktu import main.py di proses baru dan waktu
+# startup() (membaca perangkat dari db.sqlite3, membuka cache/indeks/job store)
+# sampai bot siap menghubungkan client WhatsApp. Waktu sampai "⚡ WhatsApp terhubung"
+# pada bot sungguhan tercatat di log dan di gauge academic_bot_startup_connected_seconds.
+# Menjalankan: python benchmarks/startup_bench.py --runs 5 --importtime
+# Setiap run memakai direktori sementara baru (cold start tanpa cache dan database).
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from load_bench import percentile
+
+# Dijalankan di proses anak: import main, cek file yang dibuat oleh import, lalu startup/shutdown
+CHILD = """
+import time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+import asyncio, json, os
+side_effects = sorted(os.listdir("."))
+main.METRICS_ENABLED = False
+
+async def run():
+    await main.startup()
+    ready = time.perf_counter()
+    await main.shutdown()
+    return ready
+
+ready = asyncio.run(run())
+print(json.dumps({
+    "import": imported - started,
+    "startup": ready - imported,
+    "setup": main.startup_stats["setup_seconds"],
+    "side_effects": side_effects,
+}))
+"""
+
+
+def run_child(code, *python_args):
+    workdir = tempfile.mkdtemp(prefix="bot-startup-")
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    return subprocess.run(
+        [sys.executable, *python_args, "-c", code], cwd=workdir, env=env,
+        capture_output=True, text=True, check=True,
+    )
+
+
+# Modul dengan waktu import kumulatif terbesar (python -X importtime)
+def import_profile(top):
+    result = run_child("import main", "-X", "importtime")
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, module = line.split("|")
+        rows.append((int(cumulative_us), module.rstrip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark waktu import dan startup bot")
+    parser.add_argument("--runs", type=int, default=5, help="Jumlah cold start yang diukur")
+    parser.add_argument("--importtime", action="store_true", help="Tampilkan modul yang paling lama di-import")
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    samples = {"import": [], "setup": [], "startup": []}
+    side_effects = set()
+    for _ in range(args.runs):
+        result = json.loads(run_child(CHILD).stdout.strip().splitlines()[-1])
+        for phase in samples:
+            samples[phase].append(result[phase])
+        side_effects.update(result["side_effects"])
+
+    print(f"{'tahap':<10} {'n':>3} {'p50':>9} {'min':>9} {'max':>9}")
+    for phase, values in samples.items():
+        print(f"{phase:<10} {len(values):>3} {percentile(values, 0.5):>8.3f}s {min(values):>8.3f}s {max(values):>8.3f}s")
+    if side_effects:
+        print(f"\n⚠️ import main membuat file: {', '.join(sorted(side_effects))}")
+    else:
+        print("\nimport main tidak membuat file apa pun")
+
+    if args.importtime:
+        print("\nImport kumulatif terlama:")
+        for cumulative_us, module in import_profile(args.top):
+            print(f"  {cumulative_us / 1000:>8.1f} ms  {module}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,386 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+import zlib
+from collections import OrderedDict
+from urllib.parse import urlsplit, urlunsplit
+
+log = logging.getLogger(__name__)
+
+CACHE_DIR = "cache"
+PDF_TEXT_CACHE_PATH = os.path.join(CACHE_DIR, "pdf_text.sqlite3")
+PDF_TEXT_CACHE_MAX_BYTES = 200 * 1024 * 1024
+PDF_URL_CACHE_PATH = os.path.join(CACHE_DIR, "pdf_urls.sqlite3")
+PDF_URL_CACHE_MAX_BYTES = 10 * 1024 * 1024
+PDF_URL_CACHE_TTL = 24 * 3600
+GEMINI_CACHE_PATH = os.path.join(CACHE_DIR, "gemini_responses.sqlite3")
+GEMINI_CACHE_MAX_BYTES = 100 * 1024 * 1024
+GEMINI_CACHE_TTL = 7 * 24 * 3600
+
+# TTL cache hasil repository API: (segar, boleh dipakai walau basi)
+SEARCH_CACHE_TTL = 10 * 60
+SEARCH_CACHE_STALE_TTL = 60 * 60
+DETAIL_CACHE_TTL = 60 * 60
+DETAIL_CACHE_STALE_TTL = 24 * 60 * 60
+# Lapisan SQLite bersama untuk cache di atas pada mode multi-proses
+SEARCH_CACHE_PATH = os.path.join(CACHE_DIR, "search.sqlite3")
+SEARCH_CACHE_MAX_BYTES = 20 * 1024 * 1024
+DETAIL_CACHE_PATH = os.path.join(CACHE_DIR, "detail.sqlite3")
+DETAIL_CACHE_MAX_BYTES = 50 * 1024 * 1024
+
+
+# Hitung SHA-256 dari isi file tanpa membaca seluruh file ke memori.
+# Isi PDF yang sudah ada di memori (bytes) langsung di-hash.
+def file_sha256(path, chunk_size=1024 * 1024):
+    if isinstance(path, (bytes, bytearray)):
+        return hashlib.sha256(path).hexdigest()
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# Cache key-value persisten di SQLite dengan eviksi LRU berdasarkan total ukuran.
+# Nilai berupa teks dan disimpan terkompresi zlib. Jika ttl diisi, entri yang
+# lebih tua dari ttl detik dianggap kedaluwarsa.
+# Total ukuran dihitung trigger di dalam database, sehingga beberapa proses bot
+# (mode sharding) bisa memakai file cache yang sama tanpa melewati batas ukuran.
+class SqliteLRUCache:
+    def __init__(self, path, max_bytes, name=None, ttl=None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.name = name or os.path.splitext(os.path.basename(path))[0]
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._lock = threading.Lock()
+        self._connection = None
+
+    # Koneksi dibuka saat cache pertama kali dipakai, bukan saat modul di-import
+    @property
+    def _conn(self):
+        if self._connection is None:
+            self._connection = self._open()
+        return self._connection
+
+    def _open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY,"
+            " value BLOB NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " accessed_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at)")
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS totals (id INTEGER PRIMARY KEY CHECK (id = 0), bytes INTEGER NOT NULL)"
+            )
+            conn.execute(
+                "INSERT OR IGNORE INTO totals (id, bytes) SELECT 0, COALESCE(SUM(size), 0) FROM entries"
+            )
+            conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS entries_insert AFTER INSERT ON entries"
+                " BEGIN UPDATE totals SET bytes = bytes + NEW.size WHERE id = 0; END"
+            )
+            conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS entries_update AFTER UPDATE OF size ON entries"
+                " BEGIN UPDATE totals SET bytes = bytes + NEW.size - OLD.size WHERE id = 0; END"
+            )
+            conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS entries_delete AFTER DELETE ON entries"
+                " BEGIN UPDATE totals SET bytes = bytes - OLD.size WHERE id = 0; END"
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return conn
+
+    def _total_bytes(self):
+        return self._conn.execute("SELECT bytes FROM totals WHERE id = 0").fetchone()[0]
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, size, created_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            if self.ttl is not None and row[2] + self.ttl < time.time():
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (time.time(), key))
+            self.hits += 1
+        return zlib.decompress(row[0]).decode('utf-8')
+
+    def set(self, key, value):
+        blob = zlib.compress(value.encode('utf-8'))
+        size = len(blob)
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT INTO entries (key, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)"
+                    " ON CONFLICT (key) DO UPDATE SET value = excluded.value, size = excluded.size,"
+                    " created_at = excluded.created_at, accessed_at = excluded.accessed_at",
+                    (key, blob, size, now, now),
+                )
+                self._evict()
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def delete(self, key):
+        with self._lock:
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    # Hapus entri yang paling lama tidak diakses sampai total ukuran di bawah batas
+    def _evict(self):
+        total = self._total_bytes()
+        while total > self.max_bytes:
+            rows = self._conn.execute(
+                "SELECT key, size FROM entries ORDER BY accessed_at LIMIT 32"
+            ).fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                total -= size
+                self.evictions += 1
+                if total <= self.max_bytes:
+                    break
+
+    def stats(self):
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            total_bytes = self._total_bytes()
+        lookups = self.hits + self.misses
+        return {
+            "name": self.name,
+            "entries": entries,
+            "bytes": total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+
+# Cache teks hasil ekstraksi PDF, dialamatkan dengan hash isi file
+pdf_text_cache = SqliteLRUCache(PDF_TEXT_CACHE_PATH, PDF_TEXT_CACHE_MAX_BYTES, name="pdf_text")
+
+
+def pdf_text_cache_key(digest, engine, max_pages, max_chars=None):
+    return f"{digest}:{engine}:{max_pages}:{max_chars or 0}"
+
+
+# Hash isi PDF terakhir yang diunduh dari sebuah URL, sehingga teks yang sudah
+# diekstrak bisa dipakai lagi tanpa mengunduh ulang. TTL menjaga agar PDF yang
+# diganti di server tetap terbaca versi barunya.
+pdf_url_cache = SqliteLRUCache(PDF_URL_CACHE_PATH, PDF_URL_CACHE_MAX_BYTES, name="pdf_urls", ttl=PDF_URL_CACHE_TTL)
+
+
+# Cache respons Gemini, dikunci dengan nama model dan sidik jari prompt
+gemini_response_cache = SqliteLRUCache(
+    GEMINI_CACHE_PATH, GEMINI_CACHE_MAX_BYTES, name="gemini_responses", ttl=GEMINI_CACHE_TTL
+)
+
+
+# Normalisasi prompt sebelum di-hash: bentuk Unicode, spasi berlebih, dan
+# baris kosong berulang tidak mengubah sidik jari
+def normalize_prompt(prompt):
+    prompt = unicodedata.normalize("NFC", prompt)
+    prompt = re.sub(r"[ \t\r\f\v]+", " ", prompt)
+    prompt = re.sub(r" ?\n ?", "\n", prompt)
+    prompt = re.sub(r"\n{3,}", "\n\n", prompt)
+    return prompt.strip()
+
+
+def prompt_fingerprint(prompt):
+    return hashlib.sha256(normalize_prompt(prompt).encode('utf-8')).hexdigest()
+
+
+def gemini_cache_key(model, prompt):
+    return f"{model}:{prompt_fingerprint(prompt)}"
+
+
+# Cache in-memory dengan TTL dan stale-while-revalidate.
+# Entri segar langsung dikembalikan. Entri basi (melewati ttl tetapi masih dalam
+# stale_ttl) juga langsung dikembalikan sambil di-refresh di background.
+# Jika store (SqliteLRUCache) diisi, nilai juga disimpan sebagai JSON di SQLite
+# dan entri yang tidak ada di memori dicari di sana, sehingga beberapa proses bot
+# berbagi hasil fetch yang sama.
+class SWRCache:
+    def __init__(self, name, ttl, stale_ttl, max_entries=1000, store=None):
+        self.name = name
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.store = store
+        self._entries = OrderedDict()
+        self._refreshing = {}
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.store_hits = 0
+        self.refresh_errors = 0
+
+    def _put(self, key, value, stored_at=None):
+        self._entries[key] = (value, time.monotonic() if stored_at is None else stored_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def _save(self, key, value):
+        self._put(key, value)
+        if self.store is not None:
+            try:
+                payload = json.dumps({"stored_at": time.time(), "value": value})
+                await asyncio.to_thread(self.store.set, key, payload)
+            except Exception as e:
+                log.error(f"Failed to store {self.name} cache entry {key}: {e}")
+
+    # Entri dari store dimasukkan ke memori dengan umur aslinya (waktu dinding
+    # dikonversi ke monotonic) agar TTL segar/basi tetap dihitung sejak fetch
+    async def _load(self, key):
+        try:
+            payload = await asyncio.to_thread(self.store.get, key)
+        except Exception as e:
+            log.error(f"Failed to read {self.name} cache entry {key}: {e}")
+            return None
+        if payload is None:
+            return None
+        entry = json.loads(payload)
+        stored_at = time.monotonic() - max(0.0, time.time() - entry["stored_at"])
+        self._put(key, entry["value"], stored_at)
+        self.store_hits += 1
+        return self._entries[key]
+
+    async def _refresh(self, key, fetch):
+        try:
+            value = await fetch()
+            if value is not None:
+                await self._save(key, value)
+        except Exception as e:
+            self.refresh_errors += 1
+            log.error(f"Background refresh of {self.name} cache failed for {key}: {e}")
+        finally:
+            self._refreshing.pop(key, None)
+
+    # Ambil nilai dari cache atau panggil fetch() (coroutine function).
+    # Hasil None tidak disimpan sehingga error tidak ikut ter-cache.
+    async def get_or_fetch(self, key, fetch):
+        entry = self._entries.get(key)
+        if entry is None and self.store is not None:
+            entry = await self._load(key)
+        if entry is not None:
+            value, stored_at = entry
+            age = time.monotonic() - stored_at
+            if age < self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            if age < self.stale_ttl:
+                self._entries.move_to_end(key)
+                self.stale_hits += 1
+                if key not in self._refreshing:
+                    self._refreshing[key] = asyncio.create_task(self._refresh(key, fetch))
+                return value
+            del self._entries[key]
+
+        self.misses += 1
+        value = await fetch()
+        if value is not None:
+            await self._save(key, value)
+        return value
+
+    def invalidate(self, key):
+        self._entries.pop(key, None)
+        if self.store is not None:
+            self.store.delete(key)
+
+    def stats(self):
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "name": self.name,
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "hit_ratio": (self.hits + self.stale_hits) / lookups if lookups else 0.0,
+            "store_hits": self.store_hits,
+            "shared": self.store is not None,
+            "refreshing": len(self._refreshing),
+            "refresh_errors": self.refresh_errors,
+        }
+
+
+search_cache = SWRCache("search", SEARCH_CACHE_TTL, SEARCH_CACHE_STALE_TTL)
+detail_cache = SWRCache("detail", DETAIL_CACHE_TTL, DETAIL_CACHE_STALE_TTL)
+
+# Lapisan SQLite untuk search_cache/detail_cache; dipasang oleh main.setup() saat
+# bot berjalan dengan beberapa shard. Entri disimpan sampai batas basinya.
+search_cache_store = SqliteLRUCache(
+    SEARCH_CACHE_PATH, SEARCH_CACHE_MAX_BYTES, name="search", ttl=SEARCH_CACHE_STALE_TTL
+)
+detail_cache_store = SqliteLRUCache(
+    DETAIL_CACHE_PATH, DETAIL_CACHE_MAX_BYTES, name="detail", ttl=DETAIL_CACHE_STALE_TTL
+)
+
+
+# Kata kunci pencarian: huruf kecil (casefold) dan spasi dirapikan
+def normalize_keyword(keyword):
+    return " ".join(keyword.casefold().split())
+
+
+# URL kanonik untuk kunci cache: skema dan host huruf kecil, port default dan
+# fragment dibuang, path tanpa garis miring di akhir
+def canonicalize_url(url):
+    url = url.strip()
+    try:
+        parts = urlsplit(url)
+    except ValueError:
+        return url
+    scheme = parts.scheme.lower()
+    netloc = parts.netloc.lower()
+    if (scheme == "http" and netloc.endswith(":80")) or (scheme == "https" and netloc.endswith(":443")):
+        netloc = netloc.rsplit(":", 1)[0]
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit((scheme, netloc, path, parts.query, ""))
@@ -0,0 +1,145 @@
+import math
+import re
+from collections import Counter
+
+# Konfigurasi default pemadatan teks dokumen sebelum dikirim ke Gemini
+COMPACT_DROP_REFERENCES = True         # Buang daftar pustaka di bagian akhir dokumen
+COMPACT_EDGE_LINES = 3                 # Baris awal/akhir tiap halaman yang diperiksa sebagai header/footer
+COMPACT_HEADER_MAX_CHARS = 120         # Baris yang lebih panjang dianggap isi, bukan header/footer
+COMPACT_HEADER_MIN_PAGES = 3           # Header/footer harus muncul di minimal sekian halaman
+COMPACT_HEADER_MIN_RATIO = 0.4         # ...dan di minimal 40% dari seluruh halaman
+COMPACT_REFERENCES_MIN_POSITION = 0.5  # Judul daftar pustaka hanya dicari di paruh akhir dokumen
+
+REFERENCES_NOTE = "(Daftar pustaka tidak disertakan.)"
+
+_PAGE_MARKER = re.compile(r"^--- Halaman \d+(?: tidak memiliki teks yang dapat diekstrak)? ---$", re.MULTILINE)
+_DIGITS = re.compile(r"\d+")
+_REFERENCES_HEADING = re.compile(
+    r"^(?:[IVX\d]+\.?\s*)?(?:daftar pustaka|daftar referensi|referensi|kepustakaan|rujukan|"
+    r"references|bibliography|bibliografi|literature cited|works cited)\s*:?$",
+    re.IGNORECASE | re.MULTILINE,
+)
+_APPENDIX_HEADING = re.compile(r"^(?:lampiran|appendix|appendices)\b.{0,80}$", re.IGNORECASE | re.MULTILINE)
+_HYPHEN_BREAK = re.compile(r"(\w+)-\n([a-z]\w*)")
+
+# Ligatur dan karakter tak terlihat yang sering muncul di keluaran PyPDF2
+_CHARACTERS = str.maketrans({
+    "\ufb00": "ff", "\ufb01": "fi", "\ufb02": "fl", "\ufb03": "ffi", "\ufb04": "ffl",
+    "\u00ad": None, "\u200b": None, "\ufeff": None,
+    "\u00a0": " ", "\t": " ", "\f": " ", "\v": " ", "\r": "",
+})
+
+
+# Rapikan spasi: spasi berturut-turut jadi satu, spasi di ujung baris dibuang,
+# dan lebih dari satu baris kosong dijadikan satu
+def normalize_whitespace(text):
+    text = text.translate(_CHARACTERS)
+    text = re.sub(r" {2,}", " ", text)
+    text = re.sub(r" ?\n ?", "\n", text)
+    return re.sub(r"\n{3,}", "\n\n", text)
+
+
+# Gabungkan kata yang terpotong tanda hubung di akhir baris ("pembela-\njaran").
+# Kata ulang ("anak-\nanak") tetap memakai tanda hubung.
+def fix_hyphenation(text):
+    def join(match):
+        left, right = match.groups()
+        if left.lower() == right.lower():
+            return f"{left}-{right}"
+        return left + right
+
+    return _HYPHEN_BREAK.sub(join, text)
+
+
+# Pecah teks hasil ekstraksi menjadi [(penanda halaman atau None, isi halaman)]
+def split_pages(text):
+    pages = []
+    marker = None
+    start = 0
+    for match in _PAGE_MARKER.finditer(text):
+        pages.append((marker, text[start:match.start()]))
+        marker = match.group(0)
+        start = match.end()
+    pages.append((marker, text[start:]))
+    return [(marker, body.strip("\n")) for marker, body in pages if marker is not None or body.strip()]
+
+
+def join_pages(pages):
+    return "\n\n".join(f"{marker}\n{body}" if marker else body for marker, body in pages).strip("\n")
+
+
+# Tanda pengenal baris untuk mendeteksi header/footer: nomor halaman, volume,
+# atau tahun yang berbeda di setiap halaman tidak membedakan barisnya
+def _signature(line):
+    line = line.strip()
+    if not line or len(line) > COMPACT_HEADER_MAX_CHARS:
+        return None
+    return _DIGITS.sub("#", line.lower())
+
+
+def _edge_indexes(lines):
+    filled = [i for i, line in enumerate(lines) if line.strip()]
+    return set(filled[:COMPACT_EDGE_LINES] + filled[-COMPACT_EDGE_LINES:])
+
+
+# Buang header/footer berulang (judul jurnal, nama penulis, nomor halaman) yang
+# muncul di awal atau akhir banyak halaman. Mengembalikan (halaman, jumlah baris dibuang).
+def remove_running_lines(pages):
+    if len(pages) < COMPACT_HEADER_MIN_PAGES:
+        return pages, 0
+
+    split = [(marker, body.split("\n")) for marker, body in pages]
+    counts = Counter()
+    for _, lines in split:
+        counts.update({_signature(lines[i]) for i in _edge_indexes(lines)} - {None})
+    threshold = max(COMPACT_HEADER_MIN_PAGES, math.ceil(len(pages) * COMPACT_HEADER_MIN_RATIO))
+    running = {signature for signature, count in counts.items() if count >= threshold}
+    if not running:
+        return pages, 0
+
+    removed = 0
+    result = []
+    for marker, lines in split:
+        drop = {i for i in _edge_indexes(lines) if _signature(lines[i]) in running}
+        removed += len(drop)
+        result.append((marker, "\n".join(line for i, line in enumerate(lines) if i not in drop).strip("\n")))
+    return result, removed
+
+
+# Buang daftar pustaka: dari judulnya (di paruh akhir dokumen) sampai lampiran
+# berikutnya atau akhir dokumen. Mengembalikan (teks, jumlah karakter dibuang).
+def drop_references(text):
+    heading = None
+    for match in _REFERENCES_HEADING.finditer(text):
+        if match.start() >= len(text) * COMPACT_REFERENCES_MIN_POSITION:
+            heading = match
+            break
+    if heading is None:
+        return text, 0
+
+    appendix = _APPENDIX_HEADING.search(text, heading.end())
+    end = appendix.start() if appendix else len(text)
+    rest = text[end:]
+    text = f"{text[:heading.start()].rstrip()}\n\n{REFERENCES_NOTE}"
+    if rest:
+        text += f"\n\n{rest}"
+    return text, end - heading.start()
+
+
+# Padatkan teks hasil ekstraksi PDF agar token yang dikirim ke Gemini berisi isi
+# karya ilmiah, bukan header/footer, spasi, atau daftar pustaka. Penanda halaman
+# dipertahankan karena dipakai sebagai batas potongan map-reduce.
+# Mengembalikan (teks, statistik).
+def compact_document_text(text, drop_reference_section=COMPACT_DROP_REFERENCES):
+    chars_before = len(text)
+    pages, running_lines = remove_running_lines(split_pages(normalize_whitespace(text)))
+    text = fix_hyphenation(join_pages(pages))
+    reference_chars = 0
+    if drop_reference_section:
+        text, reference_chars = drop_references(text)
+    return text, {
+        "chars_before": chars_before,
+        "chars_after": len(text),
+        "running_lines": running_lines,
+        "reference_chars": reference_chars,
+    }
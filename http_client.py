@@ -0,0 +1,154 @@
+import asyncio
+import logging
+
+log = logging.getLogger(__name__)
+
+# Konfigurasi default pool koneksi HTTP
+HTTP_POOL_LIMIT = 100            # Total koneksi terbuka maksimum
+HTTP_POOL_LIMIT_PER_HOST = 20    # Koneksi maksimum per host (repository API, Gemini, server PDF)
+HTTP_KEEPALIVE_TIMEOUT = 30      # Detik koneksi idle dipertahankan untuk dipakai ulang
+HTTP_DNS_CACHE_TTL = 300         # Detik hasil lookup DNS disimpan
+HTTP_CONNECT_TIMEOUT = 10
+HTTP_READ_TIMEOUT = 60
+HTTP_TOTAL_TIMEOUT = 120
+
+
+# Client HTTP bersama dengan pool koneksi yang berumur panjang.
+# Dibuat sekali saat startup dan ditutup saat shutdown, sehingga setiap request
+# ke host yang sama memakai ulang koneksi TCP/TLS dan cache DNS yang sudah ada.
+class HttpClient:
+    def __init__(self, limit=HTTP_POOL_LIMIT, limit_per_host=HTTP_POOL_LIMIT_PER_HOST,
+                 keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT, dns_cache_ttl=HTTP_DNS_CACHE_TTL,
+                 connect_timeout=HTTP_CONNECT_TIMEOUT, read_timeout=HTTP_READ_TIMEOUT,
+                 total_timeout=HTTP_TOTAL_TIMEOUT):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.total_timeout = total_timeout
+        self._session = None
+        self._connector = None
+
+        # Counter dari TraceConfig aiohttp
+        self.requests_total = 0
+        self.connections_created = 0
+        self.connections_reused = 0
+        self.dns_cache_hits = 0
+        self.dns_cache_misses = 0
+
+    def _build_trace_config(self):
+        import aiohttp
+
+        trace_config = aiohttp.TraceConfig()
+
+        async def on_request_start(session, ctx, params):
+            self.requests_total += 1
+
+        async def on_connection_create_end(session, ctx, params):
+            self.connections_created += 1
+
+        async def on_connection_reuseconn(session, ctx, params):
+            self.connections_reused += 1
+
+        async def on_dns_cache_hit(session, ctx, params):
+            self.dns_cache_hits += 1
+
+        async def on_dns_cache_miss(session, ctx, params):
+            self.dns_cache_misses += 1
+
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+        trace_config.on_dns_cache_hit.append(on_dns_cache_hit)
+        trace_config.on_dns_cache_miss.append(on_dns_cache_miss)
+        return trace_config
+
+    # Membuat session bila belum ada. Harus dipanggil dari dalam event loop.
+    # aiohttp baru di-import di sini, bukan saat modul di-import.
+    def start(self):
+        if self._session is not None and not self._session.closed:
+            return self._session
+
+        import aiohttp
+
+        self._connector = aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            keepalive_timeout=self.keepalive_timeout,
+            ttl_dns_cache=self.dns_cache_ttl,
+            use_dns_cache=True,
+        )
+        self._session = aiohttp.ClientSession(
+            connector=self._connector,
+            timeout=aiohttp.ClientTimeout(
+                total=self.total_timeout,
+                connect=self.connect_timeout,
+                sock_read=self.read_timeout,
+            ),
+            trace_configs=[self._build_trace_config()],
+        )
+        log.info(
+            f"HTTP client pool started (limit={self.limit}, per_host={self.limit_per_host}, "
+            f"keepalive={self.keepalive_timeout}s, dns_ttl={self.dns_cache_ttl}s)"
+        )
+        return self._session
+
+    @property
+    def session(self):
+        return self.start()
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            # Beri waktu transport SSL untuk menutup dengan bersih
+            await asyncio.sleep(0.25)
+            log.info("HTTP client pool closed")
+        self._session = None
+        self._connector = None
+
+    def get(self, url, **kwargs):
+        return self.session.get(url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.session.post(url, **kwargs)
+
+    # Statistik pool: koneksi terbuka, idle, dan yang sedang dipakai
+    def stats(self):
+        idle = 0
+        in_use = 0
+        per_host = {}
+        connector = self._connector
+
+        if connector is not None and not connector.closed:
+            # aiohttp tidak punya API publik untuk isi pool, jadi baca atribut internal
+            # secara defensif agar tidak rusak jika implementasinya berubah.
+            for key, conns in getattr(connector, "_conns", {}).items():
+                host = f"{key.host}:{key.port}"
+                per_host.setdefault(host, {"idle": 0, "in_use": 0})
+                per_host[host]["idle"] += len(conns)
+                idle += len(conns)
+            for key, protos in getattr(connector, "_acquired_per_host", {}).items():
+                host = f"{key.host}:{key.port}"
+                per_host.setdefault(host, {"idle": 0, "in_use": 0})
+                per_host[host]["in_use"] += len(protos)
+            in_use = len(getattr(connector, "_acquired", ()))
+
+        return {
+            "open": idle + in_use,
+            "idle": idle,
+            "in_use": in_use,
+            "limit": self.limit,
+            "limit_per_host": self.limit_per_host,
+            "per_host": per_host,
+            "requests_total": self.requests_total,
+            "connections_created": self.connections_created,
+            "connections_reused": self.connections_reused,
+            "dns_cache_hits": self.dns_cache_hits,
+            "dns_cache_misses": self.dns_cache_misses,
+        }
+
+
+# Instance bersama untuk seluruh bot
+http_client = HttpClient()
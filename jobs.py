@@ -0,0 +1,310 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+# Konfigurasi default penyimpanan job analisis
+JOB_STORE_PATH = "jobs.sqlite3"          # Di samping db.sqlite3 milik neonize
+JOB_FILES_DIR = os.path.join("cache", "jobs")
+JOB_MAX_ATTEMPTS = 3                     # Berapa kali job dicoba (termasuk setelah restart)
+JOB_RETENTION = 7 * 24 * 60 * 60         # Job yang tidak pernah selesai dibuang setelah 7 hari
+JOB_LEASE = 60                           # Detik; pemilik job memperpanjang lease selama job berjalan
+JOB_POLL_INTERVAL = 2                    # Detik antar pemeriksaan job yang dijalankan proses lain
+
+# Tahap yang sudah selesai, berurutan. "analyzed" berarti hasil sudah tersimpan dan
+# tinggal dikirim ke chat yang belum menerimanya.
+JOB_STAGES = ("queued", "downloaded", "extracted", "analyzed")
+
+
+# Job analisis yang tahan restart, satu baris per PDF (kunci = URL kanonis).
+# Setiap chat yang meminta PDF yang sama dicatat sebagai subscriber, sehingga
+# pipeline download -> ekstraksi -> Gemini hanya berjalan sekali dan hasilnya
+# dikirim ke semua chat. Job dihapus setelah hasilnya sampai ke semua subscriber.
+# Jika beberapa proses bot (shard) memakai file yang sama, hanya pemegang lease
+# (owner) yang menjalankan job; proses lain menunggu hasilnya tersimpan lalu
+# mengirimkannya ke chat miliknya sendiri.
+class JobStore:
+    def __init__(self, path=JOB_STORE_PATH, files_dir=JOB_FILES_DIR, max_attempts=JOB_MAX_ATTEMPTS,
+                 retention=JOB_RETENTION, owner="main", lease=JOB_LEASE):
+        self.path = path
+        self.files_dir = files_dir
+        self.max_attempts = max_attempts
+        self.owner = owner
+        self.lease = lease
+        self.created = 0
+        self.joined = 0
+        self.completed = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        os.makedirs(files_dir, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS analysis_jobs ("
+            " key TEXT PRIMARY KEY,"
+            " payload TEXT NOT NULL,"
+            " stage TEXT NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " result TEXT,"
+            " owner TEXT,"
+            " lease_until REAL,"
+            " created_at REAL NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(analysis_jobs)")}
+        for column, kind in (("owner", "TEXT"), ("lease_until", "REAL")):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE analysis_jobs ADD COLUMN {column} {kind}")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS analysis_job_subscribers ("
+            " key TEXT NOT NULL,"
+            " chat TEXT NOT NULL,"
+            " device TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " PRIMARY KEY (key, chat))"
+        )
+        self._purge(time.time() - retention)
+
+    # File PDF hasil download sebuah job; disimpan sampai teksnya selesai diekstrak
+    def file_path(self, key):
+        return os.path.join(self.files_dir, hashlib.sha256(key.encode()).hexdigest()[:32] + ".pdf")
+
+    # Hapus file PDF job beserta sisa .part jika proses mati saat menyimpannya
+    def _remove_file(self, key):
+        path = self.file_path(key)
+        for leftover in (path, f"{path}.part"):
+            try:
+                os.remove(leftover)
+            except FileNotFoundError:
+                pass
+
+    def _purge(self, cutoff):
+        with self._lock:
+            keys = [row[0] for row in self._conn.execute(
+                "SELECT key FROM analysis_jobs WHERE updated_at < ?", (cutoff,)
+            )]
+            for key in keys:
+                self._delete(key)
+        if keys:
+            log.info(f"Purged {len(keys)} stale analysis jobs")
+
+    def _delete(self, key):
+        self._conn.execute("DELETE FROM analysis_jobs WHERE key = ?", (key,))
+        self._conn.execute("DELETE FROM analysis_job_subscribers WHERE key = ?", (key,))
+        self._remove_file(key)
+
+    # Catat permintaan sebuah chat. Mengembalikan True jika job baru dibuat,
+    # False jika chat ini bergabung ke job yang sudah ada.
+    def subscribe(self, key, payload, chat, device):
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                created = self._conn.execute(
+                    "INSERT OR IGNORE INTO analysis_jobs (key, payload, stage, created_at, updated_at)"
+                    " VALUES (?, ?, 'queued', ?, ?)",
+                    (key, json.dumps(payload), now, now),
+                ).rowcount == 1
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO analysis_job_subscribers (key, chat, device, created_at)"
+                    " VALUES (?, ?, ?, ?)",
+                    (key, chat, device, now),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        if created:
+            self.created += 1
+        else:
+            self.joined += 1
+        return created
+
+    def unsubscribe(self, key, chat):
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM analysis_job_subscribers WHERE key = ? AND chat = ?", (key, chat)
+            )
+            remaining = self._conn.execute(
+                "SELECT COUNT(*) FROM analysis_job_subscribers WHERE key = ?", (key,)
+            ).fetchone()[0]
+            if not remaining:
+                self._delete(key)
+
+    def set_stage(self, key, stage):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE analysis_jobs SET stage = ?, updated_at = ? WHERE key = ?", (stage, time.time(), key)
+            )
+        if JOB_STAGES.index(stage) >= JOB_STAGES.index("extracted"):
+            self._remove_file(key)
+
+    # Simpan hasil analisis; setelah ini job tidak perlu dijalankan ulang, cukup dikirim
+    def set_result(self, key, result):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE analysis_jobs SET stage = 'analyzed', result = ?, updated_at = ? WHERE key = ?",
+                (result, time.time(), key),
+            )
+        self._remove_file(key)
+
+    # Ambil hak menjalankan job. Lease milik proses lain yang sudah mati otomatis
+    # kedaluwarsa; proses dengan owner yang sama (shard yang di-restart) langsung
+    # mendapatkannya kembali.
+    def claim(self, key):
+        now = time.time()
+        with self._lock:
+            return self._conn.execute(
+                "UPDATE analysis_jobs SET owner = ?, lease_until = ? WHERE key = ?"
+                " AND (owner IS NULL OR owner = ? OR lease_until < ?)",
+                (self.owner, now + self.lease, key, self.owner, now),
+            ).rowcount == 1
+
+    def renew(self, key):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE analysis_jobs SET lease_until = ? WHERE key = ? AND owner = ?",
+                (time.time() + self.lease, key, self.owner),
+            )
+
+    # Tandai satu percobaan baru; mengembalikan False jika batas percobaan sudah habis
+    def start_attempt(self, key):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE analysis_jobs SET attempts = attempts + 1, updated_at = ? WHERE key = ?",
+                (time.time(), key),
+            )
+            row = self._conn.execute("SELECT attempts FROM analysis_jobs WHERE key = ?", (key,)).fetchone()
+        return row is not None and row[0] <= self.max_attempts
+
+    # Hasil job sudah dikirim ke chat-chat ini. Job dihapus jika tidak ada lagi chat
+    # yang menunggu; jika masih ada (milik proses lain), lease dilepas agar proses
+    # itu bisa mengambil hasil yang tersimpan.
+    def finish(self, key, chats, success=True):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    "DELETE FROM analysis_job_subscribers WHERE key = ? AND chat = ?",
+                    [(key, chat) for chat in chats],
+                )
+                remaining = self._conn.execute(
+                    "SELECT COUNT(*) FROM analysis_job_subscribers WHERE key = ?", (key,)
+                ).fetchone()[0]
+                if remaining:
+                    self._conn.execute(
+                        "UPDATE analysis_jobs SET owner = NULL, lease_until = NULL WHERE key = ? AND owner = ?",
+                        (key, self.owner),
+                    )
+                else:
+                    self._delete(key)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        if success:
+            self.completed += 1
+        else:
+            self.failed += 1
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload, stage, attempts, result FROM analysis_jobs WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        payload, stage, attempts, result = row
+        return {"key": key, "payload": json.loads(payload), "stage": stage, "attempts": attempts, "result": result}
+
+    # Daftar (chat, device) yang menunggu hasil job ini
+    def subscribers(self, key):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT chat, device FROM analysis_job_subscribers WHERE key = ? ORDER BY created_at", (key,)
+            ).fetchall()
+
+    # Job yang belum selesai dikirim, untuk dilanjutkan setelah restart
+    def pending(self, device=None):
+        with self._lock:
+            if device is None:
+                keys = self._conn.execute("SELECT key FROM analysis_jobs ORDER BY created_at").fetchall()
+            else:
+                keys = self._conn.execute(
+                    "SELECT DISTINCT j.key FROM analysis_jobs j"
+                    " JOIN analysis_job_subscribers s ON s.key = j.key"
+                    " WHERE s.device = ? ORDER BY j.created_at",
+                    (device,),
+                ).fetchall()
+        return [job for job in (self.get(key) for key, in keys) if job is not None]
+
+    def stats(self):
+        with self._lock:
+            jobs, subscribers = self._conn.execute(
+                "SELECT (SELECT COUNT(*) FROM analysis_jobs), (SELECT COUNT(*) FROM analysis_job_subscribers)"
+            ).fetchone()
+        return {
+            "pending": jobs,
+            "subscribers": subscribers,
+            "created": self.created,
+            "joined": self.joined,
+            "completed": self.completed,
+            "failed": self.failed,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# Penerima hasil satu job yang sedang berjalan di proses ini. Setiap chat punya
+# pesan status sendiri; bagian hasil yang sudah terkirim disimpan agar chat yang
+# bergabung di tengah jalan tetap menerima hasil lengkap.
+class JobFanout:
+    def __init__(self, outbox):
+        self.outbox = outbox
+        self.subscribers = {}
+        self.sections = []
+        self.last_status = None
+
+    # Tambahkan chat; mengembalikan False jika chat ini sudah menerima job yang sama
+    def join(self, client, chat, chat_id):
+        if chat_id in self.subscribers:
+            return False
+        progress = self.outbox.progress(client, chat)
+        self.subscribers[chat_id] = (client, chat, progress)
+        if self.last_status is not None and not self.sections:
+            progress.update(self.last_status)
+        for section in self.sections:
+            self.outbox.send(client, chat, section, merge=False)
+        return True
+
+    def status(self, text):
+        self.last_status = text
+        for _, _, progress in self.subscribers.values():
+            progress.update(text)
+
+    def send(self, text, merge=True):
+        for client, chat, _ in self.subscribers.values():
+            self.outbox.send(client, chat, text, merge)
+
+    # Dipakai sebagai on_section analisis: bagian hasil diteruskan ke semua chat
+    # sebagai pesan terpisah
+    async def section(self, text):
+        self.sections.append(text)
+        self.send(text, merge=False)
+
+    # Tunggu sampai semua pesan job ini terkirim
+    async def drain(self):
+        for _, chat, _ in list(self.subscribers.values()):
+            await self.outbox.flush(chat)
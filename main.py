@@ -1,146 +1,409 @@
 import asyncio
+import contextlib
 import logging
 import os
+import shutil
 import sys
 import traceback
-import base64
 import json
-import aiohttp
-import requests
-import tempfile
-import PyPDF2
-from neonize.aioze.client import ClientFactory, NewAClient
-from neonize.events import (
-    ConnectedEv,
-    MessageEv,
-)
-from neonize.proto.waE2E.WAWebProtobufsE2E_pb2 import Message
-from neonize.utils import log
+import time
+
+# Awal proses, untuk mengukur waktu startup sampai WhatsApp terhubung
+process_started = time.perf_counter()
 
-# Tambahkan import dari thundra_io
-from thundra_io.utils import get_message_type, get_user_id
-from thundra_io.types import MediaMessageType
-from thundra_io.storage.file import File
+from http_client import http_client
+from pdf_download import DownloadError, download_pdf
+from pdf_extract import PDF_EXTRACT_ENGINE, pdf_extractor
+from singleflight import singleflight
+from sessions import SEARCH_SESSION_DB_PATH, SearchItem, SearchSessionStore
+from search_index import SEARCH_INDEX_PATH, SearchIndex
+from scheduler import SchedulerFull, scheduler
+from scratch import SCRATCH_MEMORY_LIMIT, ScratchStorage
+from router import CommandRouter
+from metrics import MetricsServer, metrics
+from prefetch import Prefetcher
+from outbox import outbox
+from jobs import JOB_POLL_INTERVAL, JobFanout, JobStore
+from supervisor import shard_for
+from compaction import compact_document_text
+from analysis import (
+    ANALYSIS_CHUNK_TOKENS,
+    ANALYSIS_MAX_CHUNKS,
+    estimate_tokens,
+    map_reduce_analysis,
+    max_chunks_for_rpm,
+)
+from streaming import SectionSplitter, chunk_text_from_event, iter_sse_json, split_sections
+from ratelimit import (
+    RETRYABLE_STATUSES,
+    CircuitOpenError,
+    RateLimiter,
+    RetryableError,
+    parse_retry_after,
+)
+from cache import (
+    canonicalize_url,
+    detail_cache,
+    detail_cache_store,
+    file_sha256,
+    gemini_cache_key,
+    gemini_response_cache,
+    normalize_keyword,
+    pdf_text_cache,
+    pdf_text_cache_key,
+    pdf_url_cache,
+    search_cache,
+    search_cache_store,
+)
 
-sys.path.insert(0, os.getcwd())
+log = logging.getLogger(__name__)
 
-# Konfigurasi logging
-logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
-log.setLevel(logging.DEBUG)
+# Level log bot; juga dipakai untuk log neonize/whatsmeow
+LOG_LEVEL = logging.DEBUG
 
 # Gemini API configuration
 GEMINI_API_KEY = "<APIKEY-GEMINI>"
 GEMINI_MODEL = "gemini-2.0-flash"
 GEMINI_CONTENT_URL = f"https://generativelanguage.googleapis.com/v1beta/models/{GEMINI_MODEL}:generateContent?key={GEMINI_API_KEY}"
+GEMINI_STREAM_URL = f"https://generativelanguage.googleapis.com/v1beta/models/{GEMINI_MODEL}:streamGenerateContent?alt=sse&key={GEMINI_API_KEY}"
+GEMINI_COUNT_URL = f"https://generativelanguage.googleapis.com/v1beta/models/{GEMINI_MODEL}:countTokens?key={GEMINI_API_KEY}"
+GEMINI_STREAMING = True              # Kirim hasil analisis per poin selagi Gemini masih menulis
+GEMINI_COUNT_TOKENS = True           # Hitung token dokumen dengan countTokens jika perkiraan lokal dekat batas
+GEMINI_COUNT_TIMEOUT = 5             # Detik; lewat dari ini perkiraan lokal yang dipakai
+GEMINI_REQUESTS_PER_MINUTE = 15      # Sesuaikan dengan kuota akun Gemini
+GEMINI_TOKENS_PER_MINUTE = 1000000
+
+# Jumlah halaman PDF maksimum yang diekstrak untuk analisis (dokumen panjang dianalisis map-reduce)
+PDF_ANALYSIS_MAX_PAGES = 300
+# Ekstraksi berhenti begitu teks mencapai panjang ini (kira-kira kapasitas tahap map-reduce)
+PDF_ANALYSIS_MAX_CHARS = ANALYSIS_MAX_CHUNKS * ANALYSIS_CHUNK_TOKENS * 4
+
+# Sebelum dianalisis, teks PDF dipadatkan: header/footer berulang, spasi berlebih,
+# dan kata terpotong tanda hubung dirapikan, serta daftar pustaka dibuang
+PDF_COMPACT_TEXT = True
+PDF_DROP_REFERENCES = True
+
+# Awalan pesan yang dikembalikan query_gemini_text ketika request gagal
+GEMINI_ERROR_PREFIXES = ("Error", "Terjadi kesalahan", "⚠️")
 
 # Repository API configuration
 REPOSITORY_API_BASE_URL = "<URL-API-REPOSITORY>"
 
-# Setup client
-client_factory = ClientFactory("db.sqlite3")
-os.makedirs("temp_media", exist_ok=True)
+# Simpan hasil pencarian di SQLite agar "paper detail N" tetap bisa dipakai setelah restart
+SEARCH_SESSION_PERSIST = True
+
+# Indeks pencarian lokal (SQLite FTS5) yang diisi dari setiap respons repository API.
+# "paper search" dijawab dari indeks jika hasilnya cukup, sambil disinkronkan ke API
+# di background; jika API lambat/mati, hasil indeks tetap dipakai (mode degradasi).
+SEARCH_INDEX_ENABLED = True
+SEARCH_INDEX_MIN_RESULTS = 3         # Hasil lokal minimal agar API tidak perlu ditunggu
+SEARCH_REMOTE_TIMEOUT = 8            # Detik menunggu API search sebelum memakai indeks
+SEARCH_INDEX_HARVEST_KEYWORDS = []   # Kata kunci untuk mengisi indeks saat bot mulai (bulk harvest)
+SEARCH_INDEX_HARVEST_DELAY = 2       # Jeda antar request harvest agar API tidak terbebani
+
+# Setelah hasil pencarian dikirim, ambil detail dan teks PDF hasil yang ditampilkan
+# di background agar "paper detail N" / "paper analyze N" berikutnya langsung dijawab
+PREFETCH_ENABLED = True
+
+# "paper detail 1-5" / "paper analyze 1,3,4": beberapa dokumen diproses bersamaan
+# dan dibalas dalam satu pesan gabungan
+BATCH_MAX_ITEMS = 5
+BATCH_SYNTHESIS = True               # Tambahkan analisis perbandingan antar paper (1 request Gemini)
+
+# Simpan PDF sementara di /dev/shm (RAM) jika tersedia, bukan di disk
+SCRATCH_USE_TMPFS = False
+
+# Endpoint metrik Prometheus di http://127.0.0.1:METRICS_PORT/metrics.
+# Dalam mode multi-proses endpoint tetap berjalan karena /healthz dipakai supervisor.
+METRICS_ENABLED = True
+METRICS_PORT = 9464
+METRICS_LOG_INTERVAL = 0             # Detik antar ringkasan metrik di log; 0 = nonaktif
+
+# Mode multi-proses (python supervisor.py): perangkat dibagi ke beberapa shard dan
+# setiap proses hanya menjalankan perangkat miliknya. Endpoint metrik shard ke-i ada
+# di METRICS_PORT + i. Tanpa supervisor, satu proses menjalankan semua perangkat.
+SHARD_INDEX = int(os.environ.get("BOT_SHARD_INDEX", "0"))
+SHARD_COUNT = int(os.environ.get("BOT_SHARD_COUNT", "1"))
+
+# Database sesi WhatsApp milik neonize
+WHATSAPP_DB_PATH = "db.sqlite3"
+
+# Pembatas laju untuk semua request ke Gemini
+gemini_limiter = RateLimiter(GEMINI_REQUESTS_PER_MINUTE, GEMINI_TOKENS_PER_MINUTE)
+
+# Pemanasan cache spekulatif setelah pencarian
+prefetcher = Prefetcher()
+
+# Task background (sinkronisasi indeks, harvest) disimpan agar tidak dibersihkan GC
+background_tasks = set()
+
+# Job analisis yang sedang berjalan di proses ini (kunci -> JobFanout)
+active_analyses = {}
+
+# Pemanggil fetch_pdf_text yang sedang menunggu download PDF (kunci job -> daftar
+# efek samping per pemanggil); download bersama menjalankan efek samping semuanya
+pdf_download_waiters = {}
+
+# Router command; pesan yang bukan command langsung diabaikan
+router = CommandRouter(timer=lambda command: metrics.timer("command", command=command))
 
-# Load existing sessions
-sessions = client_factory.get_all_devices()
-for device in sessions:
-    client_factory.new_client(device.JID)
+# Komponen yang membuka file, database, atau koneksi WhatsApp dibuat oleh setup()
+# dan create_client_factory() saat bot dijalankan, bukan saat modul di-import,
+# sehingga main.py bisa di-import oleh benchmark dan tooling tanpa efek samping.
+client_factory = None
+scratch = None
+last_search_results = None
+search_index = None
+job_store = None
+metrics_server = None
 
-# Dictionary untuk menyimpan hasil pencarian terakhir
-last_search_results = {}
+# Durasi tiap tahap startup (detik), diekspor di endpoint metrik
+startup_stats = {}
 
-# Helper function untuk mendapatkan pesan yang dikutip dan jenisnya
-async def get_quoted_message_info(message):
-    has_quoted = False
-    quoted_message = None
-    quoted_type = None
+def setup():
+    global scratch, last_search_results, search_index, job_store, metrics_server
     
-    try:
-        # Check untuk extended text message
-        if (hasattr(message.Message, 'extendedTextMessage') and 
-            hasattr(message.Message.extendedTextMessage, 'contextInfo') and
-            hasattr(message.Message.extendedTextMessage.contextInfo, 'quotedMessage')):
-            
-            quoted_message = message.Message.extendedTextMessage.contextInfo.quotedMessage
-            has_quoted = True
-            
-            # Coba gunakan thundra_io untuk deteksi tipe
-            try:
-                msg_type = get_message_type(quoted_message)
-                if isinstance(msg_type, MediaMessageType):
-                    quoted_type = msg_type.__class__.__name__.lower().replace('message', '')
-                    log.info(f"Detected quoted {quoted_type} message using thundra_io")
-            except Exception as e:
-                log.error(f"Error using thundra_io for type detection: {e}")
-            
-            # Fallback ke metode deteksi lama jika thundra_io gagal
-            if not quoted_type:
-                if hasattr(quoted_message, 'videoMessage'):
-                    quoted_type = "video"
-                    log.info("Detected quoted video message")
-                elif hasattr(quoted_message, 'audioMessage'):
-                    quoted_type = "audio"
-                    log.info("Detected quoted audio message")
-                elif hasattr(quoted_message, 'imageMessage'):
-                    quoted_type = "image"
-                    log.info("Detected quoted image message")
-                elif hasattr(quoted_message, 'documentMessage'):
-                    quoted_type = "document"
-                    log.info("Detected quoted document message")
-                else:
-                    log.info("Unknown quoted message type")
-                    # Log atribut
-                    for attr in dir(quoted_message):
-                        if not attr.startswith('_'):
-                            log.info(f"Quoted message has attribute: {attr}")
+    # Penyimpanan file PDF sementara; file dihapus setelah diproses dan dibersihkan janitor
+    # (per shard, agar janitor satu proses tidak menghapus file yang sedang dipakai proses lain)
+    scratch = ScratchStorage(
+        use_tmpfs=SCRATCH_USE_TMPFS, subdir=f"shard-{SHARD_INDEX}" if SHARD_COUNT > 1 else None
+    )
     
-    except Exception as e:
-        log.error(f"Error in get_quoted_message_info: {e}")
-        log.error(traceback.format_exc())
+    # Penyimpanan hasil pencarian terakhir per chat. Dengan beberapa shard, sesi dan
+    # cache hasil pencarian/detail disimpan di SQLite bersama agar semua proses
+    # melihat data yang sama
+    last_search_results = SearchSessionStore(
+        db_path=SEARCH_SESSION_DB_PATH if SEARCH_SESSION_PERSIST or SHARD_COUNT > 1 else None,
+        shared=SHARD_COUNT > 1,
+    )
+    if SHARD_COUNT > 1:
+        search_cache.store = search_cache_store
+        detail_cache.store = detail_cache_store
+    
+    # Indeks metadata dokumen untuk pencarian lokal
+    search_index = SearchIndex(SEARCH_INDEX_PATH) if SEARCH_INDEX_ENABLED else None
+    
+    # Job analisis tahan restart; dipakai bersama oleh semua shard, owner menandai
+    # shard yang menjalankan job
+    job_store = JobStore(owner=f"shard-{SHARD_INDEX}")
     
-    return has_quoted, quoted_message, quoted_type
+    # Antrean pesan per chat memakai kunci chat yang sama dengan scheduler, sesi, dan
+    # job store, sehingga job yang dilanjutkan setelah restart masuk antrean yang sama
+    outbox.chat_key = chat_id_string
+    
+    # Statistik setiap komponen diekspor sebagai gauge di endpoint metrik
+    metrics.register("http", http_client.stats)
+    metrics.register("pdf_text_cache", pdf_text_cache.stats)
+    metrics.register("gemini_cache", gemini_response_cache.stats)
+    metrics.register("search_cache", search_cache.stats)
+    metrics.register("detail_cache", detail_cache.stats)
+    metrics.register("singleflight", singleflight.stats)
+    metrics.register("scheduler", scheduler.stats)
+    metrics.register("gemini_limiter", gemini_limiter.stats)
+    metrics.register("pdf_extractor", pdf_extractor.stats)
+    metrics.register("search_sessions", last_search_results.stats)
+    metrics.register("pdf_url_cache", pdf_url_cache.stats)
+    metrics.register("prefetch", prefetcher.stats)
+    if search_index is not None:
+        metrics.register("search_index", search_index.stats)
+    if SHARD_COUNT > 1:
+        metrics.register("search_cache_store", search_cache_store.stats)
+        metrics.register("detail_cache_store", detail_cache_store.stats)
+    metrics.register("scratch", scratch.stats)
+    metrics.register("router", router.stats)
+    metrics.register("outbox", outbox.stats)
+    metrics.register("jobs", job_store.stats)
+    metrics.register("startup", lambda: startup_stats)
+    metrics_server = MetricsServer(metrics, port=METRICS_PORT + SHARD_INDEX, health=shard_health)
+
+# Buat ClientFactory dan satu client untuk setiap perangkat milik shard ini.
+# neonize (library Go beserta protobuf-nya) baru di-import di sini.
+def create_client_factory():
+    from neonize.aioze.client import ClientFactory
+    from neonize.events import ConnectedEv, MessageEv
+    from neonize.utils import log as neonize_log
+    
+    # Level logger neonize menentukan level log whatsmeow saat client terhubung
+    neonize_log.setLevel(LOG_LEVEL)
+    
+    factory = ClientFactory(WHATSAPP_DB_PATH)
+    factory.event(ConnectedEv)(on_connected)
+    factory.event(MessageEv)(on_message)
+    
+    # Load existing sessions milik shard ini
+    for device in factory.get_all_devices():
+        if shard_for(device.JID.User, SHARD_COUNT) == SHARD_INDEX:
+            factory.new_client(device.JID)
+    return factory
 
-# Fungsi download langsung dari URL jika tersedia
-async def download_from_url(url):
+# Status untuk health check supervisor: endpoint yang menjawab berarti event loop shard ini tidak macet
+def shard_health():
+    return {
+        "ok": True,
+        "shard": SHARD_INDEX,
+        "shards": SHARD_COUNT,
+        "devices": len(client_factory.clients),
+        "active_analyses": len(active_analyses),
+        "outbox_pending": outbox.pending,
+    }
+
+# Fungsi download langsung dari URL ke file secara streaming
+# PDF kecil ditampung di memori dan tidak ditulis ke dest_path.
+# Mengembalikan tuple (path file atau isi PDF dalam bytes, atau None jika gagal; pesan error)
+@metrics.timed("stage", is_error=lambda result: result[0] is None, stage="download")
+async def download_from_url(url, dest_path, memory_limit=SCRATCH_MEMORY_LIMIT):
     try:
         log.info(f"Downloading from URL: {url}")
-        response = requests.get(url, timeout=30)
-        if response.status_code == 200:
-            log.info(f"Successfully downloaded {len(response.content)} bytes from URL")
-            return response.content
-        else:
-            log.error(f"Failed to download from URL: status code {response.status_code}")
-            return None
+
+        def log_progress(downloaded, total):
+            if total:
+                log.debug(f"Downloading {url}: {downloaded}/{total} bytes ({downloaded * 100 // total}%)")
+            else:
+                log.debug(f"Downloading {url}: {downloaded} bytes")
+
+        size, data = await download_pdf(http_client, url, dest_path, progress=log_progress,
+                                        memory_limit=memory_limit)
+        log.info(f"Successfully downloaded {size} bytes from URL ({'memory' if data is not None else 'file'})")
+        metrics.inc("bytes_total", size, stage="download")
+        return (data if data is not None else dest_path), None
+    except DownloadError as e:
+        log.error(f"Failed to download from URL: {e}")
+        return None, str(e)
     except Exception as e:
         log.error(f"Error downloading from URL: {e}")
         log.error(traceback.format_exc())
+        return None, str(e)
+
+# Teks PDF dari cache jika PDF di URL ini pernah diunduh dan diekstrak (tanpa download)
+async def cached_pdf_text_for_url(pdf_url, max_pages=PDF_ANALYSIS_MAX_PAGES, max_chars=PDF_ANALYSIS_MAX_CHARS):
+    digest = await asyncio.to_thread(pdf_url_cache.get, canonicalize_url(pdf_url))
+    if digest is None:
         return None
+    cache_key = pdf_text_cache_key(digest, PDF_EXTRACT_ENGINE, max_pages, max_chars)
+    return await asyncio.to_thread(pdf_text_cache.get, cache_key)
 
-# Fungsi untuk ekstraksi teks dari PDF
-async def extract_text_from_pdf(pdf_path):
+# Fungsi untuk mengunduh PDF lalu mengekstrak teksnya. File sementara langsung
+# dihapus setelah ekstraksi selesai. Download URL yang sama (URL kanonis, seperti
+# kunci job) yang sedang berjalan tidak diulang; semua pemanggil mendapat teks yang
+# sama. Jika PDF di URL ini sudah pernah diekstrak (mis. oleh prefetch), teks
+# langsung diambil dari cache.
+# job=None (prefetch) berarti tahap tidak menunggu slot scheduler.
+# on_downloaded(ukuran) dipanggil setelah download selesai, juga untuk pemanggil
+# yang bergabung ke download yang dimulai pemanggil lain.
+# download_path (job tahan restart): PDF tetap diunduh lewat scratch (memori/tmpfs),
+# lalu salinan file yang sudah lengkap disimpan di path itu; jika file itu sudah ada
+# dari sebelum restart, download dilewati.
+# Mengembalikan tuple (teks PDF atau None jika download gagal, pesan error)
+async def fetch_pdf_text(pdf_url, job=None, on_downloaded=None, download_path=None):
+    text = await cached_pdf_text_for_url(pdf_url)
+    if text is not None:
+        log.info(f"PDF text cache hit for URL {pdf_url}")
+        return text, None
+    
+    key = analysis_job_key(pdf_url)
+    waiter = {"on_downloaded": on_downloaded, "download_path": download_path, "notified": False}
+    waiters = pdf_download_waiters.setdefault(key, [])
+    waiters.append(waiter)
+    
+    def stage(name):
+        return job.stage(name) if job is not None else contextlib.nullcontext()
+    
+    # Jalankan efek samping setiap pemanggil yang sedang menunggu PDF ini
+    async def notify_downloaded(source, size):
+        for other in list(pdf_download_waiters.get(key, ())):
+            if other["notified"]:
+                continue
+            other["notified"] = True
+            try:
+                path = other["download_path"]
+                if path is not None and not os.path.exists(path):
+                    await asyncio.to_thread(persist_download, source, path)
+                if other["on_downloaded"]:
+                    await other["on_downloaded"](size)
+            except Exception as e:
+                log.error(f"Error handling downloaded PDF {pdf_url}: {e}")
+    
+    async def extract(source):
+        async with stage("extract"):
+            return await extract_text_from_pdf(source, url=pdf_url), None
+    
+    async def fetch():
+        if download_path is not None and os.path.exists(download_path):
+            log.info(f"Resuming job from downloaded file {download_path}")
+            size = os.path.getsize(download_path)
+            await notify_downloaded(download_path, size)
+            text, error = await extract(download_path)
+            return text, error, size
+        
+        with scratch.temp_path("paper", ".pdf") as temp_path:
+            async with stage("download"):
+                source, error = await download_from_url(pdf_url, temp_path, SCRATCH_MEMORY_LIMIT)
+            if source is None:
+                return None, error, None
+            size = len(source) if isinstance(source, bytes) else os.path.getsize(source)
+            await notify_downloaded(source, size)
+            text, error = await extract(source)
+            return text, error, size
+    
     try:
-        log.info(f"Extracting text from PDF: {pdf_path}")
-        text = ""
+        # Dibatalkan jika semua penunggu batal, mis. prefetch yang sesinya sudah diganti
+        text, error, size = await singleflight.do(("pdf", key), fetch, cancel_abandoned=True)
+    finally:
+        waiters.remove(waiter)
+        if not waiters and pdf_download_waiters.get(key) is waiters:
+            del pdf_download_waiters[key]
+    
+    # Bergabung setelah download selesai: teks sudah tersimpan di cache per URL (yang
+    # dibaca lebih dulu oleh job yang dilanjutkan), jadi cukup jalankan on_downloaded
+    if size is not None and not waiter["notified"] and on_downloaded:
+        await on_downloaded(size)
+    return text, error
+
+# Simpan salinan PDF yang sudah lengkap (bytes atau file scratch) ke path job. Ditulis
+# ke .part lalu di-rename, sehingga file yang terpotong tidak pernah dianggap hasil download.
+def persist_download(source, dest_path):
+    part_path = f"{dest_path}.part"
+    if isinstance(source, bytes):
+        write_file(part_path, source)
+    else:
+        shutil.copyfile(source, part_path)
+    os.replace(part_path, dest_path)
+
+# Tulis bytes ke file (dipanggil lewat asyncio.to_thread)
+def write_file(path, data):
+    with open(path, 'wb') as f:
+        f.write(data)
+
+# Fungsi untuk ekstraksi teks dari PDF (dijalankan di process pool, bukan di event loop)
+# pdf_path boleh berupa path file atau isi PDF (bytes) yang masih di memori.
+# Hasil disimpan di cache berdasarkan hash isi PDF, sehingga PDF yang sama tidak diekstrak ulang.
+# Jika url diisi, hash dicatat untuk URL itu agar teksnya bisa dipakai tanpa download ulang.
+async def extract_text_from_pdf(pdf_path, max_pages=PDF_ANALYSIS_MAX_PAGES, max_chars=PDF_ANALYSIS_MAX_CHARS, url=None):
+    try:
+        if isinstance(pdf_path, bytes):
+            log.info(f"Extracting text from in-memory PDF ({len(pdf_path)} bytes)")
+        else:
+            log.info(f"Extracting text from PDF: {pdf_path}")
+        digest = await asyncio.to_thread(file_sha256, pdf_path)
+        cache_key = pdf_text_cache_key(digest, PDF_EXTRACT_ENGINE, max_pages, max_chars)
         
-        with open(pdf_path, 'rb') as pdf_file:
-            pdf_reader = PyPDF2.PdfReader(pdf_file)
-            num_pages = len(pdf_reader.pages)
-            
-            log.info(f"PDF has {num_pages} pages")
-            
-            # Ekstrak teks dari setiap halaman (batasi ke 10 halaman pertama untuk efisiensi)
-            max_pages = min(num_pages, 10)
-            for page_num in range(max_pages):
-                page = pdf_reader.pages[page_num]
-                page_text = page.extract_text()
-                if page_text:
-                    text += f"\n--- Halaman {page_num + 1} ---\n{page_text}\n"
-                else:
-                    text += f"\n--- Halaman {page_num + 1} tidak memiliki teks yang dapat diekstrak ---\n"
+        text = await asyncio.to_thread(pdf_text_cache.get, cache_key)
+        if text is not None:
+            log.info(f"PDF text cache hit for {digest[:12]} ({len(text)} characters)")
+        else:
+            async def extract_and_cache():
+                with metrics.timer("stage", stage="extract"):
+                    text = await pdf_extractor.extract(pdf_path, max_pages=max_pages, max_chars=max_chars)
+                metrics.inc("chars_total", len(text), stage="extract")
+                await asyncio.to_thread(pdf_text_cache.set, cache_key, text)
+                return text
             
-            if num_pages > max_pages:
-                text += f"\n--- (Teks hanya diekstrak dari {max_pages} halaman pertama dari total {num_pages} halaman) ---\n"
+            # PDF yang sama (hash sama) yang sedang diekstrak cukup ditunggu hasilnya
+            text = await singleflight.do(("extract", cache_key), extract_and_cache)
         
-        log.info(f"Successfully extracted {len(text)} characters of text from PDF")
+        if url:
+            await asyncio.to_thread(pdf_url_cache.set, canonicalize_url(url), digest)
+        log.debug(f"PDF extractor stats: {pdf_extractor.stats()}, cache stats: {pdf_text_cache.stats()}")
         return text
     except Exception as e:
         log.error(f"Error extracting text from PDF: {e}")
@@ -148,7 +411,27 @@ async def extract_text_from_pdf(pdf_path):
         return f"Error ekstraksi PDF: {str(e)}"
 
 # Fungsi untuk mengirim teks ke Gemini AI
-async def query_gemini_text(text):
+# Respons yang berhasil disimpan di cache; force_refresh=True melewati cache
+async def query_gemini_text(text, force_refresh=False):
+    try:
+        cache_key = gemini_cache_key(GEMINI_MODEL, text)
+        if not force_refresh:
+            cached = await asyncio.to_thread(gemini_response_cache.get, cache_key)
+            if cached is not None:
+                log.info(f"Gemini response cache hit for {cache_key}")
+                return cached
+        
+        # Prompt identik yang sedang diproses cukup ditunggu hasilnya
+        return await singleflight.do(("gemini", cache_key), lambda: request_gemini_text(text, cache_key))
+    except Exception as e:
+        log.error(f"Exception in query_gemini_text: {e}")
+        return f"Error: {str(e)}"
+
+# Fungsi untuk mengirim request ke Gemini API dan menyimpan respons yang berhasil
+# Request melewati rate limiter: dicoba ulang saat 429/5xx dan ditolak cepat saat circuit terbuka
+async def request_gemini_text(text, cache_key):
+    import aiohttp
+    
     try:
         log.info(f"Sending text to Gemini: {text[:50]}...")
         
@@ -168,117 +451,704 @@ async def query_gemini_text(text):
             "Content-Type": "application/json"
         }
         
-        async with aiohttp.ClientSession() as session:
-            async with session.post(GEMINI_CONTENT_URL, json=payload, headers=headers) as response:
-                response_text = await response.text()
-                
-                if response.status == 200:
-                    response_json = json.loads(response_text)
-                    try:
-                        return response_json["candidates"][0]["content"]["parts"][0]["text"]
-                    except (KeyError, IndexError) as e:
-                        log.error(f"Error parsing Gemini response: {e}")
-                        return "Terjadi kesalahan saat memproses respons dari Gemini AI."
-                else:
-                    log.error(f"Gemini API error: {response_text}")
-                    return f"Error dari Gemini API: Status {response.status}."
+        @metrics.timed("stage", is_error=is_gemini_error, stage="gemini")
+        async def send():
+            try:
+                async with http_client.post(GEMINI_CONTENT_URL, json=payload, headers=headers) as response:
+                    response_text = await response.text()
+                    
+                    if response.status == 200:
+                        response_json = json.loads(response_text)
+                        try:
+                            result = response_json["candidates"][0]["content"]["parts"][0]["text"]
+                        except (KeyError, IndexError) as e:
+                            log.error(f"Error parsing Gemini response: {e}")
+                            return "Terjadi kesalahan saat memproses respons dari Gemini AI."
+                        await asyncio.to_thread(gemini_response_cache.set, cache_key, result)
+                        return result
+                    elif response.status in RETRYABLE_STATUSES:
+                        try:
+                            error_json = json.loads(response_text)
+                        except ValueError:
+                            error_json = None
+                        raise RetryableError(
+                            f"Gemini API status {response.status}",
+                            status=response.status,
+                            retry_after=parse_retry_after(response.headers, error_json),
+                        )
+                    else:
+                        log.error(f"Gemini API error: {response_text}")
+                        return f"Error dari Gemini API: Status {response.status}."
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                raise RetryableError(f"Gemini connection error: {e}") from e
+        
+        metrics.inc("chars_total", len(text), stage="gemini")
+        return await gemini_limiter.run(send, tokens=estimate_tokens(text))
+    except RetryableError as e:
+        log.error(f"Gemini API error after retries: {e} ({gemini_limiter.stats()})")
+        if e.status:
+            return f"Error dari Gemini API: Status {e.status}."
+        return f"Error: {str(e)}"
+    except CircuitOpenError as e:
+        log.error(f"Gemini request rejected: {e}")
+        return "⚠️ Layanan Gemini AI sedang mengalami gangguan. Silakan coba lagi beberapa saat lagi."
     except Exception as e:
-        log.error(f"Exception in query_gemini_text: {e}")
+        log.error(f"Exception in request_gemini_text: {e}")
         return f"Error: {str(e)}"
 
-# Fungsi untuk mencari dokumen dari repository API
+def is_gemini_error(response):
+    return not response or response.startswith(GEMINI_ERROR_PREFIXES)
+
+# Fungsi untuk mengirim teks ke Gemini AI dengan streaming (streamGenerateContent).
+# Setiap poin yang sudah selesai ditulis langsung diteruskan ke on_section, sehingga
+# pengguna tidak perlu menunggu seluruh respons. Jika streaming gagal sebelum ada
+# bagian yang terkirim karena koneksi stream terputus, dipakai request biasa
+# (query_gemini_text) sebagai cadangan. Status error dari API tidak dicoba ulang
+# lewat request biasa karena request yang sama akan gagal dengan cara yang sama.
+async def query_gemini_stream(text, on_section, force_refresh=False):
+    import aiohttp
+    
+    cache_key = gemini_cache_key(GEMINI_MODEL, text)
+    if not force_refresh:
+        cached = await asyncio.to_thread(gemini_response_cache.get, cache_key)
+        if cached is not None:
+            log.info(f"Gemini response cache hit for {cache_key}")
+            for section in split_sections(cached):
+                await on_section(section)
+            return cached
+    
+    payload = {"contents": [{"parts": [{"text": text}]}]}
+    headers = {"Content-Type": "application/json"}
+    delivered = 0
+    
+    @metrics.timed("stage", is_error=is_gemini_error, stage="gemini_stream")
+    async def send():
+        nonlocal delivered
+        splitter = SectionSplitter()
+        pieces = []
+        started = time.perf_counter()
+        try:
+            async with http_client.post(GEMINI_STREAM_URL, json=payload, headers=headers) as response:
+                if response.status != 200:
+                    response_text = await response.text()
+                    log.error(f"Gemini streaming API error: {response_text}")
+                    if response.status in RETRYABLE_STATUSES:
+                        try:
+                            error_json = json.loads(response_text)
+                        except ValueError:
+                            error_json = None
+                        raise RetryableError(
+                            f"Gemini API status {response.status}",
+                            status=response.status,
+                            retry_after=parse_retry_after(response.headers, error_json),
+                        )
+                    return f"Error dari Gemini API: Status {response.status}."
+                
+                async for event in iter_sse_json(response):
+                    piece = chunk_text_from_event(event)
+                    pieces.append(piece)
+                    for section in splitter.feed(piece):
+                        if not delivered:
+                            metrics.observe("gemini_first_section_seconds", time.perf_counter() - started)
+                        await on_section(section)
+                        delivered += 1
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            if delivered:
+                raise
+            raise RetryableError(f"Gemini connection error: {e}") from e
+        
+        for section in splitter.flush():
+            await on_section(section)
+            delivered += 1
+        
+        result = "".join(pieces)
+        if not result:
+            raise ValueError("Empty streaming response")
+        await asyncio.to_thread(gemini_response_cache.set, cache_key, result)
+        return result
+    
+    try:
+        log.info(f"Streaming text to Gemini: {text[:50]}...")
+        metrics.inc("chars_total", len(text), stage="gemini_stream")
+        response = await gemini_limiter.run(send, tokens=estimate_tokens(text))
+        if not delivered:
+            # Status error dari API: pesan error belum dikirim ke pengguna
+            await on_section(response)
+        return response
+    except Exception as e:
+        log.error(f"Exception in query_gemini_stream: {e}")
+        if delivered:
+            message = "⚠️ Analisis terputus sebelum selesai. Silakan coba lagi."
+            await on_section(message)
+            return message
+        if isinstance(e, CircuitOpenError):
+            message = "⚠️ Layanan Gemini AI sedang mengalami gangguan. Silakan coba lagi beberapa saat lagi."
+            await on_section(message)
+            return message
+        if isinstance(e, RetryableError) and e.status:
+            message = f"Error dari Gemini API: Status {e.status}."
+            await on_section(message)
+            return message
+    
+    log.info("Falling back to non-streaming Gemini request")
+    response = await query_gemini_text(text, force_refresh=force_refresh)
+    await on_section(response)
+    return response
+
+# Hitung token teks dengan endpoint countTokens Gemini.
+# Mengembalikan None jika gagal; pemanggil lalu memakai perkiraan lokal.
+@metrics.timed("stage", is_error=lambda result: result is None, stage="gemini_count")
+async def count_gemini_tokens(text):
+    import aiohttp
+    
+    payload = {"contents": [{"parts": [{"text": text}]}]}
+    headers = {"Content-Type": "application/json"}
+    try:
+        timeout = aiohttp.ClientTimeout(total=GEMINI_COUNT_TIMEOUT)
+        async with http_client.post(GEMINI_COUNT_URL, json=payload, headers=headers, timeout=timeout) as response:
+            response_text = await response.text()
+            if response.status != 200:
+                log.warning(f"Gemini countTokens status {response.status}: {response_text[:200]}")
+                return None
+            return json.loads(response_text).get("totalTokens")
+    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+        log.warning(f"Gemini countTokens failed: {e}")
+        return None
+
+# Fungsi untuk menganalisis teks dokumen dengan Gemini. Teks dipadatkan dulu, lalu
+# dokumen panjang diringkas per bagian dan digabung (map-reduce), bukan dipotong.
+# Hasil akhir dikirim melalui on_section: per poin jika streaming aktif, atau
+# sekaligus dalam satu pesan jika tidak.
+async def analyze_document_text(prompt, pdf_text, on_section, force_refresh=False, title=None):
+    if PDF_COMPACT_TEXT:
+        pdf_text, compaction = await asyncio.to_thread(compact_document_text, pdf_text, PDF_DROP_REFERENCES)
+        metrics.inc("chars_removed_total", compaction["chars_before"] - compaction["chars_after"], stage="compaction")
+        log.info(
+            f"Compacted document text {compaction['chars_before']} -> {compaction['chars_after']} chars "
+            f"({compaction['running_lines']} header/footer lines, {compaction['reference_chars']} reference chars)"
+        )
+    
+    async def query(text):
+        return await query_gemini_text(text, force_refresh=force_refresh)
+    
+    delivered = False
+    
+    async def deliver(section):
+        nonlocal delivered
+        delivered = True
+        await on_section(section)
+    
+    async def final_query(text):
+        if GEMINI_STREAMING:
+            return await query_gemini_stream(text, deliver, force_refresh=force_refresh)
+        return await query(text)
+    
+    started = time.monotonic()
+    response = await map_reduce_analysis(
+        prompt, pdf_text, query, is_gemini_error, title=title, final_query_fn=final_query,
+        count_tokens=count_gemini_tokens if GEMINI_COUNT_TOKENS else None,
+        max_chunks=max_chunks_for_rpm(GEMINI_REQUESTS_PER_MINUTE),
+    )
+    log.info(f"Document analysis finished in {time.monotonic() - started:.2f}s")
+    
+    if not delivered:
+        await on_section(response)
+    return response
+
+def spawn_background(coro):
+    task = asyncio.ensure_future(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+# Fungsi untuk mencari dokumen. Jika indeks lokal punya cukup hasil, jawab langsung
+# dari indeks dan sinkronkan ke API di background. Jika tidak, tanya API (melalui
+# cache hasil pencarian); saat API gagal atau terlalu lambat, pakai hasil indeks.
 async def search_repository(keyword):
+    key = normalize_keyword(keyword)
+    
+    def remote():
+        return search_cache.get_or_fetch(
+            key, lambda: singleflight.do(("search", key), lambda: fetch_search_results(keyword))
+        )
+    
+    if search_index is None:
+        return await remote()
+    
+    local = await asyncio.to_thread(search_index.search, keyword)
+    if local and local["count"] >= SEARCH_INDEX_MIN_RESULTS:
+        log.info(f"Search index answered {keyword!r} with {local['count']} results")
+        spawn_background(remote())
+        return local
+    
+    # Request tetap berjalan setelah timeout agar hasilnya masuk ke cache dan indeks
+    task = spawn_background(remote())
+    try:
+        results = await asyncio.wait_for(asyncio.shield(task), SEARCH_REMOTE_TIMEOUT)
+    except asyncio.TimeoutError:
+        log.warning(f"Repository search timed out after {SEARCH_REMOTE_TIMEOUT}s: {keyword!r}")
+        results = None
+    
+    if results:
+        return results
+    if local and local["data"]:
+        log.warning(f"Repository API unavailable, serving {local['count']} results from search index")
+        return dict(local, degraded=True)
+    return None
+
+# Fungsi untuk mencari dokumen dari repository API
+@metrics.timed("stage", is_error=lambda result: result is None, stage="search")
+async def fetch_search_results(keyword):
     try:
         log.info(f"Searching repository for: {keyword}")
         
         url = f"{REPOSITORY_API_BASE_URL}/search?q={keyword}"
         
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url) as response:
-                response_text = await response.text()
-                
-                if response.status == 200:
-                    response_json = json.loads(response_text)
-                    if response_json.get("status") == "success":
-                        return response_json
-                    else:
-                        log.error(f"Repository API error: {response_json.get('message', 'Unknown error')}")
-                        return None
+        async with http_client.get(url) as response:
+            response_text = await response.text()
+            
+            if response.status == 200:
+                response_json = json.loads(response_text)
+                if response_json.get("status") == "success":
+                    if search_index is not None:
+                        await asyncio.to_thread(search_index.add_results, response_json.get("data") or [])
+                    return response_json
                 else:
-                    log.error(f"Repository API error: Status {response.status}")
+                    log.error(f"Repository API error: {response_json.get('message', 'Unknown error')}")
                     return None
+            else:
+                log.error(f"Repository API error: Status {response.status}")
+                return None
     except Exception as e:
-        log.error(f"Error in search_repository: {e}")
+        log.error(f"Error in fetch_search_results: {e}")
         log.error(traceback.format_exc())
         return None
 
-# Fungsi untuk mendapatkan detail dokumen dari repository API
+# Fungsi untuk mendapatkan detail dokumen (melalui cache detail).
+# Jika API gagal, detail diambil dari indeks lokal bila pernah diindeks.
 async def get_document_detail(url):
+    key = canonicalize_url(url)
+    detail = await detail_cache.get_or_fetch(
+        key, lambda: singleflight.do(("detail", key), lambda: fetch_document_detail(url))
+    )
+    if detail is None and search_index is not None:
+        detail = await asyncio.to_thread(search_index.get_detail, url)
+        if detail is not None:
+            log.warning(f"Repository API unavailable, serving detail from search index: {url}")
+    return detail
+
+# Fungsi untuk mendapatkan detail dokumen dari repository API
+@metrics.timed("stage", is_error=lambda result: result is None, stage="detail")
+async def fetch_document_detail(url):
     try:
         log.info(f"Getting document detail for: {url}")
         
         api_url = f"{REPOSITORY_API_BASE_URL}/detail?url={url}"
         
-        async with aiohttp.ClientSession() as session:
-            async with session.get(api_url) as response:
-                response_text = await response.text()
-                
-                if response.status == 200:
-                    response_json = json.loads(response_text)
-                    if response_json.get("status") == "success":
-                        return response_json.get("data")
-                    else:
-                        log.error(f"Repository API error: {response_json.get('message', 'Unknown error')}")
-                        return None
+        async with http_client.get(api_url) as response:
+            response_text = await response.text()
+            
+            if response.status == 200:
+                response_json = json.loads(response_text)
+                if response_json.get("status") == "success":
+                    data = response_json.get("data")
+                    if data and search_index is not None:
+                        await asyncio.to_thread(search_index.add_detail, url, data)
+                    return data
                 else:
-                    log.error(f"Repository API error: Status {response.status}")
+                    log.error(f"Repository API error: {response_json.get('message', 'Unknown error')}")
                     return None
+            else:
+                log.error(f"Repository API error: Status {response.status}")
+                return None
     except Exception as e:
-        log.error(f"Error in get_document_detail: {e}")
+        log.error(f"Error in fetch_document_detail: {e}")
         log.error(traceback.format_exc())
         return None
 
-# Fungsi untuk mendownload PDF dari link dan menganalisisnya
-async def download_and_analyze_paper(client, chat, pdf_url, title, authors, year, abstract=None):
+# Isi indeks pencarian dari daftar kata kunci (bulk harvest), termasuk detail
+# dokumen yang belum pernah diindeks. Berjalan pelan di background.
+async def harvest_search_index(keywords, delay=SEARCH_INDEX_HARVEST_DELAY):
+    for keyword in keywords:
+        results = await fetch_search_results(keyword)
+        for item in (results or {}).get("data", []):
+            url = item.get("url")
+            if url and not await asyncio.to_thread(search_index.has_detail, url):
+                await asyncio.sleep(delay)
+                await fetch_document_detail(url)
+        await asyncio.sleep(delay)
+    log.info(f"Search index harvest finished: {search_index.stats()}")
+
+# Identitas chat dan perangkat bot seperti yang disimpan di job store
+def chat_id_string(chat):
+    return f"{chat.User}@{chat.Server}"
+
+def parse_chat_id(chat_id):
+    from neonize.utils.jid import build_jid
+    
+    user, server = chat_id.split("@", 1)
+    return build_jid(user, server)
+
+def client_device(client):
+    return client.uuid.decode() if isinstance(client.uuid, bytes) else str(client.uuid)
+
+def client_for_device(device):
+    for client in client_factory.clients:
+        if client_device(client) == device:
+            return client
+    return None
+
+def analysis_job_key(pdf_url):
+    return f"pdf:{canonicalize_url(pdf_url)}"
+
+# Fungsi untuk mendownload PDF dari link dan menganalisisnya.
+# Permintaan dicatat di job store: PDF yang sedang dianalisis untuk chat lain tidak
+# diproses ulang, chat ini cukup ikut menerima hasilnya.
+async def download_and_analyze_paper(client, chat, pdf_url, title, authors, year, abstract=None, force_refresh=False):
     try:
         log.info(f"Downloading and analyzing paper: {title}")
         
-        # Kirim pesan sedang mengunduh
-        await client.send_message(chat, f"📄 Mengunduh karya ilmiah: *{title}* ({year})")
+        key = analysis_job_key(pdf_url)
+        chat_id = chat_id_string(chat)
+        payload = {
+            "pdf_url": pdf_url,
+            "title": title,
+            "authors": authors,
+            "year": year,
+            "abstract": abstract,
+            "force_refresh": force_refresh,
+        }
+        await asyncio.to_thread(job_store.subscribe, key, payload, chat_id, client_device(client))
         
-        # Download PDF
-        media_bytes = await download_from_url(pdf_url)
+        fanout = active_analyses.get(key)
+        if fanout is not None:
+            if chat_id not in fanout.subscribers:
+                outbox.send(client, chat, f"⏳ *{title}* sedang dianalisis untuk chat lain, hasilnya akan dikirim juga ke sini.")
+                fanout.join(client, chat, chat_id)
+            return
         
-        if not media_bytes:
-            await client.send_message(chat, "❌ Gagal mengunduh PDF karya ilmiah")
+        # Daftarkan job ke scheduler; tolak jika antrean sudah penuh
+        try:
+            job = scheduler.admit(chat_id_string(chat))
+        except SchedulerFull as e:
+            await asyncio.to_thread(job_store.unsubscribe, key, chat_id)
+            outbox.send(client, chat, str(e))
             return
         
-        # Simpan PDF
-        temp_path = f"temp_media/paper_{os.urandom(4).hex()}.pdf"
-        with open(temp_path, 'wb') as f:
-            f.write(media_bytes)
+        fanout = active_analyses[key] = JobFanout(outbox)
+        fanout.join(client, chat, chat_id)
+        with job:
+            await run_analysis_job(key, job, fanout)
         
-        # Ekstrak teks dari PDF
-        await client.send_message(chat, "⏳ Mengekstrak teks dari PDF karya ilmiah...")
-        pdf_text = await extract_text_from_pdf(temp_path)
+    except Exception as e:
+        log.error(f"Error in download_and_analyze_paper: {e}")
+        log.error(traceback.format_exc())
+        outbox.send(client, chat, f"❌ Error saat menganalisis karya ilmiah: {str(e)}")
+
+# Jalankan job analisis sampai hasilnya terkirim ke semua chat yang memintanya.
+# Tahap yang sudah selesai sebelum restart tidak diulang: PDF yang sudah diunduh
+# dibaca dari file job, teks yang sudah diekstrak diambil dari cache, dan hasil
+# yang sudah tersimpan langsung dikirim. active_analyses[key] sudah diisi pemanggil.
+# Jika job yang sama sedang dijalankan shard lain, tunggu sampai lease-nya dilepas
+# lalu kirim hasil yang tersimpan ke chat milik shard ini.
+async def run_analysis_job(key, job, fanout):
+    renewer = None
+    try:
+        record = await asyncio.to_thread(job_store.get, key)
+        if record is None:
+            return
+        
+        # Chat yang tercatat di job store tetapi belum menunggu di proses ini (mis. dari sebelum restart)
+        for chat_id, device in await asyncio.to_thread(job_store.subscribers, key):
+            client = client_for_device(device)
+            if client is not None:
+                fanout.join(client, parse_chat_id(chat_id), chat_id)
         
-        if not pdf_text or pdf_text.startswith("Error"):
-            await client.send_message(chat, f"❌ Gagal mengekstrak teks dari PDF: {pdf_text}")
+        waiting = False
+        while not await asyncio.to_thread(job_store.claim, key):
+            if await asyncio.to_thread(job_store.get, key) is None:
+                return
+            if not waiting:
+                fanout.status(f"⏳ *{record['payload']['title']}* sedang dianalisis oleh proses bot lain, hasilnya akan dikirim ke sini.")
+                waiting = True
+            await asyncio.sleep(JOB_POLL_INTERVAL)
+        record = await asyncio.to_thread(job_store.get, key)
+        if record is None:
             return
+        renewer = asyncio.ensure_future(renew_job_lease(key))
         
-        # Buat prompt khusus untuk analisis karya ilmiah
-        authors_str = ", ".join(authors) if isinstance(authors, list) else authors
+        if record["stage"] == "analyzed":
+            for section in split_sections(record["result"]):
+                await fanout.section(section)
+            success = not is_gemini_error(record["result"])
+        elif not await asyncio.to_thread(job_store.start_attempt, key):
+            fanout.send("❌ Analisis karya ilmiah gagal setelah beberapa kali percobaan. Silakan coba lagi.")
+            success = False
+        else:
+            result, error = await run_paper_analysis(key, record["payload"], job, fanout)
+            if result is None:
+                fanout.send(error)
+                success = False
+            else:
+                await asyncio.to_thread(job_store.set_result, key, result)
+                success = not is_gemini_error(result)
         
-        prompt = f"""Analisis karya ilmiah berikut dengan detail:
+        # Job baru dihapus setelah semua pesan benar-benar terkirim
+        await fanout.drain()
+        await asyncio.to_thread(job_store.finish, key, list(fanout.subscribers), success)
+    finally:
+        if renewer is not None:
+            renewer.cancel()
+        active_analyses.pop(key, None)
+
+# Perpanjang lease job selama masih berjalan; lease shard yang mati akan kedaluwarsa
+async def renew_job_lease(key):
+    while True:
+        await asyncio.sleep(job_store.lease / 3)
+        await asyncio.to_thread(job_store.renew, key)
+
+# Tahapan analisis karya ilmiah; setiap tahap menunggu slot dari scheduler dan
+# dicatat di job store. Status tahap ditampilkan dalam satu pesan yang diperbarui.
+# Mengembalikan tuple (hasil analisis atau None jika gagal, pesan error)
+async def run_paper_analysis(key, payload, job, fanout):
+    title, year = payload["title"], payload["year"]
+    header = f"📄 Mengunduh karya ilmiah: *{title}* ({year})"
+    
+    position = job.position("download")
+    if position:
+        fanout.status(f"{header}\n⏳ Anda berada di antrean #{position}")
+    else:
+        fanout.status(header)
+    
+    async def on_downloaded(size):
+        await asyncio.to_thread(job_store.set_stage, key, "downloaded")
+        fanout.status("⏳ Mengekstrak teks dari PDF karya ilmiah...")
+    
+    # Download PDF lalu ekstrak teksnya; file job dihapus setelah ekstraksi
+    pdf_text, error = await fetch_pdf_text(payload["pdf_url"], job, on_downloaded, job_store.file_path(key))
+    
+    if pdf_text is None:
+        return None, f"❌ Gagal mengunduh PDF karya ilmiah: {error}"
+    
+    if not pdf_text or pdf_text.startswith("Error"):
+        return None, f"❌ Gagal mengekstrak teks dari PDF: {pdf_text}"
+    
+    await asyncio.to_thread(job_store.set_stage, key, "extracted")
+    
+    prompt = paper_analysis_prompt(title, payload["authors"], year, payload["abstract"])
+    
+    fanout.status("🧠 Menganalisis karya ilmiah dengan Gemini AI...")
+    
+    # Kirim hasil analisis ke semua chat (per poin begitu selesai ditulis Gemini)
+    async with job.stage("llm"):
+        result = await analyze_document_text(
+            prompt, pdf_text, fanout.section, payload["force_refresh"], title=title
+        )
+    return result, None
+
+# Lanjutkan job analisis yang terputus saat bot berhenti; dipanggil setiap kali
+# perangkat terhubung, untuk job yang diminta melalui perangkat itu
+async def resume_analysis_jobs(client):
+    for record in await asyncio.to_thread(job_store.pending, client_device(client)):
+        key = record["key"]
+        if key in active_analyses:
+            continue
+        fanout = active_analyses[key] = JobFanout(outbox)
+        log.info(f"Resuming analysis job {key} from stage {record['stage']}")
+        spawn_background(resume_analysis_job(key, record, fanout))
+
+async def resume_analysis_job(key, record, fanout):
+    try:
+        subscribers = await asyncio.to_thread(job_store.subscribers, key)
+        if not subscribers:
+            active_analyses.pop(key, None)
+            await asyncio.to_thread(job_store.finish, key, [], False)
+            return
+        for chat_id, device in subscribers:
+            client = client_for_device(device)
+            if client is not None:
+                fanout.join(client, parse_chat_id(chat_id), chat_id)
+        if record["stage"] != "analyzed":
+            fanout.send(f"♻️ Melanjutkan analisis *{record['payload']['title']}* yang terputus karena bot dimulai ulang...")
+        
+        # Job dicatat atas nama chat pertama; tunggu jika scheduler sedang penuh
+        while True:
+            try:
+                job = scheduler.admit(subscribers[0][0])
+                break
+            except SchedulerFull:
+                await asyncio.sleep(5)
+        with job:
+            await run_analysis_job(key, job, fanout)
+    except Exception as e:
+        active_analyses.pop(key, None)
+        log.error(f"Error resuming analysis job {key}: {e}")
+        log.error(traceback.format_exc())
+
+# Lengkapi data paper dari hasil pencarian dengan detail dokumen (abstrak, penulis, tahun).
+# Mengembalikan (pdf_url, title, authors, year, abstract); pdf_url None jika tidak ada link download
+async def resolve_paper(item):
+    title = item.title
+    authors = item.authors
+    year = item.year
+    
+    if not item.download_links:
+        return None, title, authors, year, ""
+    
+    pdf_url = item.download_links[0]
+    if isinstance(pdf_url, dict):
+        pdf_url = pdf_url.get("url", "")
+    
+    # Dapatkan detail tambahan jika tersedia
+    document_detail = await get_document_detail(item.url)
+    abstract = ""
+    
+    if document_detail:
+        abstract = document_detail.get("abstract", "")
+        metadata = document_detail.get("metadata", {})
+        if "Penulis" in metadata:
+            authors = metadata.get("Penulis", "").split("; ")
+        if "Tahun Terbit" in metadata:
+            year = metadata.get("Tahun Terbit", "")
+    
+    return pdf_url, title, authors, year, abstract
+
+# Detail beberapa dokumen sekaligus ("paper detail 1-5"); semua detail diambil
+# bersamaan lalu dikirim dalam satu pesan
+async def send_batch_details(client, chat, numbered_items):
+    numbers = ", ".join(str(number) for number, _ in numbered_items)
+    outbox.send(client, chat, f"🔍 Mendapatkan detail {len(numbered_items)} dokumen (nomor {numbers})...")
+    
+    details = await asyncio.gather(*(get_document_detail(item.url) for _, item in numbered_items))
+    
+    parts = []
+    for (number, item), document_detail in zip(numbered_items, details):
+        if document_detail:
+            parts.append(f"*[{number}]* {format_document_detail(document_detail)}")
+        else:
+            parts.append(f"*[{number}]* ❌ Gagal mendapatkan detail dokumen: *{item.title}*")
+    
+    outbox.send(client, chat, "\n\n━━━━━━━━━━\n\n".join(parts))
+
+# Analisis beberapa paper sekaligus ("paper analyze 1,3,4") sebagai satu job scheduler
+async def analyze_paper_batch(client, chat, numbered_items, force_refresh=False):
+    try:
+        # Daftarkan batch sebagai satu job dengan satu slot per paper, sehingga
+        # paper-paper-nya berjalan bersamaan; tolak jika antrean sudah penuh
+        try:
+            job = scheduler.admit(chat_id_string(chat), slots=len(numbered_items))
+        except SchedulerFull as e:
+            outbox.send(client, chat, str(e))
+            return
+        
+        with job:
+            await run_paper_batch(client, chat, job, numbered_items, force_refresh)
+    
+    except Exception as e:
+        log.error(f"Error in analyze_paper_batch: {e}")
+        log.error(traceback.format_exc())
+        outbox.send(client, chat, f"❌ Error saat menganalisis karya ilmiah: {str(e)}")
+
+# Semua paper diproses bersamaan (asyncio.gather); setiap tahap tetap menunggu slot
+# dari scheduler sehingga batas global dan giliran antar chat tidak dilanggar.
+# Job batch punya satu slot per paper, jadi batas per chat tidak membuatnya berurutan.
+# Hasilnya dikirim dalam satu pesan, ditutup analisis perbandingan jika diaktifkan.
+async def run_paper_batch(client, chat, job, numbered_items, force_refresh):
+    numbers = ", ".join(str(number) for number, _ in numbered_items)
+    status = (
+        f"📚 Menganalisis {len(numbered_items)} karya ilmiah (nomor {numbers}) dengan Gemini AI...\n"
+        "⏳ Hasil dikirim dalam satu pesan setelah semua selesai."
+    )
+    
+    position = job.position("download")
+    if position:
+        status += f"\n⏳ Anda berada di antrean #{position}"
+    outbox.send(client, chat, status)
+    
+    results = await asyncio.gather(
+        *(analyze_batch_item(job, item, force_refresh) for _, item in numbered_items),
+        return_exceptions=True,
+    )
+    
+    parts = [f"📚 *Hasil Analisis {len(numbered_items)} Karya Ilmiah*"]
+    analyzed = []
+    for (number, item), result in zip(numbered_items, results):
+        if isinstance(result, Exception):
+            log.error(f"Error analyzing batch item {item.title}: {result}")
+            result = (item.title, item.year, None, f"Error: {str(result)}")
+        title, year, analysis, error = result
+        if analysis is None:
+            parts.append(f"*[{number}] {title}* ({year})\n❌ {error}")
+        else:
+            parts.append(f"*[{number}] {title}* ({year})\n\n{analysis}")
+            analyzed.append((number, title, analysis))
+    
+    if BATCH_SYNTHESIS and len(analyzed) > 1:
+        async with job.stage("llm"):
+            synthesis = await query_gemini_text(batch_synthesis_prompt(analyzed), force_refresh=force_refresh)
+        if is_gemini_error(synthesis):
+            log.error(f"Batch synthesis failed: {synthesis}")
+        else:
+            parts.append(f"🧠 *Analisis Perbandingan*\n\n{synthesis}")
+    
+    outbox.send(client, chat, "\n\n━━━━━━━━━━\n\n".join(parts))
+
+# Satu paper dalam batch: unduh, ekstrak, lalu analisis tanpa mengirim pesan.
+# Mengembalikan (title, year, analisis atau None, pesan error)
+async def analyze_batch_item(job, item, force_refresh):
+    pdf_url, title, authors, year, abstract = await resolve_paper(item)
+    if not pdf_url:
+        return title, year, None, "Tidak ada link download untuk dokumen ini"
+    
+    pdf_text, error = await fetch_pdf_text(pdf_url, job)
+    
+    if pdf_text is None:
+        return title, year, None, f"Gagal mengunduh PDF karya ilmiah: {error}"
+    
+    if not pdf_text or pdf_text.startswith("Error"):
+        return title, year, None, f"Gagal mengekstrak teks dari PDF: {pdf_text}"
+    
+    # Hasil cukup dikumpulkan; pengiriman dilakukan sekali untuk seluruh batch
+    async def ignore_section(section):
+        pass
+    
+    prompt = paper_analysis_prompt(title, authors, year, abstract)
+    async with job.stage("llm"):
+        response = await analyze_document_text(prompt, pdf_text, ignore_section, force_refresh, title=title)
+    
+    if is_gemini_error(response):
+        return title, year, None, response
+    return title, year, response, None
+
+# Prompt perbandingan antar paper, disusun dari hasil analisis masing-masing paper
+def batch_synthesis_prompt(analyzed):
+    prompt = "Berikut hasil analisis beberapa karya ilmiah:\n\n"
+    for number, title, analysis in analyzed:
+        prompt += f"=== [{number}] {title} ===\n{analysis}\n\n"
+    prompt += """Buat analisis perbandingan dari karya-karya ilmiah di atas dengan mencakup aspek berikut:
+1. Persamaan tema, tujuan, dan pendekatan
+2. Perbedaan metodologi dan ruang lingkup penelitian
+3. Temuan yang saling mendukung atau bertentangan
+4. Kelebihan dan keterbatasan masing-masing karya
+5. Rekomendasi karya yang paling relevan untuk dibaca lebih dulu beserta alasannya
+
+Sebut setiap karya dengan nomornya, misalnya [1], dan berikan jawaban yang ringkas serta terstruktur."""
+    return prompt
+
+# Buat prompt khusus untuk analisis karya ilmiah
+def paper_analysis_prompt(title, authors, year, abstract=None):
+    authors_str = ", ".join(authors) if isinstance(authors, list) else authors
+    
+    prompt = f"""Analisis karya ilmiah berikut dengan detail:
 Judul: {title}
 Penulis: {authors_str}
 Tahun: {year}
 """
-        
-        if abstract:
-            prompt += f"Abstrak: {abstract}\n\n"
-        
-        prompt += """Berikan rangkuman yang komprehensif dari karya ilmiah ini dengan mencakup aspek berikut:
+    
+    if abstract:
+        prompt += f"Abstrak: {abstract}\n\n"
+    
+    prompt += """Berikan rangkuman yang komprehensif dari karya ilmiah ini dengan mencakup aspek berikut:
 1. Ringkasan singkat tentang apa isi dokumen ini
 2. Kontribusi utama atau temuan penting dalam penelitian ini
 3. Metodologi yang digunakan (jika ada)
@@ -286,37 +1156,126 @@ Tahun: {year}
 5. Relevansi dan signifikansi karya ilmiah ini
 
 Tolong berikan informasi dalam format yang terstruktur dan mudah dipahami."""
+    return prompt
+
+# Fungsi untuk menganalisis dokumen PDF yang direply
+async def analyze_quoted_document(client, chat, quoted_message, force_refresh=False):
+    # Daftarkan job ke scheduler; tolak jika antrean sudah penuh
+    try:
+        job = scheduler.admit(chat_id_string(chat))
+    except SchedulerFull as e:
+        outbox.send(client, chat, str(e))
+        return
+    
+    with job:
+        await run_quoted_document_analysis(client, chat, job, quoted_message, force_refresh)
+
+# Tahapan analisis dokumen yang direply; setiap tahap menunggu slot dari scheduler
+async def run_quoted_document_analysis(client, chat, job, quoted_message, force_refresh):
+    status = outbox.progress(client, chat)
+    header = "📄 Mengunduh dan memproses dokumen yang direply..."
+    
+    # Download dokumen
+    media_bytes, mime_type = None, None
+    position = job.position("download")
+    if position:
+        status.update(f"{header}\n⏳ Anda berada di antrean #{position}")
+    else:
+        status.update(header)
+    
+    async with job.stage("download"):
+        try:
+            # Coba download media
+            from neonize.proto.waE2E.WAWebProtobufsE2E_pb2 import Message
+            
+            message_obj = Message()
+            message_obj.documentMessage.CopyFrom(quoted_message.documentMessage)
+            media_bytes = await client.download_any(message_obj)
+            
+            if media_bytes:
+                mime_type = "application/pdf"
+        except Exception as e:
+            log.error(f"Error downloading document: {e}")
+            log.error(traceback.format_exc())
         
-        # Batasi teks jika terlalu panjang
-        max_length = 16000  # Batas karakter untuk input ke Gemini
-        if len(pdf_text) > max_length:
-            pdf_text = pdf_text[:max_length] + "...[teks terpotong karena terlalu panjang]"
-        
-        # Gabungkan prompt dan teks PDF
-        full_prompt = f"{prompt}\n\nIsi Dokumen PDF:\n{pdf_text}"
+    if not media_bytes:
+        outbox.send(client, chat, "❌ Gagal mengunduh dokumen PDF")
+        return
         
-        await client.send_message(chat, "🧠 Menganalisis karya ilmiah dengan Gemini AI...")
-        response = await query_gemini_text(full_prompt)
+    # Verifikasi mime_type untuk PDF
+    if not mime_type or not mime_type.lower() == "application/pdf":
+        outbox.send(client, chat, f"❌ Dokumen bukan PDF. Tipe: {mime_type}")
+        return
         
-        # Kirim hasil analisis
-        await client.send_message(chat, response)
+    # Ekstrak teks dari PDF
+    status.update("⏳ Mengekstrak teks dari PDF...")
+    async with job.stage("extract"):
+        if len(media_bytes) <= SCRATCH_MEMORY_LIMIT:
+            # Dokumen kecil diekstrak langsung dari memori
+            pdf_text = await extract_text_from_pdf(media_bytes)
+        else:
+            with scratch.temp_path("document", ".pdf") as temp_path:
+                await asyncio.to_thread(write_file, temp_path, media_bytes)
+                pdf_text = await extract_text_from_pdf(temp_path)
+    
+    if not pdf_text or pdf_text.startswith("Error"):
+        outbox.send(client, chat, f"❌ Gagal mengekstrak teks dari PDF: {pdf_text}")
+        return
         
-    except Exception as e:
-        log.error(f"Error in download_and_analyze_paper: {e}")
-        log.error(traceback.format_exc())
-        await client.send_message(chat, f"❌ Error saat menganalisis karya ilmiah: {str(e)}")
+    # Buat prompt untuk analisis
+    prompt = """Analisis karya ilmiah ini dengan mencakup aspek berikut:
+1. Ringkasan singkat tentang apa isi dokumen ini
+2. Kontribusi utama atau temuan penting dalam penelitian
+3. Metodologi yang digunakan (jika ada)
+4. Kesimpulan dan implikasi dari penelitian
+5. Relevansi dan signifikansi karya ilmiah ini
+
+Tolong berikan informasi dalam format yang terstruktur dan mudah dipahami."""
+    
+    status.update("🧠 Menganalisis dokumen dengan Gemini AI...")
+    
+    # Kirim hasil analisis (per poin begitu selesai ditulis Gemini)
+    async def send_section(section):
+        outbox.send(client, chat, section, merge=False)
+    
+    async with job.stage("llm"):
+        await analyze_document_text(prompt, pdf_text, send_section, force_refresh)
+
+# Ambil detail dan teks PDF satu hasil pencarian ke cache (dipanggil oleh prefetcher).
+# PDF hanya diunduh selama anggaran byte prefetch masih tersisa.
+async def prefetch_search_item(item):
+    if item.url:
+        await get_document_detail(item.url)
+    if not item.download_links:
+        return
+    pdf_url = item.download_links[0]
+    if isinstance(pdf_url, dict):
+        pdf_url = pdf_url.get("url", "")
+    if not pdf_url or await cached_pdf_text_for_url(pdf_url) is not None:
+        return
+    if prefetcher.budget_left() <= 0:
+        prefetcher.over_budget += 1
+        return
+    
+    async def on_downloaded(size):
+        prefetcher.consume(size)
+    
+    log.debug(f"Prefetching PDF text: {pdf_url}")
+    await fetch_pdf_text(pdf_url, on_downloaded=on_downloaded)
 
 # Fungsi untuk mengirim hasil pencarian
 async def send_search_results(client, chat, results, keyword):
     try:
         if not results or "data" not in results or not results["data"]:
-            await client.send_message(chat, f"❌ Tidak ditemukan hasil untuk pencarian: *{keyword}*")
+            outbox.send(client, chat, f"❌ Tidak ditemukan hasil untuk pencarian: *{keyword}*")
             return
         
         count = results.get("count", 0)
         total = results.get("total", 0)
         
         header = f"🔍 Hasil pencarian untuk: *{keyword}*\n"
+        if results.get("degraded"):
+            header += "⚠️ Repository sedang tidak dapat diakses, hasil diambil dari indeks lokal.\n"
         header += f"Menampilkan {count} dari {total} hasil\n\n"
         
         # Batasi jumlah hasil yang dikirim untuk menghindari pesan terlalu panjang
@@ -346,303 +1305,235 @@ async def send_search_results(client, chat, results, keyword):
         
         message += "\nKetik *paper detail [nomor]* untuk melihat detail dan *paper analyze [nomor]* untuk menganalisis isi paper."
         
-        await client.send_message(chat, message)
+        outbox.send(client, chat, message)
         
         # Simpan hasil pencarian untuk digunakan nanti
-        chat_id_str = str(chat)  # Menggunakan string sebagai kunci
-        last_search_results[chat_id_str] = results
+        chat_id_str = chat_id_string(chat)
+        await asyncio.to_thread(last_search_results.put, chat_id_str, results)
+        
+        # Panaskan detail dan teks PDF hasil yang ditampilkan; prefetch lama chat ini dibatalkan
+        if PREFETCH_ENABLED:
+            prefetcher.schedule(chat_id_str, [SearchItem.from_result(item) for item in data], prefetch_search_item)
         
     except Exception as e:
         log.error(f"Error in send_search_results: {e}")
         log.error(traceback.format_exc())
-        await client.send_message(chat, f"❌ Error saat mengirim hasil pencarian: {str(e)}")
+        outbox.send(client, chat, f"❌ Error saat mengirim hasil pencarian: {str(e)}")
 
-@client_factory.event(ConnectedEv)
-async def on_connected(_: NewAClient, __: ConnectedEv):
-    log.info("⚡ WhatsApp terhubung")
+# Handler event neonize; didaftarkan di create_client_factory()
+async def on_connected(client, __):
+    if "connected_seconds" not in startup_stats:
+        startup_stats["connected_seconds"] = time.perf_counter() - process_started
+        log.info(f"⚡ WhatsApp terhubung ({startup_stats['connected_seconds']:.2f}s sejak start)")
+    else:
+        log.info("⚡ WhatsApp terhubung")
+    spawn_background(resume_analysis_jobs(client))
 
-@client_factory.event(MessageEv)
-async def on_message(client: NewAClient, message: MessageEv):
+async def on_message(client, message):
     await handle_message(client, message)
 
 async def handle_message(client, message):
     try:
-        chat = message.Info.MessageSource.Chat
-        chat_id_str = str(chat)  # Menggunakan string sebagai kunci dictionary
-        
-        # Extract text content
-        if hasattr(message.Message, 'conversation') and message.Message.conversation:
-            text = message.Message.conversation
-        elif hasattr(message.Message, 'extendedTextMessage') and message.Message.extendedTextMessage.text:
-            text = message.Message.extendedTextMessage.text
-        else:
-            text = ""
-        
-        # Get quoted message if any
-        has_quoted, quoted_message, quoted_type = await get_quoted_message_info(message)
-        
-        # Handle commands
-        if text.lower() == "ping":
-            await client.reply_message("pong", message)
+        await router.dispatch(client, message)
+    except Exception as e:
+        log.error(f"Error in message handler: {e}")
+        log.error(traceback.format_exc())
 
-        # Command untuk mencari dokumen di repositori
-        elif text.lower().startswith("paper search "):
-            keyword = text[13:]  # Remove "paper search " prefix
-            await client.send_message(chat, f"🔍 Mencari dokumen dengan kata kunci: *{keyword}*...")
-            
-            results = await search_repository(keyword)
-            if results:
-                await send_search_results(client, chat, results, keyword)
+# Format pesan detail dokumen dari hasil get_document_detail
+def format_document_detail(document_detail):
+    title = document_detail.get("title", "Tidak ada judul")
+    abstract = document_detail.get("abstract", "Tidak ada abstrak")
+    metadata = document_detail.get("metadata", {})
+    download_links = document_detail.get("download_links", [])
+    
+    # Format authors dari metadata
+    authors = metadata.get("Penulis", "Tidak ada penulis").split("; ")
+    year = metadata.get("Tahun Terbit", "Tidak ada tahun")
+    
+    # Tampilkan detail dokumen
+    detail_message = f"📝 *Detail Dokumen*\n\n"
+    detail_message += f"*Judul:* {title}\n"
+    detail_message += f"*Penulis:* {', '.join(authors)}\n"
+    detail_message += f"*Tahun:* {year}\n\n"
+    detail_message += f"*Abstrak:*\n{abstract}\n\n"
+    
+    # Tampilkan metadata lainnya
+    if metadata:
+        detail_message += "*Metadata Lainnya:*\n"
+        for key, value in metadata.items():
+            if key not in ["Penulis", "Tahun Terbit"]:
+                detail_message += f"{key}: {value}\n"
+    
+    # Tampilkan link download
+    if download_links:
+        detail_message += "\n*Link Download:*\n"
+        for i, link in enumerate(download_links):
+            if isinstance(link, dict):
+                detail_message += f"{i+1}. {link.get('label', 'Link')}: {link.get('url', '#')}\n"
             else:
-                await client.send_message(chat, f"❌ Gagal mencari dokumen dengan kata kunci: *{keyword}*")
+                detail_message += f"{i+1}. {link}\n"
+    
+    return detail_message
 
-        # Command untuk melihat detail dokumen
-        elif text.lower().startswith("paper detail "):
-            try:
-                index = int(text[13:]) - 1  # Remove "paper detail " prefix and convert to 0-based index
-                
-                # Cek apakah ada hasil pencarian yang tersimpan
-                if chat_id_str in last_search_results and "data" in last_search_results[chat_id_str]:
-                    data = last_search_results[chat_id_str]["data"]
-                    
-                    if 0 <= index < len(data):
-                        item = data[index]
-                        url = item.get("url", "")
-                        
-                        await client.send_message(chat, f"🔍 Mendapatkan detail untuk dokumen: *{item.get('title', '')}*...")
-                        
-                        # Dapatkan detail dokumen
-                        document_detail = await get_document_detail(url)
-                        
-                        if document_detail:
-                            title = document_detail.get("title", "Tidak ada judul")
-                            abstract = document_detail.get("abstract", "Tidak ada abstrak")
-                            metadata = document_detail.get("metadata", {})
-                            download_links = document_detail.get("download_links", [])
-                            
-                            # Format authors dari metadata
-                            authors = metadata.get("Penulis", "Tidak ada penulis").split("; ")
-                            year = metadata.get("Tahun Terbit", "Tidak ada tahun")
-                            
-                            # Tampilkan detail dokumen
-                            detail_message = f"📝 *Detail Dokumen*\n\n"
-                            detail_message += f"*Judul:* {title}\n"
-                            detail_message += f"*Penulis:* {', '.join(authors)}\n"
-                            detail_message += f"*Tahun:* {year}\n\n"
-                            detail_message += f"*Abstrak:*\n{abstract}\n\n"
-                            
-                            # Tampilkan metadata lainnya
-                            if metadata:
-                                detail_message += "*Metadata Lainnya:*\n"
-                                for key, value in metadata.items():
-                                    if key not in ["Penulis", "Tahun Terbit"]:
-                                        detail_message += f"{key}: {value}\n"
-                            
-                            # Tampilkan link download
-                            if download_links:
-                                detail_message += "\n*Link Download:*\n"
-                                for i, link in enumerate(download_links):
-                                    if isinstance(link, dict):
-                                        detail_message += f"{i+1}. {link.get('label', 'Link')}: {link.get('url', '#')}\n"
-                                    else:
-                                        detail_message += f"{i+1}. {link}\n"
-                            
-                            await client.send_message(chat, detail_message)
-                        else:
-                            await client.send_message(chat, f"❌ Gagal mendapatkan detail dokumen")
-                    else:
-                        await client.send_message(chat, f"❌ Nomor tidak valid. Gunakan nomor 1-{len(data)}")
-                else:
-                    await client.send_message(chat, "❌ Tidak ada hasil pencarian sebelumnya. Gunakan command 'paper search [keyword]' terlebih dahulu.")
-                
-            except ValueError:
-                await client.send_message(chat, "❌ Format salah. Gunakan: *paper detail [nomor]*")
+@router.command("ping")
+async def cmd_ping(ctx):
+    outbox.send(ctx.client, ctx.chat, "pong", quoted=ctx.message)
 
-        # Command untuk menganalisis dokumen dari repositori
-        elif text.lower().startswith("paper analyze "):
-            try:
-                index = int(text[14:]) - 1  # Remove "paper analyze " prefix and convert to 0-based index
-                
-                # Cek apakah ada hasil pencarian yang tersimpan
-                if chat_id_str in last_search_results and "data" in last_search_results[chat_id_str]:
-                    data = last_search_results[chat_id_str]["data"]
-                    
-                    if 0 <= index < len(data):
-                        item = data[index]
-                        url = item.get("url", "")
-                        title = item.get("title", "")
-                        authors = item.get("authors", [])
-                        year = item.get("year", "")
-                        download_links = item.get("download_links", [])
-                        
-                        # Cek apakah ada link download
-                        if download_links:
-                            pdf_url = download_links[0]
-                            if isinstance(pdf_url, dict):
-                                pdf_url = pdf_url.get("url", "")
-                            
-                            # Dapatkan detail tambahan jika tersedia
-                            document_detail = await get_document_detail(url)
-                            abstract = ""
-                            
-                            if document_detail:
-                                abstract = document_detail.get("abstract", "")
-                                metadata = document_detail.get("metadata", {})
-                                if "Penulis" in metadata:
-                                    authors = metadata.get("Penulis", "").split("; ")
-                                if "Tahun Terbit" in metadata:
-                                    year = metadata.get("Tahun Terbit", "")
-                            
-                            # Download dan analisis dokumen
-                            await download_and_analyze_paper(client, chat, pdf_url, title, authors, year, abstract)
-                        else:
-                            await client.send_message(chat, "❌ Tidak ada link download untuk dokumen ini")
-                    else:
-                        await client.send_message(chat, f"❌ Nomor tidak valid. Gunakan nomor 1-{len(data)}")
-                else:
-                    await client.send_message(chat, "❌ Tidak ada hasil pencarian sebelumnya. Gunakan command 'paper search [keyword]' terlebih dahulu.")
-                
-            except ValueError:
-                await client.send_message(chat, "❌ Format salah. Gunakan: *paper analyze [nomor]*")
-                
-        # Command untuk menganalisis dokumen dari URL langsung
-        elif text.lower().startswith("paper url "):
-            url = text[10:]  # Remove "paper url " prefix
-            
-            await client.send_message(chat, f"🔍 Mencari detail dokumen dari URL: {url}...")
-            
-            # Dapatkan detail dokumen
-            document_detail = await get_document_detail(url)
-            
-            if document_detail:
-                title = document_detail.get("title", "Tidak ada judul")
-                abstract = document_detail.get("abstract", "Tidak ada abstrak")
-                metadata = document_detail.get("metadata", {})
-                download_links = document_detail.get("download_links", [])
-                
-                # Format authors dari metadata
-                authors = metadata.get("Penulis", "Tidak ada penulis").split("; ")
-                year = metadata.get("Tahun Terbit", "Tidak ada tahun")
-                
-                # Tampilkan detail dokumen
-                detail_message = f"📝 *Detail Dokumen*\n\n"
-                detail_message += f"*Judul:* {title}\n"
-                detail_message += f"*Penulis:* {', '.join(authors)}\n"
-                detail_message += f"*Tahun:* {year}\n\n"
-                detail_message += f"*Abstrak:*\n{abstract}\n\n"
-                
-                # Tampilkan metadata lainnya
-                if metadata:
-                    detail_message += "*Metadata Lainnya:*\n"
-                    for key, value in metadata.items():
-                        if key not in ["Penulis", "Tahun Terbit"]:
-                            detail_message += f"{key}: {value}\n"
-                
-                # Tampilkan link download
-                if download_links:
-                    detail_message += "\n*Link Download:*\n"
-                    for i, link in enumerate(download_links):
-                        if isinstance(link, dict):
-                            detail_message += f"{i+1}. {link.get('label', 'Link')}: {link.get('url', '#')}\n"
-                        else:
-                            detail_message += f"{i+1}. {link}\n"
-                
-                await client.send_message(chat, detail_message)
-                
-                # Tawarkan untuk menganalisis dokumen
-                if download_links:
-                    await client.send_message(chat, "Ketik *paper download [URL]* untuk mengunduh dan menganalisis dokumen ini.")
-            else:
-                await client.send_message(chat, f"❌ Gagal mendapatkan detail dokumen dari URL: {url}")
+# Command untuk mencari dokumen di repositori
+@router.command("paper search", args=True)
+async def cmd_search(ctx):
+    client, chat, keyword = ctx.client, ctx.chat, ctx.args
+    outbox.send(client, chat, f"🔍 Mencari dokumen dengan kata kunci: *{keyword}*...")
+    
+    results = await search_repository(keyword)
+    if results:
+        await send_search_results(client, chat, results, keyword)
+    else:
+        outbox.send(client, chat, f"❌ Gagal mencari dokumen dengan kata kunci: *{keyword}*")
 
-        # Command untuk mengunduh dan menganalisis dokumen dari URL langsung
-        elif text.lower().startswith("paper download "):
-            pdf_url = text[15:]  # Remove "paper download " prefix
-            
-            await client.send_message(chat, f"📥 Mengunduh dokumen dari URL: {pdf_url}...")
-            
-            # Coba ekstrak informasi dari URL
-            title = "Dokumen"
-            authors = ["Penulis tidak diketahui"]
-            year = "Tahun tidak diketahui"
-            
-            # Coba ekstrak nama file dari URL
-            try:
-                file_name = pdf_url.split('/')[-1]
-                if file_name:
-                    title = file_name.replace('%20', ' ').replace('%', ' ').replace('.pdf', '')
-            except:
-                pass
-            
-            # Download dan analisis dokumen
-            await download_and_analyze_paper(client, chat, pdf_url, title, authors, year)
+# Ubah argumen nomor hasil pencarian ("2", "1-5", "1,3,4" atau "1-3,5") menjadi daftar
+# nomor tanpa duplikat. ValueError jika formatnya salah, IndexError jika ada nomor di
+# luar 1..count.
+def parse_item_numbers(text, count):
+    numbers = []
+    for part in text.replace(" ", "").split(","):
+        if "-" in part:
+            start, end = part.split("-", 1)
+            start, end = int(start), int(end)
+            if start > end:
+                raise ValueError(f"Rentang tidak valid: {part}")
+        else:
+            start = end = int(part)
+        if start < 1 or end > count:
+            raise IndexError(part)
+        for number in range(start, end + 1):
+            if number not in numbers:
+                numbers.append(number)
+    return numbers
 
-        # Command untuk menganalisis dokumen PDF yang direply
-        elif has_quoted and quoted_type == "document" and text.lower() == "paper analyze":
-            await client.send_message(chat, "📄 Mengunduh dan memproses dokumen yang direply...")
-            
-            # Download dokumen
-            media_bytes, mime_type, temp_path = None, None, None
-            try:
-                # Coba download media
-                from neonize.proto.waE2E.WAWebProtobufsE2E_pb2 import Message
-                message_obj = Message()
-                message_obj.documentMessage.CopyFrom(quoted_message.documentMessage)
-                media_bytes = await client.download_any(message_obj)
-                
-                if media_bytes:
-                    # Simpan file
-                    temp_path = f"temp_media/document_{os.urandom(4).hex()}.pdf"
-                    with open(temp_path, 'wb') as f:
-                        f.write(media_bytes)
-                    mime_type = "application/pdf"
-            except Exception as e:
-                log.error(f"Error downloading document: {e}")
-                log.error(traceback.format_exc())
-                
-            if not media_bytes or not temp_path:
-                await client.send_message(chat, "❌ Gagal mengunduh dokumen PDF")
-                return
-                
-            # Verifikasi mime_type untuk PDF
-            if not mime_type or not mime_type.lower() == "application/pdf":
-                await client.send_message(chat, f"❌ Dokumen bukan PDF. Tipe: {mime_type}")
-                return
-                
-            # Ekstrak teks dari PDF
-            await client.send_message(chat, "⏳ Mengekstrak teks dari PDF...")
-            pdf_text = await extract_text_from_pdf(temp_path)
-            
-            if not pdf_text or pdf_text.startswith("Error"):
-                await client.send_message(chat, f"❌ Gagal mengekstrak teks dari PDF: {pdf_text}")
-                return
-                
-            # Batasi teks jika terlalu panjang
-            max_length = 16000  # Batas karakter untuk input ke Gemini
-            if len(pdf_text) > max_length:
-                pdf_text = pdf_text[:max_length] + "...[teks terpotong karena terlalu panjang]"
-            
-            # Buat prompt untuk analisis
-            prompt = """Analisis karya ilmiah ini dengan mencakup aspek berikut:
-1. Ringkasan singkat tentang apa isi dokumen ini
-2. Kontribusi utama atau temuan penting dalam penelitian
-3. Metodologi yang digunakan (jika ada)
-4. Kesimpulan dan implikasi dari penelitian
-5. Relevansi dan signifikansi karya ilmiah ini
+# Ambil item hasil pencarian terakhir sesuai argumen nomor. Pesan error dikirim ke chat
+# dan None dikembalikan jika belum ada pencarian atau nomornya tidak valid.
+async def select_search_items(client, chat, args, usage):
+    data = await asyncio.to_thread(last_search_results.get, chat_id_string(chat))
+    if data is None:
+        outbox.send(client, chat, "❌ Tidak ada hasil pencarian sebelumnya. Gunakan command 'paper search [keyword]' terlebih dahulu.")
+        return None
+    
+    try:
+        numbers = parse_item_numbers(args, len(data))
+    except ValueError:
+        outbox.send(client, chat, f"❌ Format salah. Gunakan: *{usage}*")
+        return None
+    except IndexError:
+        outbox.send(client, chat, f"❌ Nomor tidak valid. Gunakan nomor 1-{len(data)}")
+        return None
+    
+    if len(numbers) > BATCH_MAX_ITEMS:
+        outbox.send(client, chat, f"❌ Maksimal {BATCH_MAX_ITEMS} dokumen sekaligus.")
+        return None
+    
+    return [(number, data[number - 1]) for number in numbers]
 
-Tolong berikan informasi dalam format yang terstruktur dan mudah dipahami."""
-            
-            # Gabungkan prompt dan teks PDF
-            full_prompt = f"{prompt}\n\nIsi Dokumen PDF:\n{pdf_text}"
-            
-            await client.send_message(chat, "🧠 Menganalisis dokumen dengan Gemini AI...")
-            response = await query_gemini_text(full_prompt)
-            
-            # Kirim hasil analisis
-            await client.send_message(chat, response)
+# Command untuk melihat detail dokumen; "paper detail 1-5" menampilkan beberapa sekaligus
+@router.command("paper detail", args=True)
+async def cmd_detail(ctx):
+    client, chat = ctx.client, ctx.chat
+    numbered_items = await select_search_items(client, chat, ctx.args, "paper detail [nomor]")
+    if not numbered_items:
+        return
+    
+    if len(numbered_items) > 1:
+        await send_batch_details(client, chat, numbered_items)
+        return
+    
+    _, item = numbered_items[0]
+    outbox.send(client, chat, f"🔍 Mendapatkan detail untuk dokumen: *{item.title}*...")
+    
+    # Dapatkan detail dokumen
+    document_detail = await get_document_detail(item.url)
+    
+    if document_detail:
+        outbox.send(client, chat, format_document_detail(document_detail))
+    else:
+        outbox.send(client, chat, f"❌ Gagal mendapatkan detail dokumen")
+
+# Command untuk menganalisis dokumen dari repositori; "paper analyze 1,3,4" menganalisis
+# beberapa dokumen sekaligus.
+# "paper reanalyze" sama dengan "paper analyze" tetapi melewati cache Gemini
+@router.command("paper analyze", args=True)
+@router.command("paper reanalyze", args=True, force_refresh=True)
+async def cmd_analyze(ctx):
+    client, chat = ctx.client, ctx.chat
+    force_refresh = ctx.options.get("force_refresh", False)
+    numbered_items = await select_search_items(client, chat, ctx.args, "paper analyze [nomor]")
+    if not numbered_items:
+        return
+    
+    if len(numbered_items) > 1:
+        await analyze_paper_batch(client, chat, numbered_items, force_refresh)
+        return
+    
+    _, item = numbered_items[0]
+    pdf_url, title, authors, year, abstract = await resolve_paper(item)
+    
+    # Cek apakah ada link download
+    if pdf_url:
+        # Download dan analisis dokumen
+        await download_and_analyze_paper(client, chat, pdf_url, title, authors, year, abstract, force_refresh)
+    else:
+        outbox.send(client, chat, "❌ Tidak ada link download untuk dokumen ini")
 
-        elif text.lower() == "help":
-            help_text = """
+# Command untuk menganalisis dokumen PDF yang direply
+@router.command("paper analyze")
+@router.command("paper reanalyze", force_refresh=True)
+async def cmd_analyze_quoted(ctx):
+    quoted_message, quoted_type = ctx.quoted
+    if quoted_type == "document":
+        await analyze_quoted_document(ctx.client, ctx.chat, quoted_message, ctx.options.get("force_refresh", False))
+
+# Command untuk menganalisis dokumen dari URL langsung
+@router.command("paper url", args=True)
+async def cmd_url(ctx):
+    client, chat, url = ctx.client, ctx.chat, ctx.args
+    outbox.send(client, chat, f"🔍 Mencari detail dokumen dari URL: {url}...")
+    
+    # Dapatkan detail dokumen
+    document_detail = await get_document_detail(url)
+    
+    if document_detail:
+        outbox.send(client, chat, format_document_detail(document_detail))
+        
+        # Tawarkan untuk menganalisis dokumen
+        if document_detail.get("download_links"):
+            outbox.send(client, chat, "Ketik *paper download [URL]* untuk mengunduh dan menganalisis dokumen ini.")
+    else:
+        outbox.send(client, chat, f"❌ Gagal mendapatkan detail dokumen dari URL: {url}")
+
+# Command untuk mengunduh dan menganalisis dokumen dari URL langsung
+@router.command("paper download", args=True)
+async def cmd_download(ctx):
+    client, chat, pdf_url = ctx.client, ctx.chat, ctx.args
+    outbox.send(client, chat, f"📥 Mengunduh dokumen dari URL: {pdf_url}...")
+    
+    # Coba ekstrak informasi dari URL
+    title = "Dokumen"
+    authors = ["Penulis tidak diketahui"]
+    year = "Tahun tidak diketahui"
+    
+    # Coba ekstrak nama file dari URL
+    try:
+        file_name = pdf_url.split('/')[-1]
+        if file_name:
+            title = file_name.replace('%20', ' ').replace('%', ' ').replace('.pdf', '')
+    except:
+        pass
+    
+    # Download dan analisis dokumen
+    await download_and_analyze_paper(client, chat, pdf_url, title, authors, year)
+
+@router.command("help")
+async def cmd_help(ctx):
+    help_text = """
 *WhatsApp Repository Bot*
 
 *Perintah Dasar:*
@@ -655,20 +1546,83 @@ Tolong berikan informasi dalam format yang terstruktur dan mudah dipahami."""
 - `paper url [URL]` - Mendapatkan detail dokumen dari URL repositori
 - `paper download [URL]` - Mengunduh dan menganalisis dokumen dari URL
 - `paper analyze` - Menganalisis dokumen PDF yang direply
+- `paper reanalyze [nomor]` - Menganalisis ulang tanpa memakai hasil tersimpan
+
+Nomor bisa berupa rentang atau daftar (maks. 5), mis. `paper detail 1-5` atau `paper analyze 1,3,4`; hasilnya dikirim dalam satu pesan beserta perbandingan antar paper.
 
 *Contoh:*
 > paper search pendidikan islam
 > paper detail 1
 > paper analyze 2
+> paper analyze 1,3
 > paper url https://repository.iainkediri.ac.id/1023/
 > paper download https://repository.iainkediri.ac.id/1023/1/Pendidikan%20Islam%20Dalam%20Guncangan%20Post%20Truth.pdf
 """
-            await client.send_message(chat, help_text)
-            
-    except Exception as e:
-        log.error(f"Error in message handler: {e}")
-        log.error(traceback.format_exc())
+    outbox.send(ctx.client, ctx.chat, help_text)
+
+# Siapkan semua komponen sebelum client terhubung. Import neonize dan pembacaan
+# daftar perangkat dari database-nya (panggilan Go yang memblokir) berjalan di
+# thread, bersamaan dengan pembukaan penyimpanan lokal oleh setup().
+async def startup():
+    global client_factory
+    started = time.perf_counter()
+    factory = asyncio.get_running_loop().run_in_executor(None, create_client_factory)
+    setup()
+    client_factory = await factory
+    startup_stats["setup_seconds"] = time.perf_counter() - started
+    startup_stats["devices"] = len(client_factory.clients)
+    log.info(f"Startup selesai dalam {startup_stats['setup_seconds']:.2f}s, {len(client_factory.clients)} perangkat")
+    
+    http_client.start()
+    scratch.start_janitor()
+    if METRICS_ENABLED or SHARD_COUNT > 1:
+        # Endpoint metrik opsional: port yang sudah dipakai tidak boleh menghentikan bot
+        try:
+            await metrics_server.start()
+        except OSError as e:
+            log.warning(f"Metrics endpoint not started on port {metrics_server.port}: {e}")
+    if METRICS_LOG_INTERVAL:
+        metrics.start_log_summary(METRICS_LOG_INTERVAL)
+    if search_index is not None and SEARCH_INDEX_HARVEST_KEYWORDS:
+        spawn_background(harvest_search_index(SEARCH_INDEX_HARVEST_KEYWORDS))
+
+# Tutup pool HTTP, pool ekstraksi, dan cache saat bot berhenti
+async def shutdown():
+    prefetcher.cancel_all()
+    for task in list(background_tasks):
+        task.cancel()
+    await outbox.close()
+    pdf_extractor.shutdown()
+    job_store.close()
+    pdf_text_cache.close()
+    pdf_url_cache.close()
+    gemini_response_cache.close()
+    search_cache_store.close()
+    detail_cache_store.close()
+    last_search_results.close()
+    if search_index is not None:
+        search_index.close()
+    await scratch.stop_janitor()
+    await metrics.stop_log_summary()
+    await metrics_server.stop()
+    await http_client.close()
+
+# Jalankan semua client dan endpoint metrik
+async def run_bot():
+    await startup()
+    try:
+        connect_tasks = await client_factory.run()
+        await asyncio.gather(*connect_tasks)
+    finally:
+        await shutdown()
+
+def main():
+    sys.path.insert(0, os.getcwd())
+    
+    # Konfigurasi logging
+    logging.basicConfig(level=LOG_LEVEL, format='%(asctime)s - %(levelname)s - %(message)s')
+    startup_stats["import_seconds"] = time.perf_counter() - process_started
+    asyncio.run(run_bot())
 
 if __name__ == "__main__":
-    loop = asyncio.get_event_loop()
-    loop.run_until_complete(client_factory.run())
+    main()
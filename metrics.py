@@ -0,0 +1,290 @@
+import asyncio
+import contextlib
+import functools
+import logging
+import math
+import time
+
+log = logging.getLogger(__name__)
+
+# Konfigurasi default metrik
+METRICS_PREFIX = "academic_bot"
+METRICS_HOST = "127.0.0.1"         # Endpoint hanya bisa diakses dari mesin yang sama
+METRICS_PORT = 9464
+METRICS_LOG_INTERVAL = 300         # Detik antar ringkasan di log
+
+# Batas atas bucket histogram latensi (detik)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+# Histogram dengan bucket tetap: cukup satu penjumlahan per observasi
+class Histogram:
+    __slots__ = ("buckets", "counts", "count", "sum")
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        index = 0
+        for bound in self.buckets:
+            if value <= bound:
+                break
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+
+    # Perkiraan persentil dengan interpolasi linear di dalam bucket
+    def quantile(self, q):
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for bound, count in zip(self.buckets, self.counts):
+            if count and seen + count >= rank:
+                return lower + (bound - lower) * (rank - seen) / count
+            seen += count
+            lower = bound
+        return self.buckets[-1]
+
+
+class _Timer:
+    __slots__ = ("registry", "name", "key", "started")
+
+    def __init__(self, registry, name, key):
+        self.registry = registry
+        self.name = name
+        self.key = key
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.registry._observe(f"{self.name}_seconds", self.key, time.perf_counter() - self.started)
+        if exc_type is not None and not issubclass(exc_type, asyncio.CancelledError):
+            self.registry._inc(f"{self.name}_errors_total", self.key, 1)
+        return False
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items())) if labels else ()
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key):
+    if not key:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label(value)}"' for name, value in key) + "}"
+
+
+# Kumpulan metrik bot: histogram latensi, counter (byte, error), dan gauge yang
+# dibaca dari stats() setiap komponen saat endpoint diakses. Pencatatan hanya
+# berupa lookup dict dan penjumlahan, sehingga aman dibiarkan aktif di produksi.
+class MetricsRegistry:
+    def __init__(self, prefix=METRICS_PREFIX):
+        self.prefix = prefix
+        self._histograms = {}
+        self._counters = {}
+        self._collectors = {}
+        self._summary_task = None
+
+    def _observe(self, name, key, value):
+        histogram = self._histograms.get((name, key))
+        if histogram is None:
+            histogram = self._histograms[(name, key)] = Histogram()
+        histogram.observe(value)
+
+    def _inc(self, name, key, value):
+        self._counters[(name, key)] = self._counters.get((name, key), 0) + value
+
+    def observe(self, name, value, **labels):
+        self._observe(name, _label_key(labels), value)
+
+    def inc(self, name, value=1, **labels):
+        self._inc(name, _label_key(labels), value)
+
+    # Context manager untuk mengukur durasi sebuah blok, mis.
+    # `with metrics.timer("stage", stage="download"):` mengisi histogram stage_seconds.
+    # Exception yang keluar dari blok dihitung di counter <name>_errors_total.
+    def timer(self, name, **labels):
+        return _Timer(self, name, _label_key(labels))
+
+    # Decorator untuk coroutine function: ukur durasi setiap panggilan. Selain
+    # exception, hasil yang dianggap gagal oleh is_error(hasil) ikut dihitung sebagai error
+    # (banyak fungsi bot mengembalikan None/pesan error alih-alih melempar exception).
+    def timed(self, name, is_error=None, **labels):
+        key = _label_key(labels)
+        histogram_name = f"{name}_seconds"
+        errors_name = f"{name}_errors_total"
+
+        def decorator(fn):
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    result = await fn(*args, **kwargs)
+                except asyncio.CancelledError:
+                    self._observe(histogram_name, key, time.perf_counter() - started)
+                    raise
+                except Exception:
+                    self._observe(histogram_name, key, time.perf_counter() - started)
+                    self._inc(errors_name, key, 1)
+                    raise
+                self._observe(histogram_name, key, time.perf_counter() - started)
+                if is_error is not None and is_error(result):
+                    self._inc(errors_name, key, 1)
+                return result
+            return wrapper
+        return decorator
+
+    # Daftarkan fungsi stats() sebuah komponen; nilai numeriknya diekspor sebagai gauge
+    def register(self, component, stats_fn):
+        self._collectors[component] = stats_fn
+
+    def _collect_gauges(self):
+        gauges = []
+        for component, stats_fn in self._collectors.items():
+            try:
+                stats = stats_fn()
+            except Exception as e:
+                log.error(f"Error collecting stats from {component}: {e}")
+                continue
+            for key, value in stats.items():
+                name = f"{component}_{key}"
+                if isinstance(value, dict):
+                    # Dict bersarang (mis. per stage atau per host) jadi label "name"
+                    for sub_key, sub_value in value.items():
+                        if isinstance(sub_value, dict):
+                            for metric, item in sub_value.items():
+                                gauges.append((f"{name}_{metric}", (("name", sub_key),), item))
+                        else:
+                            gauges.append((f"{name}_{sub_key}", (), sub_value))
+                else:
+                    gauges.append((name, (), value))
+        return [
+            (name, key, float(value)) for name, key, value in gauges
+            if isinstance(value, (int, float))
+        ]
+
+    # Format teks Prometheus (text exposition format 0.0.4)
+    def render(self):
+        lines = []
+
+        by_name = {}
+        for (name, key), histogram in self._histograms.items():
+            by_name.setdefault(name, []).append((key, histogram))
+        for name, series in sorted(by_name.items()):
+            full_name = f"{self.prefix}_{name}"
+            lines.append(f"# TYPE {full_name} histogram")
+            for key, histogram in series:
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f"{full_name}_bucket{_format_labels(key + (('le', bound),))} {cumulative}")
+                lines.append(f"{full_name}_bucket{_format_labels(key + (('le', '+Inf'),))} {histogram.count}")
+                lines.append(f"{full_name}_sum{_format_labels(key)} {histogram.sum}")
+                lines.append(f"{full_name}_count{_format_labels(key)} {histogram.count}")
+
+        by_name = {}
+        for (name, key), value in self._counters.items():
+            by_name.setdefault(name, []).append((key, value))
+        for name, series in sorted(by_name.items()):
+            full_name = f"{self.prefix}_{name}"
+            lines.append(f"# TYPE {full_name} counter")
+            for key, value in series:
+                lines.append(f"{full_name}{_format_labels(key)} {value}")
+
+        by_name = {}
+        for name, key, value in self._collect_gauges():
+            by_name.setdefault(name, []).append((key, value))
+        for name, series in sorted(by_name.items()):
+            full_name = f"{self.prefix}_{name}"
+            lines.append(f"# TYPE {full_name} gauge")
+            for key, value in series:
+                if not math.isnan(value):
+                    lines.append(f"{full_name}{_format_labels(key)} {value}")
+
+        return "\n".join(lines) + "\n"
+
+    # Ringkasan singkat untuk log: jumlah, p50/p95 dan error per histogram
+    def summary(self):
+        lines = []
+        for (name, key), histogram in sorted(self._histograms.items()):
+            if not histogram.count:
+                continue
+            label = ",".join(str(value) for _, value in key) or "-"
+            base = name[:-len("_seconds")] if name.endswith("_seconds") else name
+            errors = self._counters.get((f"{base}_errors_total", key), 0)
+            lines.append(
+                f"{name}[{label}] n={histogram.count} "
+                f"p50={histogram.quantile(0.5):.3f}s p95={histogram.quantile(0.95):.3f}s errors={errors}"
+            )
+        return lines
+
+    async def _log_summary(self, interval):
+        while True:
+            await asyncio.sleep(interval)
+            for line in self.summary():
+                log.info(f"Metrics: {line}")
+
+    def start_log_summary(self, interval=METRICS_LOG_INTERVAL):
+        if self._summary_task is None:
+            self._summary_task = asyncio.get_running_loop().create_task(self._log_summary(interval))
+
+    async def stop_log_summary(self):
+        if self._summary_task is not None:
+            self._summary_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._summary_task
+            self._summary_task = None
+
+
+# Endpoint HTTP lokal untuk scraping Prometheus (GET /metrics)
+class MetricsServer:
+    def __init__(self, registry, host=METRICS_HOST, port=METRICS_PORT, health=None):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self.health = health
+        self._runner = None
+
+    async def _handle(self, request):
+        from aiohttp import web
+
+        return web.Response(text=self.registry.render(), content_type="text/plain", charset="utf-8")
+
+    # Health check (dipakai supervisor.py): 200 jika health() melaporkan ok, 503 jika tidak
+    async def _handle_health(self, request):
+        from aiohttp import web
+
+        status = self.health() if self.health is not None else {"ok": True}
+        return web.json_response(status, status=200 if status.get("ok") else 503)
+
+    async def start(self):
+        from aiohttp import web
+
+        app = web.Application()
+        app.router.add_get("/metrics", self._handle)
+        app.router.add_get("/healthz", self._handle_health)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        log.info(f"Metrics endpoint listening on http://{self.host}:{self.port}/metrics")
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+# Instance bersama untuk seluruh bot
+metrics = MetricsRegistry()
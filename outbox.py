@@ -0,0 +1,279 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+
+from metrics import metrics
+from ratelimit import TokenBucket
+
+log = logging.getLogger(__name__)
+
+# Konfigurasi default antrean pesan keluar
+OUTBOX_MAX_CHARS = 4000              # Panjang maksimum satu pesan; teks lebih panjang dipecah
+OUTBOX_CHAT_INTERVAL = 1.0           # Jeda minimum antar pesan ke chat yang sama (detik)
+OUTBOX_MESSAGES_PER_MINUTE = 120     # Batas pesan keluar per menit untuk semua chat
+OUTBOX_CLOSE_TIMEOUT = 10            # Detik menunggu antrean kosong saat bot berhenti
+
+
+# Pecah teks panjang menjadi beberapa pesan <= max_chars. Batas paragraf (biasanya
+# batas poin hasil analisis) dipakai lebih dulu, lalu baris, lalu spasi.
+def split_message(text, max_chars=OUTBOX_MAX_CHARS):
+    chunks = []
+    current = ""
+    for block in _blocks(text.strip(), max_chars):
+        candidate = f"{current}\n\n{block}" if current else block
+        if len(candidate) <= max_chars:
+            current = candidate
+        else:
+            chunks.append(current)
+            current = block
+    if current:
+        chunks.append(current)
+    return chunks or [text]
+
+
+def _blocks(text, max_chars):
+    for paragraph in text.split("\n\n"):
+        paragraph = paragraph.strip("\n")
+        if not paragraph:
+            continue
+        if len(paragraph) <= max_chars:
+            yield paragraph
+            continue
+        # Paragraf terlalu panjang: isi per baris, potong di spasi jika satu baris pun terlalu panjang
+        current = ""
+        for line in paragraph.split("\n"):
+            while len(line) > max_chars:
+                cut = line.rfind(" ", 0, max_chars)
+                if cut <= 0:
+                    cut = max_chars
+                if current:
+                    yield current
+                    current = ""
+                yield line[:cut]
+                line = line[cut:].lstrip(" ")
+            candidate = f"{current}\n{line}" if current else line
+            if len(candidate) <= max_chars:
+                current = candidate
+            else:
+                yield current
+                current = line
+        if current:
+            yield current
+
+
+class _Outgoing:
+    __slots__ = ("client", "chat", "text", "progress", "future", "merge", "quoted")
+
+    def __init__(self, client, chat, text, progress, future, merge=False, quoted=None):
+        self.client = client
+        self.chat = chat
+        self.text = text
+        self.progress = progress
+        self.future = future
+        self.merge = merge
+        self.quoted = quoted
+
+
+# Satu pesan status yang diperbarui di tempat ("📄 Mengunduh..." -> "⏳ Mengekstrak..."
+# -> "🧠 Menganalisis..."). Pesan pertama dikirim biasa, pembaruan berikutnya mengedit
+# pesan itu; pembaruan yang belum sempat terkirim cukup diganti teksnya.
+class Progress:
+    def __init__(self, outbox, client, chat):
+        self.outbox = outbox
+        self.client = client
+        self.chat = chat
+        self.message_id = None
+        self._pending = None
+
+    def update(self, text):
+        return self.outbox._update_progress(self, text)
+
+
+# Antrean pesan keluar per chat. Handler cukup memanggil send()/progress() tanpa
+# menunggu (fire-and-forget); satu worker per chat mengirim pesan berurutan dengan
+# jeda minimum antar pesan dan batas global per menit agar tidak dibatasi server
+# WhatsApp. Worker hanya hidup selama antrean chat itu berisi.
+# chat_key(chat) menentukan kunci antrean; JID yang sama harus menghasilkan kunci yang sama.
+class Outbox:
+    def __init__(self, max_chars=OUTBOX_MAX_CHARS, chat_interval=OUTBOX_CHAT_INTERVAL,
+                 messages_per_minute=OUTBOX_MESSAGES_PER_MINUTE, chat_key=str):
+        self.max_chars = max_chars
+        self.chat_key = chat_key
+        self.chat_interval = chat_interval
+        self._bucket = TokenBucket(messages_per_minute, capacity=max(1, messages_per_minute // 6))
+        self._queues = {}
+        self._workers = {}
+        self._last_sent = OrderedDict()
+
+        self.queued = 0
+        self.sent = 0
+        self.edited = 0
+        self.coalesced = 0
+        self.split = 0
+        self.failed = 0
+
+    # Antrekan teks untuk chat; teks panjang dipecah menjadi beberapa pesan.
+    # Mengembalikan future yang selesai (dengan respons kirim terakhir, atau None jika
+    # gagal) setelah seluruh potongan terkirim; boleh diabaikan.
+    # merge=False untuk pesan yang memang harus terpisah (mis. bagian hasil analisis
+    # yang dikirim per poin); quoted dikirim sebagai balasan atas pesan itu.
+    def send(self, client, chat, text, merge=True, quoted=None):
+        chunks = split_message(text, self.max_chars) if len(text) > self.max_chars else [text]
+        if len(chunks) > 1:
+            self.split += 1
+        future = None
+        for chunk in chunks:
+            future = asyncio.get_running_loop().create_future()
+            self._enqueue(_Outgoing(client, chat, chunk, None, future, merge and quoted is None, quoted))
+        return future
+
+    # Buat pesan status baru untuk chat; isinya dikirim saat update() pertama
+    def progress(self, client, chat):
+        return Progress(self, client, chat)
+
+    def _update_progress(self, progress, text):
+        text = text[:self.max_chars]
+        if progress._pending is not None:
+            # Status sebelumnya belum terkirim: cukup ganti teksnya
+            progress._pending.text = text
+            self.coalesced += 1
+            return progress._pending.future
+        future = asyncio.get_running_loop().create_future()
+        progress._pending = _Outgoing(progress.client, progress.chat, text, progress, future)
+        self._enqueue(progress._pending)
+        return future
+
+    def _enqueue(self, item):
+        key = self.chat_key(item.chat)
+        self._queues.setdefault(key, deque()).append(item)
+        self.queued += 1
+        if key not in self._workers:
+            self._workers[key] = asyncio.ensure_future(self._worker(key))
+
+    async def _worker(self, key):
+        queue = self._queues[key]
+        merged = []
+        try:
+            while queue:
+                # Tunggu giliran dulu, baru ambil pesan: status yang datang selama
+                # menunggu masih bisa digabung ke pesan yang antre
+                last_sent = self._last_sent.get(key)
+                if last_sent is not None:
+                    delay = last_sent + self.chat_interval - time.monotonic()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                await self._bucket.acquire()
+
+                item = queue.popleft()
+                merged = [item]
+                if item.progress is not None:
+                    if item.progress._pending is item:
+                        item.progress._pending = None
+                elif item.merge:
+                    # Pesan biasa yang menumpuk selama menunggu giliran digabung
+                    # menjadi satu pesan selama panjangnya masih muat
+                    while queue and queue[0].merge and queue[0].client is item.client:
+                        text = f"{item.text}\n\n{queue[0].text}"
+                        if len(text) > self.max_chars:
+                            break
+                        item.text = text
+                        merged.append(queue.popleft())
+                        self.coalesced += 1
+                response = await self._deliver(item)
+                self._last_sent[key] = time.monotonic()
+                self._last_sent.move_to_end(key)
+                for done in merged:
+                    if not done.future.done():
+                        done.future.set_result(response)
+                merged = []
+        finally:
+            del self._workers[key]
+            # Jika worker dibatalkan, pesan yang sedang dan masih antre tidak akan terkirim
+            for unsent in merged + list(queue):
+                if not unsent.future.done():
+                    unsent.future.set_result(None)
+            self._queues.pop(key, None)
+            self._prune()
+
+    # Satu-satunya jalur pengiriman pesan WhatsApp bot; durasinya diukur di sini
+    # (tahap whatsapp_send / whatsapp_edit)
+    async def _deliver(self, item):
+        progress = item.progress
+        try:
+            if progress is not None and progress.message_id is not None:
+                from neonize.proto.waE2E.WAWebProtobufsE2E_pb2 import Message
+                
+                try:
+                    with metrics.timer("stage", stage="whatsapp_edit"):
+                        response = await item.client.edit_message(
+                            item.chat, progress.message_id, Message(conversation=item.text)
+                        )
+                    self.edited += 1
+                    return response
+                except Exception as e:
+                    log.warning(f"Editing status message failed, sending a new one: {e}")
+            with metrics.timer("stage", stage="whatsapp_send"):
+                if item.quoted is not None:
+                    response = await item.client.reply_message(item.text, item.quoted)
+                else:
+                    response = await item.client.send_message(item.chat, item.text)
+            self.sent += 1
+            if progress is not None:
+                progress.message_id = getattr(response, "ID", None) or None
+            return response
+        except Exception as e:
+            self.failed += 1
+            log.error(f"Error sending message to {item.chat}: {e}")
+            return None
+
+    # Lupakan waktu kirim terakhir chat yang sudah melewati jeda minimum
+    def _prune(self):
+        cutoff = time.monotonic() - self.chat_interval
+        while self._last_sent:
+            key, last_sent = next(iter(self._last_sent.items()))
+            if last_sent >= cutoff or key in self._workers:
+                break
+            del self._last_sent[key]
+
+    # Tunggu sampai semua antrean (atau antrean satu chat) kosong
+    async def flush(self, chat=None):
+        while True:
+            if chat is None:
+                workers = list(self._workers.values())
+            else:
+                worker = self._workers.get(self.chat_key(chat))
+                workers = [worker] if worker is not None else []
+            if not workers:
+                return
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    async def close(self, timeout=OUTBOX_CLOSE_TIMEOUT):
+        try:
+            await asyncio.wait_for(self.flush(), timeout)
+        except asyncio.TimeoutError:
+            log.warning(f"Outbox still had {self.pending} messages after {timeout}s, dropping them")
+            workers = list(self._workers.values())
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    @property
+    def pending(self):
+        return sum(len(queue) for queue in self._queues.values())
+
+    def stats(self):
+        return {
+            "active_chats": len(self._workers),
+            "pending": self.pending,
+            "queued": self.queued,
+            "sent": self.sent,
+            "edited": self.edited,
+            "coalesced": self.coalesced,
+            "split": self.split,
+            "failed": self.failed,
+        }
+
+
+# Instance bersama untuk seluruh bot
+outbox = Outbox()
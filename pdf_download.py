@@ -0,0 +1,172 @@
+import asyncio
+import io
+import logging
+import os
+
+log = logging.getLogger(__name__)
+
+# Konfigurasi default downloader PDF
+PDF_MAX_BYTES = 50 * 1024 * 1024     # Batas ukuran PDF yang boleh diunduh
+PDF_CHUNK_SIZE = 64 * 1024           # Ukuran potongan yang dibaca dari jaringan
+PDF_MAX_RESUME_ATTEMPTS = 3          # Berapa kali download dilanjutkan dengan Range request
+PDF_PROGRESS_INTERVAL = 1024 * 1024  # Lapor progres setiap N byte
+
+# Content-Type yang masih diterima. Banyak repository menyajikan PDF sebagai octet-stream.
+PDF_CONTENT_TYPES = {
+    "application/pdf",
+    "application/x-pdf",
+    "application/acrobat",
+    "application/octet-stream",
+    "binary/octet-stream",
+    "application/download",
+    "application/force-download",
+}
+
+PDF_MAGIC = b"%PDF-"
+
+
+class DownloadError(Exception):
+    pass
+
+
+def _check_content_type(response):
+    content_type = response.headers.get("Content-Type", "")
+    mime = content_type.split(";")[0].strip().lower()
+    if mime and mime not in PDF_CONTENT_TYPES:
+        raise DownloadError(f"Dokumen bukan PDF (Content-Type: {mime})")
+
+
+def _check_content_length(response, offset, max_bytes):
+    length = response.headers.get("Content-Length")
+    if length and length.isdigit() and offset + int(length) > max_bytes:
+        raise DownloadError(
+            f"Ukuran PDF {(offset + int(length)) // (1024 * 1024)} MB melebihi batas {max_bytes // (1024 * 1024)} MB"
+        )
+    if length and length.isdigit():
+        return offset + int(length)
+    return None
+
+
+async def _report(progress, downloaded, total):
+    if progress is None:
+        return
+    result = progress(downloaded, total)
+    if asyncio.iscoroutine(result):
+        await result
+
+
+# Unduh PDF secara streaming langsung ke file tanpa menampung seluruh isi di memori.
+# Jika server memberi Content-Length <= memory_limit, isi ditampung di memori dan
+# tidak pernah ditulis ke disk; jika ternyata lebih besar, isi dipindah ke file.
+# Jika koneksi putus di tengah jalan, download dilanjutkan dengan header Range.
+# Mengembalikan tuple (jumlah byte, isi PDF jika ditampung di memori atau None
+# jika ditulis ke dest_path).
+async def download_pdf(client, url, dest_path, max_bytes=PDF_MAX_BYTES, progress=None,
+                       chunk_size=PDF_CHUNK_SIZE, max_resume_attempts=PDF_MAX_RESUME_ATTEMPTS,
+                       progress_interval=PDF_PROGRESS_INTERVAL, memory_limit=0):
+    import aiohttp
+
+    part_path = f"{dest_path}.part"
+    downloaded = 0
+    total = None
+    attempt = 0
+    magic_checked = False
+    next_report = progress_interval
+    sink = None
+
+    # Pindahkan isi buffer memori ke file ketika ukurannya melewati memory_limit
+    def spill():
+        nonlocal sink
+        f = open(part_path, "wb")
+        f.write(sink.getvalue())
+        sink = f
+
+    try:
+        while True:
+            headers = {}
+            if downloaded:
+                headers["Range"] = f"bytes={downloaded}-"
+
+            try:
+                async with client.get(url, headers=headers) as response:
+                    if downloaded and response.status == 206:
+                        log.info(f"Resuming download at byte {downloaded}: {url}")
+                    elif response.status == 200:
+                        if downloaded:
+                            # Server tidak mendukung Range, mulai ulang dari awal
+                            log.info(f"Server ignored Range request, restarting download: {url}")
+                            sink.seek(0)
+                            sink.truncate()
+                            downloaded = 0
+                            magic_checked = False
+                            next_report = progress_interval
+                    else:
+                        raise DownloadError(f"Status HTTP {response.status}")
+
+                    _check_content_type(response)
+                    expected = _check_content_length(response, downloaded, max_bytes)
+                    if expected is not None:
+                        total = expected
+
+                    if sink is None:
+                        if memory_limit and total is not None and total <= memory_limit:
+                            sink = io.BytesIO()
+                        else:
+                            sink = open(part_path, "wb")
+
+                    head = b""
+                    async for chunk in response.content.iter_chunked(chunk_size):
+                        if not magic_checked:
+                            # Tolak non-PDF sedini mungkin berdasarkan magic bytes
+                            head += chunk
+                            if len(head) < len(PDF_MAGIC):
+                                continue
+                            if PDF_MAGIC not in head[:1024]:
+                                raise DownloadError("Isi file bukan PDF")
+                            magic_checked = True
+                            chunk = head
+
+                        downloaded += len(chunk)
+                        if downloaded > max_bytes:
+                            raise DownloadError(
+                                f"Ukuran PDF melebihi batas {max_bytes // (1024 * 1024)} MB"
+                            )
+                        if isinstance(sink, io.BytesIO) and downloaded > memory_limit:
+                            spill()
+                        sink.write(chunk)
+
+                        if downloaded >= next_report:
+                            next_report = downloaded + progress_interval
+                            await _report(progress, downloaded, total)
+
+                    if not magic_checked:
+                        if head:
+                            raise DownloadError("Isi file bukan PDF")
+                        raise DownloadError("File kosong")
+
+                    if total is not None and downloaded < total:
+                        raise aiohttp.ClientPayloadError(
+                            f"Download terpotong di {downloaded} dari {total} byte"
+                        )
+                break
+
+            except (aiohttp.ClientPayloadError, aiohttp.ServerDisconnectedError,
+                    aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                attempt += 1
+                if attempt > max_resume_attempts:
+                    raise DownloadError(f"Koneksi terputus: {e}") from e
+                log.warning(f"Download interrupted ({e}), retry {attempt}/{max_resume_attempts}")
+                await asyncio.sleep(min(2 ** attempt, 10))
+
+        await _report(progress, downloaded, total or downloaded)
+        if isinstance(sink, io.BytesIO):
+            return downloaded, sink.getvalue()
+        sink.close()
+        os.replace(part_path, dest_path)
+        return downloaded, None
+    except BaseException:
+        if sink is not None:
+            sink.close()
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        raise
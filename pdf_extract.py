@@ -0,0 +1,291 @@
+import asyncio
+import concurrent.futures
+import io
+import logging
+import math
+import os
+import time
+from concurrent.futures.process import BrokenProcessPool
+
+log = logging.getLogger(__name__)
+
+# Konfigurasi default engine ekstraksi
+PDF_EXTRACT_WORKERS = max(1, min(4, (os.cpu_count() or 2) - 1))
+PDF_EXTRACT_TIMEOUT = 120         # Detik maksimum untuk satu job ekstraksi
+PDF_EXTRACT_RECYCLE_AFTER = 50    # Ganti proses worker setelah N job
+PDF_EXTRACT_MAX_PAGES = 10
+PDF_EXTRACT_FIRST_BATCH = 16      # Halaman yang diekstrak dulu sebelum sisanya dibagi ke worker
+PDF_EXTRACT_MIN_PAGES_PER_TASK = 8
+PDF_EXTRACT_PAGE_MARGIN = 1.2     # Cadangan perkiraan halaman yang masih dibutuhkan untuk max_chars
+
+# Identitas engine ekstraksi; naikkan versinya jika format teks keluaran berubah
+PDF_EXTRACT_ENGINE = "pypdf2-v2"
+
+
+class ExtractionError(Exception):
+    pass
+
+
+class ExtractionTimeout(ExtractionError):
+    pass
+
+
+# Halaman hasil scan hanya berisi gambar dan tidak punya font. Halaman seperti ini
+# dilewati tanpa memanggil extract_text() yang mahal. Jika ragu, anggap ada teks.
+def _page_has_text_layer(page):
+    try:
+        resources = page.get("/Resources")
+        if resources is None:
+            return True
+        resources = resources.get_object()
+        if "/Font" in resources:
+            return True
+        xobjects = resources.get("/XObject")
+        if xobjects is not None:
+            for xobject in xobjects.get_object().values():
+                if xobject.get_object().get("/Subtype") == "/Form":
+                    return True
+        return False
+    except Exception:
+        return True
+
+
+# Generator halaman: mengembalikan (nomor halaman, teks atau None) satu per satu
+def _iter_page_texts(pdf_reader, start, end):
+    for page_num in range(start, end):
+        page = pdf_reader.pages[page_num]
+        if not _page_has_text_layer(page):
+            yield page_num, None
+            continue
+        yield page_num, page.extract_text()
+
+
+def _format_page(page_num, page_text):
+    if page_text:
+        return f"\n--- Halaman {page_num + 1} ---\n{page_text}\n"
+    return f"\n--- Halaman {page_num + 1} tidak memiliki teks yang dapat diekstrak ---\n"
+
+
+# Dijalankan di proses worker: ekstrak halaman [start, end) dan berhenti begitu
+# jumlah karakter mencapai max_chars. Mengembalikan (potongan teks per halaman,
+# jumlah halaman PDF, halaman berikutnya yang belum diekstrak).
+# pdf_path boleh berupa path file atau isi PDF (bytes) yang sudah ada di memori.
+def _extract_pages_worker(pdf_path, start, end, max_chars=None):
+    import PyPDF2
+
+    parts = []
+    chars = 0
+    if isinstance(pdf_path, (bytes, bytearray)):
+        source = io.BytesIO(pdf_path)
+    else:
+        source = open(pdf_path, 'rb')
+    with source as pdf_file:
+        pdf_reader = PyPDF2.PdfReader(pdf_file)
+        num_pages = len(pdf_reader.pages)
+        end = min(end, num_pages)
+        next_page = end
+
+        for page_num, page_text in _iter_page_texts(pdf_reader, start, end):
+            part = _format_page(page_num, page_text)
+            parts.append(part)
+            chars += len(part)
+            if max_chars is not None and chars >= max_chars:
+                next_page = page_num + 1
+                break
+
+    return parts, num_pages, next_page
+
+
+# Engine ekstraksi teks PDF di process pool terpisah dari event loop.
+# Jumlah job yang berjalan dibatasi sebanyak worker; sisanya antre di semaphore.
+# Worker diganti secara berkala dan dimatikan paksa jika sebuah dokumen melewati
+# batas waktu atau dibatalkan, sehingga PDF rusak tidak bisa menahan bot.
+class PdfExtractor:
+    def __init__(self, max_workers=PDF_EXTRACT_WORKERS, timeout=PDF_EXTRACT_TIMEOUT,
+                 recycle_after=PDF_EXTRACT_RECYCLE_AFTER, mp_context=None):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.recycle_after = recycle_after
+        self.mp_context = mp_context
+
+        self._executor = None
+        self._generation = 0
+        self._jobs_in_generation = 0
+        self._semaphore = None
+
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.cancelled = 0
+        self.recycled = 0
+        self.total_time = 0.0
+        self.last_time = 0.0
+
+    def _get_semaphore(self):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_workers)
+        return self._semaphore
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=self.mp_context,
+            )
+            self._generation += 1
+            self._jobs_in_generation = 0
+            log.info(f"PDF extraction pool started (workers={self.max_workers}, generation={self._generation})")
+        return self._executor
+
+    # Matikan sebuah pool. Jika kill=True, proses worker dihentikan paksa.
+    def _retire_executor(self, executor, kill=False):
+        if executor is self._executor:
+            self._executor = None
+            self.recycled += 1
+        if kill:
+            # ProcessPoolExecutor tidak punya API untuk menghentikan job yang sedang jalan
+            for process in list((getattr(executor, "_processes", None) or {}).values()):
+                try:
+                    process.terminate()
+                except Exception as e:
+                    log.error(f"Error terminating extraction worker: {e}")
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _submit(self, fn, *args):
+        executor = self._get_executor()
+        future = executor.submit(fn, *args)
+        self._jobs_in_generation += 1
+        if self._jobs_in_generation >= self.recycle_after:
+            # Job ini tetap selesai di pool lama; job berikutnya memakai worker baru
+            log.info(f"Recycling PDF extraction pool after {self._jobs_in_generation} jobs")
+            self._executor = None
+            self.recycled += 1
+            executor.shutdown(wait=False)
+        return future, executor
+
+    async def _run(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        retried = False
+        while True:
+            future, executor = self._submit(fn, *args)
+            try:
+                return await asyncio.wait_for(asyncio.wrap_future(future, loop=loop), self.timeout)
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                self._retire_executor(executor, kill=True)
+                raise ExtractionTimeout(f"Ekstraksi melebihi batas waktu {self.timeout} detik")
+            except asyncio.CancelledError:
+                self.cancelled += 1
+                if not future.cancel():
+                    self._retire_executor(executor, kill=True)
+                raise
+            except BrokenProcessPool:
+                # Pool mati karena job lain di-kill atau worker crash; coba sekali lagi
+                self._retire_executor(executor)
+                if retried:
+                    raise ExtractionError("Proses ekstraksi berhenti tidak terduga")
+                retried = True
+
+    # Jalankan satu job di pool setelah mendapat slot dari semaphore
+    async def _run_slot(self, fn, *args):
+        self.queued += 1
+        waiting = True
+        try:
+            async with self._get_semaphore():
+                self.queued -= 1
+                waiting = False
+                self.running += 1
+                try:
+                    return await self._run(fn, *args)
+                finally:
+                    self.running -= 1
+        finally:
+            # Job yang dibatalkan sebelum mendapat slot tidak lagi dihitung antre
+            if waiting:
+                self.queued -= 1
+
+    # Ekstrak teks dari file PDF (path atau bytes). Mengembalikan teks dengan penanda halaman.
+    # Halaman diekstrak berurutan dan berhenti begitu max_chars tercapai. Untuk
+    # dokumen besar, halaman awal diekstrak dulu lalu sisanya dibagi ke beberapa
+    # worker sekaligus, dan hasilnya digabung kembali sesuai urutan halaman.
+    # Dengan max_chars, setiap putaran hanya membagi halaman yang diperkirakan masih
+    # dibutuhkan (dari rata-rata karakter per halaman sejauh ini), sehingga worker
+    # tidak mengekstrak teks yang akhirnya dibuang; jika kurang, putaran berikutnya
+    # melanjutkan dari halaman terakhir.
+    async def extract(self, pdf_path, max_pages=PDF_EXTRACT_MAX_PAGES, max_chars=None):
+        queue_depth = self.queued
+        started = time.monotonic()
+        try:
+            first_end = min(max_pages, PDF_EXTRACT_FIRST_BATCH)
+            parts, num_pages, next_page = await self._run_slot(
+                _extract_pages_worker, pdf_path, 0, first_end, max_chars
+            )
+            chars = sum(len(part) for part in parts)
+            last_page = min(num_pages, max_pages)
+
+            while next_page < last_page and (max_chars is None or chars < max_chars):
+                end = last_page
+                budget = None
+                if max_chars is not None:
+                    budget = max_chars - chars
+                    needed = math.ceil(budget / max(1, chars / next_page) * PDF_EXTRACT_PAGE_MARGIN)
+                    end = min(last_page, next_page + max(needed, PDF_EXTRACT_MIN_PAGES_PER_TASK))
+                remaining = end - next_page
+                tasks = max(1, min(self.max_workers, remaining // PDF_EXTRACT_MIN_PAGES_PER_TASK))
+                step = -(-remaining // tasks)
+                ranges = [(page, min(page + step, end)) for page in range(next_page, end, step)]
+                results = await asyncio.gather(*[
+                    self._run_slot(_extract_pages_worker, pdf_path, range_start, range_end, budget)
+                    for range_start, range_end in ranges
+                ])
+                for range_parts, _, range_next in results:
+                    parts.extend(range_parts)
+                    chars += sum(len(part) for part in range_parts)
+                    next_page = range_next
+                    if max_chars is not None and chars >= max_chars:
+                        break
+        except Exception:
+            self.failed += 1
+            raise
+
+        if next_page < num_pages:
+            if max_chars is not None and chars >= max_chars:
+                parts.append(f"\n--- (Ekstraksi dihentikan pada halaman {next_page} dari total {num_pages} halaman karena batas panjang teks) ---\n")
+            else:
+                parts.append(f"\n--- (Teks hanya diekstrak dari {next_page} halaman pertama dari total {num_pages} halaman) ---\n")
+        text = "".join(parts)
+
+        elapsed = time.monotonic() - started
+        self.completed += 1
+        self.total_time += elapsed
+        self.last_time = elapsed
+        log.info(
+            f"Extracted {len(text)} chars from {next_page}/{num_pages} pages in {elapsed:.2f}s "
+            f"(queue depth {queue_depth})"
+        )
+        return text
+
+    def stats(self):
+        return {
+            "workers": self.max_workers,
+            "queue_depth": self.queued,
+            "running": self.running,
+            "completed": self.completed,
+            "failed": self.failed,
+            "timeouts": self.timeouts,
+            "cancelled": self.cancelled,
+            "recycled": self.recycled,
+            "avg_time": self.total_time / self.completed if self.completed else 0.0,
+            "last_time": self.last_time,
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# Instance bersama untuk seluruh bot
+pdf_extractor = PdfExtractor()
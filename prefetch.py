@@ -0,0 +1,110 @@
+import asyncio
+import logging
+import time
+from collections import deque
+
+log = logging.getLogger(__name__)
+
+# Konfigurasi default prefetch
+PREFETCH_CONCURRENCY = 2                      # Item yang dipanaskan bersamaan (semua chat)
+PREFETCH_MAX_ITEMS = 5                        # Hanya hasil yang ditampilkan ke pengguna
+PREFETCH_BYTES_PER_MINUTE = 50 * 1024 * 1024  # Anggaran download PDF spekulatif per menit
+
+
+# Pemanasan spekulatif setelah hasil pencarian dikirim: detail dan teks PDF
+# dari hasil yang ditampilkan diambil di background, sehingga "paper detail N"
+# dan "paper analyze N" berikutnya tinggal membaca cache.
+# Jumlah pekerjaan bersamaan dan byte yang diunduh per menit dibatasi, dan
+# pekerjaan sebuah chat dibatalkan begitu chat itu memulai pencarian baru.
+class Prefetcher:
+    def __init__(self, concurrency=PREFETCH_CONCURRENCY, max_items=PREFETCH_MAX_ITEMS,
+                 bytes_per_minute=PREFETCH_BYTES_PER_MINUTE):
+        self.concurrency = concurrency
+        self.max_items = max_items
+        self.bytes_per_minute = bytes_per_minute
+        self._semaphore = None
+        self._tasks = {}
+        self._window = deque()
+        self._window_bytes = 0
+
+        self.scheduled = 0
+        self.completed = 0
+        self.cancelled = 0
+        self.failed = 0
+        self.over_budget = 0
+        self.downloaded_bytes = 0
+
+    def _get_semaphore(self):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._semaphore
+
+    # Sisa anggaran download dalam jendela 60 detik terakhir
+    def budget_left(self):
+        cutoff = time.monotonic() - 60
+        while self._window and self._window[0][0] < cutoff:
+            self._window_bytes -= self._window.popleft()[1]
+        return self.bytes_per_minute - self._window_bytes
+
+    # Catat byte yang diunduh oleh pekerjaan prefetch
+    def consume(self, size):
+        self._window.append((time.monotonic(), size))
+        self._window_bytes += size
+        self.downloaded_bytes += size
+
+    # Mulai memanaskan item untuk sebuah chat; pekerjaan lama chat itu dibatalkan.
+    # warm(item) adalah coroutine function yang mengisi cache untuk satu item.
+    def schedule(self, chat_id, items, warm):
+        self.cancel(chat_id)
+        tasks = []
+        for item in items[:self.max_items]:
+            task = asyncio.ensure_future(self._run(item, warm))
+            task.add_done_callback(lambda t, chat_id=chat_id: self._on_done(chat_id, t))
+            tasks.append(task)
+        self._tasks[chat_id] = tasks
+        self.scheduled += len(tasks)
+
+    async def _run(self, item, warm):
+        async with self._get_semaphore():
+            await warm(item)
+
+    def _on_done(self, chat_id, task):
+        tasks = self._tasks.get(chat_id)
+        if tasks is not None and task in tasks:
+            tasks.remove(task)
+            if not tasks:
+                del self._tasks[chat_id]
+        if task.cancelled():
+            return
+        error = task.exception()
+        if error is not None:
+            self.failed += 1
+            log.error(f"Prefetch failed: {error}")
+        else:
+            self.completed += 1
+
+    def cancel(self, chat_id):
+        tasks = self._tasks.pop(chat_id, [])
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+                self.cancelled += 1
+        if tasks:
+            log.debug(f"Cancelled {len(tasks)} prefetch tasks for {chat_id}")
+
+    def cancel_all(self):
+        for chat_id in list(self._tasks):
+            self.cancel(chat_id)
+
+    def stats(self):
+        return {
+            "active_chats": len(self._tasks),
+            "pending": sum(len(tasks) for tasks in self._tasks.values()),
+            "scheduled": self.scheduled,
+            "completed": self.completed,
+            "cancelled": self.cancelled,
+            "failed": self.failed,
+            "over_budget": self.over_budget,
+            "downloaded_bytes": self.downloaded_bytes,
+            "budget_left": max(0, self.budget_left()),
+        }
@@ -0,0 +1,213 @@
+import asyncio
+import email.utils
+import logging
+import random
+import re
+import time
+
+log = logging.getLogger(__name__)
+
+# Konfigurasi default retry dan circuit breaker
+RETRY_MAX_ATTEMPTS = 4
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 60.0
+BREAKER_FAILURE_THRESHOLD = 5
+BREAKER_RESET_TIMEOUT = 30.0
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+class RetryableError(Exception):
+    def __init__(self, message, status=None, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+# Token bucket sederhana: `rate` token per menit dengan kapasitas `capacity`.
+# acquire() menunggu (bukan menolak) sampai token cukup, dengan urutan FIFO.
+class TokenBucket:
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self.tokens = float(self.capacity)
+        self.updated_at = time.monotonic()
+        self._lock = None
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    # Mengembalikan lama menunggu (detik)
+    async def acquire(self, amount=1):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return waited
+                delay = (amount - self.tokens) / self.rate
+                waited += delay
+                await asyncio.sleep(delay)
+
+    # Kosongkan bucket, misalnya setelah server membalas 429
+    def drain(self):
+        self._refill()
+        self.tokens = 0.0
+
+
+# Circuit breaker: setelah sejumlah kegagalan berturut-turut, request langsung
+# ditolak selama reset_timeout detik, lalu satu request percobaan diizinkan.
+class CircuitBreaker:
+    def __init__(self, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_timeout=BREAKER_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._probe_in_flight = False
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def check(self):
+        state = self.state
+        if state == "open" or (state == "half_open" and self._probe_in_flight):
+            remaining = max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+            raise CircuitOpenError(f"Circuit open, retry in {remaining:.0f}s")
+        if state == "half_open":
+            self._probe_in_flight = True
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._probe_in_flight = False
+
+    # Request percobaan selesai tanpa hasil yang bisa dinilai (error non-retryable
+    # atau dibatalkan); request berikutnya boleh menjadi percobaan baru
+    def release_probe(self):
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probe_in_flight = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                log.warning(f"Circuit opened after {self.failures} consecutive failures")
+            self.opened_at = time.monotonic()
+
+
+# Baca lama tunggu dari header Retry-After (detik atau tanggal HTTP) atau
+# dari detail error Google API (google.rpc.RetryInfo, mis. "retryDelay": "37s")
+def parse_retry_after(headers=None, body=None):
+    value = (headers or {}).get("Retry-After")
+    if value:
+        value = value.strip()
+        if value.isdigit():
+            return float(value)
+        try:
+            parsed = email.utils.parsedate_to_datetime(value)
+            return max(0.0, parsed.timestamp() - time.time())
+        except (TypeError, ValueError):
+            pass
+
+    if isinstance(body, dict):
+        details = body.get("error", {}).get("details", [])
+        for detail in details:
+            if detail.get("@type", "").endswith("google.rpc.RetryInfo"):
+                match = re.match(r"^([\d.]+)s$", str(detail.get("retryDelay", "")))
+                if match:
+                    return float(match.group(1))
+    return None
+
+
+# Pembatas laju untuk API LLM: bucket request/menit dan token/menit, retry dengan
+# exponential backoff + jitter yang menghormati Retry-After, dan circuit breaker.
+class RateLimiter:
+    def __init__(self, requests_per_minute, tokens_per_minute, max_attempts=RETRY_MAX_ATTEMPTS,
+                 base_delay=RETRY_BASE_DELAY, max_delay=RETRY_MAX_DELAY, breaker=None):
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker = breaker or CircuitBreaker()
+
+        self.calls = 0
+        self.throttled = 0
+        self.throttled_seconds = 0.0
+        self.retried = 0
+        self.dropped = 0
+        self.rejected_open = 0
+
+    def backoff(self, attempt, retry_after=None):
+        # Full jitter: acak antara 0 dan base * 2^attempt
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_delay) + random.uniform(0, self.base_delay))
+        return delay
+
+    # Jalankan fn() (coroutine function) di bawah batas laju. fn melempar
+    # RetryableError untuk kegagalan yang layak dicoba ulang.
+    async def run(self, fn, tokens=1):
+        self.calls += 1
+        attempt = 0
+        while True:
+            try:
+                self.breaker.check()
+            except CircuitOpenError:
+                self.rejected_open += 1
+                raise
+
+            waited = await self.request_bucket.acquire(1)
+            waited += await self.token_bucket.acquire(tokens)
+            if waited:
+                self.throttled += 1
+                self.throttled_seconds += waited
+
+            try:
+                result = await fn()
+            except RetryableError as e:
+                self.breaker.record_failure()
+                if e.status == 429:
+                    # Kuota server habis; jangan kirim request lain sebelum bucket terisi lagi
+                    self.request_bucket.drain()
+                attempt += 1
+                if attempt >= self.max_attempts or self.breaker.state == "open":
+                    self.dropped += 1
+                    raise
+                delay = self.backoff(attempt, e.retry_after)
+                self.retried += 1
+                log.warning(f"Retrying after {e} (attempt {attempt}/{self.max_attempts - 1}, waiting {delay:.1f}s)")
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                self.breaker.release_probe()
+                raise
+
+            self.breaker.record_success()
+            return result
+
+    def stats(self):
+        return {
+            "calls": self.calls,
+            "throttled": self.throttled,
+            "throttled_seconds": round(self.throttled_seconds, 3),
+            "retried": self.retried,
+            "dropped": self.dropped,
+            "rejected_circuit_open": self.rejected_open,
+            "circuit_state": self.breaker.state,
+        }
@@ -0,0 +1,140 @@
+# Jenis pesan yang dikutip (reply) yang dikenali, diperiksa berurutan
+QUOTED_MESSAGE_TYPES = (
+    ("documentMessage", "document"),
+    ("imageMessage", "image"),
+    ("videoMessage", "video"),
+    ("audioMessage", "audio"),
+    ("conversation", "text"),
+    ("extendedTextMessage", "text"),
+)
+
+
+# Ambil teks dari pesan WhatsApp (pesan biasa atau extended text)
+def message_text(msg):
+    return msg.conversation or msg.extendedTextMessage.text
+
+
+# Cari pesan yang dikutip memakai HasField protobuf (tanpa hasattr/dir).
+# Mengembalikan tuple (pesan yang dikutip atau None, jenisnya atau None)
+def resolve_quoted_message(msg):
+    if not msg.HasField("extendedTextMessage"):
+        return None, None
+    extended = msg.extendedTextMessage
+    if not extended.HasField("contextInfo") or not extended.contextInfo.HasField("quotedMessage"):
+        return None, None
+
+    quoted_message = extended.contextInfo.quotedMessage
+    for field, quoted_type in QUOTED_MESSAGE_TYPES:
+        if quoted_message.HasField(field):
+            return quoted_message, quoted_type
+    return quoted_message, None
+
+
+# Data satu command yang cocok: teks asli, argumen setelah nama command, dan
+# pesan yang dikutip (dicari hanya ketika dibutuhkan handler)
+class CommandContext:
+    __slots__ = ("command", "client", "message", "chat", "text", "args", "options", "_quoted")
+
+    def __init__(self, command, client, message, text, args, options):
+        self.command = command
+        self.client = client
+        self.message = message
+        self.chat = message.Info.MessageSource.Chat
+        self.text = text
+        self.args = args
+        self.options = options
+        self._quoted = None
+
+    @property
+    def quoted(self):
+        if self._quoted is None:
+            self._quoted = resolve_quoted_message(self.message.Message)
+        return self._quoted
+
+
+class _Node:
+    __slots__ = ("children", "exact", "with_args")
+
+    def __init__(self):
+        self.children = {}
+        self.exact = None       # Handler untuk command tanpa argumen, mis. "ping"
+        self.with_args = None   # Handler untuk command dengan argumen, mis. "paper search [keyword]"
+
+
+# Router command berbasis tabel. Nama command disimpan di trie per kata, sehingga
+# pesan biasa (bukan command) ditolak setelah satu lookup dict tanpa memproses
+# seluruh teks. Hanya kata-kata nama command yang di-lowercase, masing-masing sekali.
+# timer(nama_command) (opsional) mengembalikan context manager untuk mengukur handler.
+class CommandRouter:
+    def __init__(self, timer=None):
+        self.timer = timer
+        self._root = _Node()
+        self._max_word = 0
+        self.dispatched = 0
+        self.ignored = 0
+
+    # Daftarkan handler(ctx). args=True berarti command diikuti argumen ("paper detail 3");
+    # options diteruskan ke handler lewat ctx.options (mis. force_refresh).
+    def add(self, name, handler, args=False, **options):
+        node = self._root
+        for word in name.lower().split(" "):
+            node = node.children.setdefault(word, _Node())
+            self._max_word = max(self._max_word, len(word))
+        entry = (name, handler, options)
+        if args:
+            node.with_args = entry
+        else:
+            node.exact = entry
+
+    def command(self, name, args=False, **options):
+        def decorator(handler):
+            self.add(name, handler, args, **options)
+            return handler
+        return decorator
+
+    # Cari handler untuk teks. Mengembalikan (nama command, handler, options, argumen) atau None
+    def match(self, text):
+        node = self._root
+        pos = 0
+        while True:
+            # Kata yang lebih panjang dari kata command mana pun tidak akan cocok,
+            # jadi pencarian spasi dan lowercase dibatasi sepanjang kata terpanjang
+            end = text.find(" ", pos, pos + self._max_word + 1)
+            word = text[pos:pos + self._max_word + 1] if end < 0 else text[pos:end]
+            if len(word) > self._max_word:
+                break
+            child = node.children.get(word.lower())
+            if child is None:
+                break
+            node = child
+            if end < 0:
+                if node.exact:
+                    return node.exact + ("",)
+                return None
+            pos = end + 1
+        if pos and node.with_args:
+            return node.with_args + (text[pos:],)
+        return None
+
+    async def dispatch(self, client, message):
+        text = message_text(message.Message)
+        matched = self.match(text) if text else None
+        if matched is None:
+            self.ignored += 1
+            return False
+
+        command, handler, options, args = matched
+        self.dispatched += 1
+        ctx = CommandContext(command, client, message, text, args, options)
+        if self.timer is None:
+            await handler(ctx)
+        else:
+            with self.timer(command):
+                await handler(ctx)
+        return True
+
+    def stats(self):
+        return {
+            "dispatched": self.dispatched,
+            "ignored": self.ignored,
+        }
@@ -0,0 +1,214 @@
+import asyncio
+import logging
+from collections import OrderedDict, deque
+
+log = logging.getLogger(__name__)
+
+# Konfigurasi default scheduler analisis
+SCHEDULER_STAGE_LIMITS = {
+    "download": 8,   # Download PDF bersamaan
+    "extract": 4,    # Ekstraksi bersamaan (sebaiknya sama dengan jumlah worker)
+    "llm": 4,        # Request Gemini bersamaan
+}
+SCHEDULER_PER_CHAT_STAGE_LIMIT = 1   # Job per chat yang boleh berjalan di satu tahap
+SCHEDULER_PER_CHAT_JOBS = 3          # Job per chat yang boleh ada di sistem
+SCHEDULER_MAX_BACKLOG = 50           # Job di sistem sebelum permintaan baru ditolak
+
+
+class SchedulerFull(Exception):
+    pass
+
+
+# Satu tahap pipeline dengan batas global dan batas per chat.
+# Slot yang kosong dibagikan bergiliran (round-robin) antar chat, jadi satu
+# chat yang mengirim banyak perintah tidak bisa memonopoli tahap ini.
+# slots > batas per chat dipakai job yang terdiri dari beberapa item (batch):
+# itemnya boleh berjalan bersamaan sampai sebanyak slots.
+class Stage:
+    def __init__(self, name, limit, per_chat_limit):
+        self.name = name
+        self.limit = limit
+        self.per_chat_limit = per_chat_limit
+        self.running = 0
+        self._running_per_chat = {}
+        self._waiting = OrderedDict()   # chat -> deque of futures, urutan = giliran
+
+    def _chat_limit(self, slots):
+        return max(self.per_chat_limit, slots)
+
+    def _can_run(self, chat, slots=1):
+        return (self.running < self.limit
+                and self._running_per_chat.get(chat, 0) < self._chat_limit(slots))
+
+    def _start(self, chat):
+        self.running += 1
+        self._running_per_chat[chat] = self._running_per_chat.get(chat, 0) + 1
+
+    @property
+    def waiting(self):
+        return sum(len(queue) for queue in self._waiting.values())
+
+    # Posisi antrean yang akan didapat job baru dari chat ini (0 = langsung jalan)
+    def position(self, chat, slots=1):
+        own = len(self._waiting.get(chat, ()))
+        if own == 0 and self._can_run(chat, slots):
+            return 0
+        # Dengan round-robin, setiap chat lain mendapat giliran paling banyak
+        # sebanyak job kita yang sudah antre ditambah satu
+        ahead = sum(min(len(queue), own + 1) for other, queue in self._waiting.items() if other != chat)
+        return ahead + own + 1
+
+    async def acquire(self, chat, slots=1):
+        # Setelah _dispatch, penunggu yang tersisa hanya yang tertahan batas per chat,
+        # jadi chat tanpa antrean boleh langsung jalan jika masih ada slot
+        if chat not in self._waiting and self._can_run(chat, slots):
+            self._start(chat)
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        waiter = (future, slots)
+        self._waiting.setdefault(chat, deque()).append(waiter)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Slot sudah diberikan tetapi penunggu dibatalkan; kembalikan slotnya
+                self.release(chat)
+            else:
+                queue = self._waiting.get(chat)
+                if queue is not None and waiter in queue:
+                    queue.remove(waiter)
+                    if not queue:
+                        del self._waiting[chat]
+            raise
+
+    def release(self, chat):
+        self.running -= 1
+        remaining = self._running_per_chat.get(chat, 1) - 1
+        if remaining:
+            self._running_per_chat[chat] = remaining
+        else:
+            self._running_per_chat.pop(chat, None)
+        self._dispatch()
+
+    # Berikan slot kosong ke chat berikutnya secara bergiliran
+    def _dispatch(self):
+        while self.running < self.limit and self._waiting:
+            for chat, queue in self._waiting.items():
+                if self._running_per_chat.get(chat, 0) < self._chat_limit(queue[0][1]):
+                    break
+            else:
+                return
+
+            queue = self._waiting.pop(chat)
+            future, _ = queue.popleft()
+            if queue:
+                # Pindahkan chat ini ke akhir giliran
+                self._waiting[chat] = queue
+            if future.cancelled():
+                continue
+            self._start(chat)
+            future.set_result(None)
+
+    def stats(self):
+        return {
+            "limit": self.limit,
+            "running": self.running,
+            "waiting": self.waiting,
+            "waiting_chats": len(self._waiting),
+        }
+
+
+class _StageSlot:
+    def __init__(self, stage, chat, slots=1):
+        self.stage = stage
+        self.chat = chat
+        self.slots = slots
+
+    async def __aenter__(self):
+        await self.stage.acquire(self.chat, self.slots)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.stage.release(self.chat)
+
+
+# Tanda bahwa sebuah job sudah diterima scheduler. Dipakai sebagai context manager;
+# job dilepas dari hitungan backlog ketika keluar dari blok with.
+class Job:
+    def __init__(self, scheduler, chat, slots=1):
+        self.scheduler = scheduler
+        self.chat = chat
+        self.slots = slots
+
+    def stage(self, name):
+        return self.scheduler.stage(name, self.chat, self.slots)
+
+    def position(self, name):
+        return self.scheduler.stages[name].position(self.chat, self.slots)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.scheduler._finish(self.chat)
+
+
+# Scheduler job analisis: batas global per tahap (download / extract / llm),
+# batas per chat, pembagian slot yang adil antar chat, dan admission control.
+class JobScheduler:
+    def __init__(self, stage_limits=None, per_chat_stage_limit=SCHEDULER_PER_CHAT_STAGE_LIMIT,
+                 per_chat_jobs=SCHEDULER_PER_CHAT_JOBS, max_backlog=SCHEDULER_MAX_BACKLOG):
+        stage_limits = stage_limits or SCHEDULER_STAGE_LIMITS
+        self.stages = {
+            name: Stage(name, limit, per_chat_stage_limit)
+            for name, limit in stage_limits.items()
+        }
+        self.per_chat_jobs = per_chat_jobs
+        self.max_backlog = max_backlog
+        self.active = 0
+        self._active_per_chat = {}
+        self.admitted = 0
+        self.rejected = 0
+
+    # Terima job baru atau tolak dengan SchedulerFull jika antrean sudah penuh.
+    # slots = jumlah item job ini yang boleh berjalan bersamaan di satu tahap.
+    def admit(self, chat, slots=1):
+        if self.active >= self.max_backlog:
+            self.rejected += 1
+            log.warning(f"Rejecting job for {chat}: backlog {self.active}/{self.max_backlog}")
+            raise SchedulerFull("⏳ Bot sedang sangat sibuk. Silakan coba lagi beberapa menit lagi.")
+        if self._active_per_chat.get(chat, 0) >= self.per_chat_jobs:
+            self.rejected += 1
+            raise SchedulerFull(
+                f"⏳ Masih ada {self.per_chat_jobs} analisis yang diproses untuk chat ini. "
+                "Tunggu hingga selesai sebelum mengirim perintah baru."
+            )
+        self.active += 1
+        self._active_per_chat[chat] = self._active_per_chat.get(chat, 0) + 1
+        self.admitted += 1
+        return Job(self, chat, slots)
+
+    def _finish(self, chat):
+        self.active -= 1
+        remaining = self._active_per_chat.get(chat, 1) - 1
+        if remaining:
+            self._active_per_chat[chat] = remaining
+        else:
+            self._active_per_chat.pop(chat, None)
+
+    def stage(self, name, chat, slots=1):
+        return _StageSlot(self.stages[name], chat, slots)
+
+    def stats(self):
+        return {
+            "active": self.active,
+            "max_backlog": self.max_backlog,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "stages": {name: stage.stats() for name, stage in self.stages.items()},
+        }
+
+
+# Instance bersama untuk seluruh bot
+scheduler = JobScheduler()
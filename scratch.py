@@ -0,0 +1,127 @@
+import asyncio
+import contextlib
+import logging
+import os
+import time
+
+log = logging.getLogger(__name__)
+
+# Konfigurasi default penyimpanan sementara
+SCRATCH_DIR = "temp_media"
+SCRATCH_TMPFS_DIR = "/dev/shm/academic-bot"
+SCRATCH_MAX_AGE = 60 * 60                    # File lebih tua dari ini dihapus janitor
+SCRATCH_MAX_BYTES = 1024 * 1024 * 1024       # Total ukuran maksimum direktori scratch
+SCRATCH_JANITOR_INTERVAL = 5 * 60
+SCRATCH_MEMORY_LIMIT = 4 * 1024 * 1024       # PDF sampai ukuran ini diproses langsung di memori
+
+
+# Penyimpanan file sementara (PDF yang sedang diproses).
+# File dibuat lewat context manager temp_path() dan dihapus ketika blok selesai.
+# Janitor di background menghapus sisa file yang terlalu tua dan menjaga total
+# ukuran direktori di bawah kuota. Jika use_tmpfs=True dan /dev/shm tersedia,
+# file disimpan di RAM (tmpfs) alih-alih di disk.
+class ScratchStorage:
+    def __init__(self, root=SCRATCH_DIR, use_tmpfs=False, tmpfs_root=SCRATCH_TMPFS_DIR,
+                 max_age=SCRATCH_MAX_AGE, max_bytes=SCRATCH_MAX_BYTES,
+                 janitor_interval=SCRATCH_JANITOR_INTERVAL, subdir=None):
+        if use_tmpfs and os.path.isdir(os.path.dirname(tmpfs_root)):
+            root = tmpfs_root
+        if subdir:
+            root = os.path.join(root, subdir)
+        self.root = root
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.janitor_interval = janitor_interval
+        self._active = set()
+        self._janitor_task = None
+        self.removed = 0
+        self.removed_bytes = 0
+        os.makedirs(self.root, exist_ok=True)
+
+    def new_path(self, prefix, suffix=""):
+        return os.path.join(self.root, f"{prefix}_{os.urandom(4).hex()}{suffix}")
+
+    # Context manager: berikan path baru dan hapus file (serta sisa .part) setelah selesai
+    @contextlib.contextmanager
+    def temp_path(self, prefix, suffix=""):
+        path = self.new_path(prefix, suffix)
+        self._active.add(path)
+        try:
+            yield path
+        finally:
+            self._active.discard(path)
+            self.remove(path)
+            self.remove(f"{path}.part")
+
+    def remove(self, path):
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except FileNotFoundError:
+            return
+        except OSError as e:
+            log.error(f"Error removing scratch file {path}: {e}")
+            return
+        self.removed += 1
+        self.removed_bytes += size
+
+    def _entries(self):
+        entries = []
+        with os.scandir(self.root) as it:
+            for entry in it:
+                try:
+                    if entry.is_file(follow_symlinks=False):
+                        stat = entry.stat(follow_symlinks=False)
+                        entries.append((stat.st_mtime, stat.st_size, entry.path))
+                except FileNotFoundError:
+                    continue
+        return entries
+
+    # Hapus file yang kedaluwarsa, lalu file tertua sampai total ukuran di bawah kuota.
+    # File yang sedang dipakai (masih di dalam temp_path) tidak disentuh.
+    def sweep(self):
+        now = time.time()
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for mtime, size, path in entries:
+            if path in self._active or path[:-len(".part")] in self._active:
+                continue
+            if now - mtime > self.max_age or total > self.max_bytes:
+                self.remove(path)
+                total -= size
+                removed += 1
+        if removed:
+            log.info(f"Scratch janitor removed {removed} files, {total} bytes remain in {self.root}")
+        return removed
+
+    async def _janitor(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.sweep)
+            except Exception as e:
+                log.error(f"Error in scratch janitor: {e}")
+            await asyncio.sleep(self.janitor_interval)
+
+    def start_janitor(self):
+        if self._janitor_task is None:
+            self._janitor_task = asyncio.get_running_loop().create_task(self._janitor())
+
+    async def stop_janitor(self):
+        if self._janitor_task is not None:
+            self._janitor_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._janitor_task
+            self._janitor_task = None
+
+    def stats(self):
+        entries = self._entries()
+        return {
+            "root": self.root,
+            "files": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+            "max_bytes": self.max_bytes,
+            "active": len(self._active),
+            "removed": self.removed,
+            "removed_bytes": self.removed_bytes,
+        }
@@ -0,0 +1,225 @@
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+# Konfigurasi default indeks pencarian lokal
+SEARCH_INDEX_PATH = "cache/search_index.sqlite3"
+SEARCH_INDEX_LIMIT = 20            # Jumlah hasil maksimum per pencarian lokal
+
+# Bobot bm25 per kolom FTS: judul paling penting, lalu penulis, kata kunci/metadata, abstrak
+SEARCH_INDEX_WEIGHTS = (10.0, 5.0, 1.0, 2.0, 1.0)
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+# Ubah kata kunci bebas menjadi query FTS5: setiap kata harus ada (AND), dicocokkan
+# sebagai awalan, dan dikutip agar karakter khusus FTS tidak ditafsirkan.
+def fts_query(keyword):
+    tokens = _TOKEN.findall(keyword.lower())
+    if not tokens:
+        return None
+    return " ".join(f'"{token}"*' for token in tokens)
+
+
+# Indeks full-text lokal (SQLite FTS5) untuk metadata dokumen repository.
+# Diisi dari setiap respons search dan detail API, sehingga "paper search" bisa
+# dijawab dari disk dalam hitungan milidetik dan tetap berfungsi saat API mati.
+class SearchIndex:
+    def __init__(self, path=SEARCH_INDEX_PATH, limit=SEARCH_INDEX_LIMIT, weights=SEARCH_INDEX_WEIGHTS):
+        self.path = path
+        self.limit = limit
+        self.weights = weights
+        self.hits = 0
+        self.misses = 0
+        self.indexed = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            " id INTEGER PRIMARY KEY,"
+            " url TEXT UNIQUE NOT NULL,"
+            " title TEXT NOT NULL,"
+            " authors TEXT NOT NULL,"
+            " year TEXT NOT NULL,"
+            " abstract TEXT,"
+            " metadata TEXT,"
+            " download_links TEXT NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5("
+            " title, authors, year, metadata, abstract,"
+            " tokenize = 'unicode61 remove_diacritics 2')"
+        )
+
+    # Simpan/perbarui satu dokumen beserta baris FTS-nya. Field yang None tidak
+    # menimpa nilai lama (respons search tidak berisi abstrak).
+    def _upsert(self, url, title=None, authors=None, year=None, abstract=None,
+                metadata=None, download_links=None):
+        row = self._conn.execute(
+            "SELECT id, title, authors, year, abstract, metadata, download_links FROM documents WHERE url = ?",
+            (url,),
+        ).fetchone()
+        if row is not None:
+            doc_id, old_title, old_authors, old_year, old_abstract, old_metadata, old_links = row
+            title = old_title if title is None else title
+            authors = old_authors if authors is None else json.dumps(authors)
+            year = old_year if year is None else year
+            abstract = old_abstract if abstract is None else abstract
+            metadata = old_metadata if metadata is None else json.dumps(metadata)
+            download_links = old_links if download_links is None else json.dumps(download_links)
+            self._conn.execute(
+                "UPDATE documents SET title = ?, authors = ?, year = ?, abstract = ?, metadata = ?,"
+                " download_links = ?, updated_at = ? WHERE id = ?",
+                (title, authors, year, abstract, metadata, download_links, time.time(), doc_id),
+            )
+            self._conn.execute("DELETE FROM documents_fts WHERE rowid = ?", (doc_id,))
+        else:
+            authors = json.dumps(authors or [])
+            metadata = json.dumps(metadata) if metadata is not None else None
+            download_links = json.dumps(download_links or [])
+            doc_id = self._conn.execute(
+                "INSERT INTO documents (url, title, authors, year, abstract, metadata, download_links, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, title or "", authors, year or "", abstract, metadata, download_links, time.time()),
+            ).lastrowid
+
+        metadata_text = " ".join(f"{key} {value}" for key, value in json.loads(metadata or "{}").items())
+        self._conn.execute(
+            "INSERT INTO documents_fts (rowid, title, authors, year, metadata, abstract) VALUES (?, ?, ?, ?, ?, ?)",
+            (doc_id, title or "", " ".join(json.loads(authors)), year or "", metadata_text, abstract or ""),
+        )
+
+    # Indeks hasil respons /search (list item dengan title, authors, year, url, download_links)
+    def add_results(self, items):
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                for item in items:
+                    if not item.get("url"):
+                        continue
+                    self._upsert(
+                        item["url"],
+                        title=item.get("title", ""),
+                        authors=list(item.get("authors", [])),
+                        year=str(item.get("year", "")),
+                        download_links=list(item.get("download_links", [])),
+                    )
+                    self.indexed += 1
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    # Indeks respons /detail (title, abstract, metadata, download_links)
+    def add_detail(self, url, detail):
+        metadata = detail.get("metadata") or {}
+        authors = metadata.get("Penulis")
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._upsert(
+                    url,
+                    title=detail.get("title"),
+                    authors=authors.split("; ") if authors else None,
+                    year=metadata.get("Tahun Terbit"),
+                    abstract=detail.get("abstract", ""),
+                    metadata=metadata,
+                    download_links=detail.get("download_links"),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self.indexed += 1
+
+    # Cari dokumen dengan peringkat bm25. Hasil berbentuk sama dengan respons /search.
+    def search(self, keyword, limit=None):
+        query = fts_query(keyword)
+        if query is None:
+            return None
+        limit = limit or self.limit
+        with self._lock:
+            try:
+                rows = self._conn.execute(
+                    "SELECT d.title, d.authors, d.year, d.url, d.download_links"
+                    " FROM documents_fts JOIN documents d ON d.id = documents_fts.rowid"
+                    f" WHERE documents_fts MATCH ? ORDER BY bm25(documents_fts, {', '.join(map(str, self.weights))})"
+                    " LIMIT ?",
+                    (query, limit),
+                ).fetchall()
+                total = self._conn.execute(
+                    "SELECT COUNT(*) FROM documents_fts WHERE documents_fts MATCH ?", (query,)
+                ).fetchone()[0] if len(rows) == limit else len(rows)
+            except sqlite3.OperationalError as e:
+                log.error(f"Search index query failed for {keyword!r}: {e}")
+                rows, total = [], 0
+            if rows:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        data = [
+            {
+                "title": title,
+                "authors": json.loads(authors),
+                "year": year,
+                "url": url,
+                "download_links": json.loads(download_links),
+            }
+            for title, authors, year, url, download_links in rows
+        ]
+        return {"status": "success", "count": len(data), "total": total, "data": data, "source": "index"}
+
+    # Detail dokumen dari indeks (hanya jika abstrak pernah diindeks dari /detail)
+    def get_detail(self, url):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT title, abstract, metadata, download_links FROM documents"
+                " WHERE url = ? AND abstract IS NOT NULL",
+                (url,),
+            ).fetchone()
+        if row is None:
+            return None
+        title, abstract, metadata, download_links = row
+        return {
+            "title": title,
+            "abstract": abstract,
+            "metadata": json.loads(metadata or "{}"),
+            "download_links": json.loads(download_links),
+        }
+
+    def has_detail(self, url):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT 1 FROM documents WHERE url = ? AND abstract IS NOT NULL", (url,)
+            ).fetchone() is not None
+
+    def stats(self):
+        with self._lock:
+            documents, with_detail = self._conn.execute(
+                "SELECT COUNT(*), COUNT(abstract) FROM documents"
+            ).fetchone()
+        return {
+            "documents": documents,
+            "with_detail": with_detail,
+            "indexed": self.indexed,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,186 @@
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+# Konfigurasi default penyimpanan hasil pencarian per chat
+SEARCH_SESSION_TTL = 24 * 60 * 60          # Hasil pencarian berlaku 1 hari
+SEARCH_SESSION_MAX_ENTRIES = 10_000        # Jumlah chat maksimum di memori
+SEARCH_SESSION_MAX_BYTES = 32 * 1024 * 1024
+SEARCH_SESSION_DB_PATH = os.path.join("cache", "sessions.sqlite3")
+
+
+# Satu item hasil pencarian; hanya field yang dipakai handle_message
+class SearchItem:
+    __slots__ = ("title", "authors", "year", "url", "download_links")
+
+    def __init__(self, title, authors, year, url, download_links):
+        self.title = title
+        self.authors = authors
+        self.year = year
+        self.url = url
+        self.download_links = download_links
+
+    @classmethod
+    def from_result(cls, item):
+        return cls(
+            item.get("title", ""),
+            list(item.get("authors", [])),
+            item.get("year", ""),
+            item.get("url", ""),
+            list(item.get("download_links", [])),
+        )
+
+    def to_dict(self):
+        return {
+            "title": self.title,
+            "authors": list(self.authors),
+            "year": self.year,
+            "url": self.url,
+            "download_links": list(self.download_links),
+        }
+
+    # Perkiraan ukuran memori untuk anggaran byte
+    def size(self):
+        size = sys.getsizeof(self)
+        for value in (self.title, self.year, self.url):
+            size += sys.getsizeof(value)
+        for value in self.authors:
+            size += sys.getsizeof(value)
+        for link in self.download_links:
+            size += sys.getsizeof(json.dumps(link) if isinstance(link, dict) else link)
+        return size
+
+
+class SearchSession:
+    __slots__ = ("items", "created_at", "size")
+
+    def __init__(self, items, created_at):
+        self.items = items
+        self.created_at = created_at
+        self.size = sum(item.size() for item in items)
+
+
+# Penyimpanan hasil pencarian terakhir per chat dengan TTL per chat dan
+# anggaran global (jumlah entri dan byte) dengan eviksi LRU.
+# Jika db_path diisi, sesi juga disimpan di SQLite sehingga tetap ada setelah restart.
+# Dengan shared=True (beberapa proses bot memakai db_path yang sama), SQLite menjadi
+# sumber utama: get() selalu membaca database agar hasil pencarian yang disimpan
+# proses lain ikut terlihat, dan eviksi memori tidak menghapus baris milik proses lain.
+# Aman dipanggil dari thread lain (asyncio.to_thread) agar query SQLite tidak
+# berjalan di event loop.
+class SearchSessionStore:
+    def __init__(self, ttl=SEARCH_SESSION_TTL, max_entries=SEARCH_SESSION_MAX_ENTRIES,
+                 max_bytes=SEARCH_SESSION_MAX_BYTES, db_path=None, shared=False):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._sessions = OrderedDict()
+        self._total_bytes = 0
+        self.evictions = 0
+        self.shared = shared and bool(db_path)
+        self._conn = None
+        self._lock = threading.Lock()
+
+        if db_path:
+            directory = os.path.dirname(db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS search_sessions ("
+                " chat TEXT PRIMARY KEY,"
+                " items TEXT NOT NULL,"
+                " created_at REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "DELETE FROM search_sessions WHERE created_at < ?", (time.time() - self.ttl,)
+            )
+
+    def _remove(self, chat_id):
+        session = self._sessions.pop(chat_id, None)
+        if session is not None:
+            self._total_bytes -= session.size
+
+    def _insert(self, chat_id, session):
+        self._remove(chat_id)
+        self._sessions[chat_id] = session
+        self._total_bytes += session.size
+        while self._sessions and (len(self._sessions) > self.max_entries or self._total_bytes > self.max_bytes):
+            old_chat_id, old_session = self._sessions.popitem(last=False)
+            self._total_bytes -= old_session.size
+            self.evictions += 1
+            if self._conn is not None and not self.shared:
+                self._conn.execute("DELETE FROM search_sessions WHERE chat = ?", (old_chat_id,))
+
+    def _load(self, chat_id):
+        if self._conn is None:
+            return None
+        row = self._conn.execute(
+            "SELECT items, created_at FROM search_sessions WHERE chat = ?", (chat_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        items = [SearchItem.from_result(item) for item in json.loads(row[0])]
+        return SearchSession(items, row[1])
+
+    # Simpan hasil pencarian (respons mentah repository API) untuk sebuah chat
+    def put(self, chat_id, results):
+        items = [SearchItem.from_result(item) for item in results.get("data", [])]
+        session = SearchSession(items, time.time())
+        with self._lock:
+            self._insert(chat_id, session)
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO search_sessions (chat, items, created_at) VALUES (?, ?, ?)",
+                    (chat_id, json.dumps([item.to_dict() for item in items]), session.created_at),
+                )
+
+    # Ambil daftar SearchItem untuk sebuah chat, atau None jika tidak ada/kedaluwarsa
+    def get(self, chat_id):
+        with self._lock:
+            session = None if self.shared else self._sessions.get(chat_id)
+            if session is None:
+                session = self._load(chat_id)
+                if session is None:
+                    self._remove(chat_id)
+                    return None
+                self._insert(chat_id, session)
+
+            if session.created_at + self.ttl < time.time():
+                self._delete(chat_id)
+                return None
+
+            self._sessions.move_to_end(chat_id)
+            return session.items
+
+    def delete(self, chat_id):
+        with self._lock:
+            self._delete(chat_id)
+
+    def _delete(self, chat_id):
+        self._remove(chat_id)
+        if self._conn is not None:
+            self._conn.execute("DELETE FROM search_sessions WHERE chat = ?", (chat_id,))
+
+    def stats(self):
+        return {
+            "entries": len(self._sessions),
+            "bytes": self._total_bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+            "persistent": self._conn is not None,
+            "shared": self.shared,
+        }
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
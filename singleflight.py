@@ -0,0 +1,64 @@
+import asyncio
+import logging
+
+log = logging.getLogger(__name__)
+
+
+# Menggabungkan pemanggilan yang identik dan berjalan bersamaan.
+# Pemanggil pertama untuk sebuah key menjalankan pekerjaannya sebagai task;
+# pemanggil berikutnya selama task itu belum selesai hanya menunggu hasil yang sama.
+# Task dibungkus asyncio.shield, jadi membatalkan satu penunggu tidak
+# menghentikan pekerjaan yang masih ditunggu pemanggil lain. Dengan
+# cancel_abandoned=True, pekerjaan dibatalkan begitu semua penunggunya batal.
+class SingleFlight:
+    def __init__(self):
+        self._inflight = {}
+        self._waiters = {}
+        self.started = 0
+        self.coalesced = 0
+        self.abandoned = 0
+
+    def _on_done(self, key, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Ambil exception agar tidak muncul peringatan "never retrieved"
+        # ketika semua penunggu sudah dibatalkan
+        if not task.cancelled():
+            task.exception()
+
+    async def do(self, key, fn, cancel_abandoned=False):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._on_done(key, t))
+            self.started += 1
+        else:
+            self.coalesced += 1
+            log.debug(f"Coalesced concurrent call for {key}")
+
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if cancel_abandoned and self._waiters[task] == 1 and not task.done():
+                log.debug(f"Cancelling abandoned call for {key}")
+                self.abandoned += 1
+                task.cancel()
+            raise
+        finally:
+            self._waiters[task] -= 1
+            if not self._waiters[task]:
+                del self._waiters[task]
+
+    def stats(self):
+        return {
+            "in_flight": len(self._inflight),
+            "started": self.started,
+            "coalesced": self.coalesced,
+            "abandoned": self.abandoned,
+        }
+
+
+# Instance bersama untuk seluruh bot; key berupa tuple (operasi, argumen)
+singleflight = SingleFlight()
@@ -0,0 +1,93 @@
+import json
+import logging
+import re
+
+log = logging.getLogger(__name__)
+
+STREAM_SECTION_MAX_CHARS = 3500   # Bagian yang lebih panjang dari ini dikirim per paragraf
+
+# Awal poin bernomor tingkat atas, mis. "2. ...", "**2. ...**", "## 2. ...".
+# Harus di awal baris: sub-poin yang diindentasi tetap ikut poin induknya.
+SECTION_HEADING = re.compile(r"^(?:#{1,6}[ \t]*)?(?:\*\*[ \t]*)?\d+[.)][ \t]", re.MULTILINE)
+
+
+# Baca respons Server-Sent Events dan kembalikan setiap event sebagai objek JSON
+async def iter_sse_json(response):
+    data_lines = []
+    async for raw_line in response.content:
+        line = raw_line.decode('utf-8').rstrip("\r\n")
+        if line.startswith("data:"):
+            data_lines.append(line[5:].lstrip())
+            continue
+        if line == "" and data_lines:
+            payload = "\n".join(data_lines)
+            data_lines = []
+            try:
+                yield json.loads(payload)
+            except ValueError as e:
+                log.error(f"Invalid SSE payload: {e}")
+    if data_lines:
+        try:
+            yield json.loads("\n".join(data_lines))
+        except ValueError as e:
+            log.error(f"Invalid SSE payload: {e}")
+
+
+# Ambil potongan teks dari satu event streamGenerateContent
+def chunk_text_from_event(event):
+    try:
+        parts = event["candidates"][0]["content"]["parts"]
+    except (KeyError, IndexError, TypeError):
+        return ""
+    return "".join(part.get("text", "") for part in parts)
+
+
+# Memecah teks yang datang sedikit demi sedikit menjadi bagian per poin bernomor.
+# Sebuah bagian dianggap selesai ketika poin bernomor berikutnya mulai muncul.
+# Teks pembuka sebelum poin pertama digabung dengan poin pertama.
+class SectionSplitter:
+    def __init__(self, max_chars=STREAM_SECTION_MAX_CHARS):
+        self.max_chars = max_chars
+        self._buffer = ""
+        self._emitted = False
+
+    def feed(self, text):
+        self._buffer += text
+        sections = []
+        while True:
+            # Hanya heading yang barisnya sudah lengkap yang dipakai sebagai batas
+            complete = self._buffer[:self._buffer.rfind("\n") + 1]
+            starts = [match.start() for match in SECTION_HEADING.finditer(complete)]
+            boundaries = [start for start in starts if start > 0]
+            if not self._emitted and boundaries and starts[0] > 0:
+                # Teks pembuka ikut bagian pertama
+                boundaries = boundaries[1:]
+
+            if boundaries:
+                cut = boundaries[0]
+            elif len(self._buffer) > self.max_chars:
+                cut = self._buffer.rfind("\n\n", 0, self.max_chars)
+                if cut <= 0:
+                    cut = self._buffer.rfind("\n", 0, self.max_chars)
+                if cut <= 0:
+                    break
+            else:
+                break
+
+            section = self._buffer[:cut].strip()
+            self._buffer = self._buffer[cut:]
+            if section:
+                sections.append(section)
+                self._emitted = True
+        return sections
+
+    def flush(self):
+        section = self._buffer.strip()
+        self._buffer = ""
+        return [section] if section else []
+
+
+# Pecah teks lengkap (mis. dari cache) dengan aturan yang sama
+def split_sections(text, max_chars=STREAM_SECTION_MAX_CHARS):
+    splitter = SectionSplitter(max_chars)
+    return splitter.feed(text if text.endswith("\n") else text + "\n") + splitter.flush()
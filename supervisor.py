@@ -0,0 +1,172 @@
+# Supervisor mode multi-proses: perangkat WhatsApp dibagi ke N proses bot (shard),
+# satu event loop per core. Setiap shard adalah "python main.py" biasa dengan
+# BOT_SHARD_INDEX/BOT_SHARD_COUNT di environment; cache berat (teks PDF, respons
+# Gemini, URL PDF, indeks pencarian) dan job store dipakai bersama lewat SQLite WAL.
+# Supervisor memeriksa /healthz setiap shard dan me-restart shard yang mati atau macet.
+# Menjalankan: python supervisor.py --shards 4
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import sys
+import time
+import zlib
+
+from metrics import METRICS_PORT
+
+log = logging.getLogger(__name__)
+
+# Konfigurasi default supervisor
+SUPERVISOR_HEALTH_INTERVAL = 10          # Detik antar health check; 0 = hanya cek proses hidup
+SUPERVISOR_HEALTH_TIMEOUT = 5
+SUPERVISOR_HEALTH_FAILURES = 3           # Health check gagal berturut-turut sebelum shard di-restart
+SUPERVISOR_STARTUP_GRACE = 60            # Detik setelah start sebelum health check dihitung
+SUPERVISOR_RESTART_BACKOFF = 1           # Jeda restart pertama, berlipat dua setiap crash berturut-turut
+SUPERVISOR_RESTART_BACKOFF_MAX = 60
+SUPERVISOR_STABLE_UPTIME = 300           # Shard yang hidup selama ini dianggap stabil (backoff direset)
+SUPERVISOR_STOP_TIMEOUT = 15             # Detik menunggu shard berhenti sebelum di-kill
+
+
+# Shard untuk sebuah perangkat (nomor JID). Memakai crc32 agar pemetaan sama di
+# setiap proses dan setiap restart (hash() Python diacak per proses).
+def shard_for(device, count):
+    if count <= 1:
+        return 0
+    return zlib.crc32(str(device).encode()) % count
+
+
+class Shard:
+    def __init__(self, index):
+        self.index = index
+        self.process = None
+        self.started_at = 0.0
+        self.restarts = 0
+        self.failures = 0
+        self.backoff = SUPERVISOR_RESTART_BACKOFF
+
+
+# Jalankan dan awasi N proses shard
+class Supervisor:
+    def __init__(self, shards, script, metrics_port, health_interval=SUPERVISOR_HEALTH_INTERVAL,
+                 health_timeout=SUPERVISOR_HEALTH_TIMEOUT, health_failures=SUPERVISOR_HEALTH_FAILURES,
+                 startup_grace=SUPERVISOR_STARTUP_GRACE, stable_uptime=SUPERVISOR_STABLE_UPTIME,
+                 backoff_max=SUPERVISOR_RESTART_BACKOFF_MAX, stop_timeout=SUPERVISOR_STOP_TIMEOUT):
+        self.shards = [Shard(index) for index in range(shards)]
+        self.script = script
+        self.metrics_port = metrics_port
+        self.health_interval = health_interval
+        self.health_timeout = health_timeout
+        self.health_failures = health_failures
+        self.startup_grace = startup_grace
+        self.stable_uptime = stable_uptime
+        self.backoff_max = backoff_max
+        self.stop_timeout = stop_timeout
+        self._stopping = asyncio.Event()
+        self._session = None
+
+    async def _spawn(self, shard):
+        env = dict(os.environ, BOT_SHARD_INDEX=str(shard.index), BOT_SHARD_COUNT=str(len(self.shards)))
+        shard.process = await asyncio.create_subprocess_exec(sys.executable, self.script, env=env)
+        shard.started_at = time.monotonic()
+        shard.failures = 0
+        log.info(f"Shard {shard.index}/{len(self.shards)} started (pid {shard.process.pid})")
+
+    async def _terminate(self, shard):
+        process = shard.process
+        if process is None or process.returncode is not None:
+            return
+        process.terminate()
+        try:
+            await asyncio.wait_for(process.wait(), self.stop_timeout)
+        except asyncio.TimeoutError:
+            log.warning(f"Shard {shard.index} did not stop after {self.stop_timeout}s, killing it")
+            process.kill()
+            await process.wait()
+
+    async def _healthy(self, shard):
+        url = f"http://127.0.0.1:{self.metrics_port + shard.index}/healthz"
+        try:
+            async with self._session.get(url) as response:
+                return response.status == 200
+        except Exception as e:
+            log.debug(f"Health check for shard {shard.index} failed: {e}")
+            return False
+
+    # Restart shard dengan backoff eksponensial; backoff direset jika shard sempat stabil
+    async def _restart(self, shard, reason):
+        uptime = time.monotonic() - shard.started_at
+        if uptime >= self.stable_uptime:
+            shard.backoff = SUPERVISOR_RESTART_BACKOFF
+        log.warning(f"Restarting shard {shard.index} ({reason}) after {uptime:.0f}s uptime, waiting {shard.backoff}s")
+        await self._terminate(shard)
+        try:
+            await asyncio.wait_for(self._stopping.wait(), shard.backoff)
+            return
+        except asyncio.TimeoutError:
+            pass
+        shard.backoff = min(shard.backoff * 2, self.backoff_max)
+        shard.restarts += 1
+        await self._spawn(shard)
+
+    async def _watch(self, shard):
+        await self._spawn(shard)
+        while not self._stopping.is_set():
+            wait = asyncio.ensure_future(shard.process.wait())
+            stop = asyncio.ensure_future(self._stopping.wait())
+            interval = self.health_interval or None
+            await asyncio.wait({wait, stop}, timeout=interval, return_when=asyncio.FIRST_COMPLETED)
+            stop.cancel()
+            if self._stopping.is_set():
+                wait.cancel()
+                break
+            if wait.done():
+                await self._restart(shard, f"exited with code {shard.process.returncode}")
+                continue
+            wait.cancel()
+
+            if time.monotonic() - shard.started_at < self.startup_grace:
+                continue
+            if await self._healthy(shard):
+                shard.failures = 0
+                continue
+            shard.failures += 1
+            if shard.failures >= self.health_failures:
+                await self._restart(shard, f"{shard.failures} failed health checks")
+        await self._terminate(shard)
+
+    def stop(self):
+        log.info("Stopping all shards...")
+        self._stopping.set()
+
+    async def run(self):
+        import aiohttp
+
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, self.stop)
+        self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.health_timeout))
+        try:
+            await asyncio.gather(*[self._watch(shard) for shard in self.shards])
+        finally:
+            await self._session.close()
+        log.info(f"All shards stopped ({sum(shard.restarts for shard in self.shards)} restarts)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Jalankan bot repository sebagai beberapa proses (shard)")
+    parser.add_argument("--shards", type=int, default=os.cpu_count() or 1, help="Jumlah proses bot")
+    parser.add_argument("--script", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py"))
+    parser.add_argument("--metrics-port", type=int, default=METRICS_PORT,
+                        help="Port metrik shard 0 (harus sama dengan METRICS_PORT di main.py)")
+    parser.add_argument("--health-interval", type=float, default=SUPERVISOR_HEALTH_INTERVAL,
+                        help="Detik antar health check; 0 = hanya restart shard yang mati")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - supervisor - %(levelname)s - %(message)s')
+    supervisor = Supervisor(args.shards, args.script, args.metrics_port, health_interval=args.health_interval)
+    asyncio.run(supervisor.run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+# Tes regresi RateLimiter/CircuitBreaker tanpa jaringan: circuit yang half-open
+# harus tetap bisa pulih meskipun request percobaannya gagal dengan error
+# non-retryable atau dibatalkan.
+# Menjalankan: python -m pytest tests
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ratelimit import CircuitBreaker, RateLimiter, RetryableError
+
+
+async def fail_retryable():
+    raise RetryableError("HTTP 503", status=503)
+
+
+async def succeed():
+    return "ok"
+
+
+def make_limiter():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    return RateLimiter(6000, 10 ** 6, max_attempts=1, base_delay=0, breaker=breaker)
+
+
+async def probe_value_error(limiter):
+    async def fn():
+        raise ValueError("Gemini stream HTTP 400")
+    with pytest.raises(ValueError):
+        await limiter.run(fn)
+
+
+async def probe_cancelled(limiter):
+    async def fn():
+        await asyncio.sleep(10)
+    task = asyncio.ensure_future(limiter.run(fn))
+    await asyncio.sleep(0.01)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+
+# Buka circuit, tunggu sampai half-open, jalankan probe yang gagal, lalu circuit harus bisa tertutup lagi
+@pytest.mark.parametrize("probe", [probe_value_error, probe_cancelled], ids=["non_retryable", "cancelled"])
+def test_half_open_recovers_after_failed_probe(probe):
+    async def run():
+        limiter = make_limiter()
+        with pytest.raises(RetryableError):
+            await limiter.run(fail_retryable)
+        await asyncio.sleep(0.06)
+        assert limiter.breaker.state == "half_open"
+        await probe(limiter)
+        assert await limiter.run(succeed) == "ok"
+        assert limiter.breaker.state == "closed"
+
+    asyncio.run(run())